@@ -0,0 +1,249 @@
+import json
+
+from data_fetch import (
+    get_pdb_data,
+    fetch_structure,
+    get_sifts_mappings,
+    get_unpaywall_data,
+    fetch_pdf_bytes,
+    get_m_csa_active_sites,
+    fetch_uniprot_features,
+)
+from annotation_index import AnnotationIndex
+from structure_tools import HotspotAnalysis, ensemble_hotspots, first_model
+from sequence_tools import column_profiles
+from structure_store import StructureArrays, get_store, write_pdb
+from viewer import viewer_payload
+from pipeline import Pipeline, Stage
+from llm import get_gateway
+from retrieval import PaperIndex, format_passages, load_or_build_index
+
+TOP_K_PASSAGES = 6
+
+EMPTY_UNIPROT = {
+    "features": [],
+    "comments": [],
+    "proteinDescription": {},
+    "genes": []
+}
+
+
+def paper_metadata(entry: dict) -> dict:
+    """
+    Pulls the primary citation fields shown in the Literature tab.
+    """
+    citation = entry.get("rcsb_primary_citation", {})
+    return {
+        "doi": citation.get("pdbx_database_id_doi") or "N/A",
+        "title": citation.get("title", "N/A"),
+        "authors": citation.get("rcsb_authors", []),
+        "journal": citation.get("rcsb_journal_abbrev", "N/A"),
+    }
+
+
+def structure_pdb(structure: StructureArrays) -> bytes:
+    """
+    First model of the structure as PDB-format bytes, for the ΔΔG predictors.
+    """
+    return write_pdb(first_model(structure))
+
+
+def load_structure(pdb_id: str) -> StructureArrays:
+    """
+    Returns the parsed structure from the structure store, downloading (BinaryCIF,
+    mmCIF or PDB, whichever is available first) and parsing it only the first time a
+    PDB ID is seen.
+    """
+    return get_store().load_or_parse(pdb_id, lambda: fetch_structure(pdb_id)[1])
+
+
+def structure_conservation(structure: StructureArrays) -> list[float] | None:
+    """
+    Per-residue conservation of the structure's first chain, or None when no local
+    homology database is configured (the remote BLAST path is too slow for interactive use).
+    """
+    from homology import build_msa, get_backend  # Biopython's alignment stack, ~0.3 s to import
+
+    backend = get_backend()
+    if backend is None:
+        return None
+    return column_profiles(build_msa(structure.sequence(), backend))["majority"].tolist()
+
+
+def hotspot_frequency(structure: StructureArrays) -> tuple[dict[str, float], int] | None:
+    """
+    Per-residue hotspot frequency across the models of an NMR or multi-model entry,
+    or None for single-model structures.
+    """
+    if len(structure.models) < 2:
+        return None
+    return ensemble_hotspots(structure)
+
+
+def load_uniprot(uniprot_ids: list[str]) -> tuple[str | None, dict]:
+    """
+    Returns the first mapped accession and its UniProt annotations.
+    """
+    if not uniprot_ids:
+        return None, dict(EMPTY_UNIPROT)
+    uniprot_id = uniprot_ids[0]
+    return uniprot_id, fetch_uniprot_features(uniprot_id)
+
+
+def build_annotations(uniprot: tuple[str | None, dict], sifts: dict[str, list[dict]], m_csa: list[dict],
+                      hotspots: list[str]) -> AnnotationIndex:
+    """
+    Residue-level index joining the accession's UniProt features, SIFTS segments,
+    M-CSA catalytic residues and the default-threshold hotspots.
+    """
+    uniprot_id, up_features = uniprot
+    return AnnotationIndex.build(up_features.get("features", []), sifts.get(uniprot_id, []), m_csa, hotspots)
+
+
+def uniprot_comment_text(comments: list[dict]) -> str:
+    """
+    Flattens UniProt comments into plain-text lines for the summary prompt.
+    """
+    all_texts = []
+    for comment in comments:
+        if comment.get("texts"):
+            for text in comment["texts"]:
+                all_texts.append(text.get("value", ""))
+        elif comment.get("commentType") == "CATALYTIC ACTIVITY":
+            reaction = comment.get("reaction", {}).get("name", "")
+            ec = comment.get("reaction", {}).get("ecNumber", "")
+            if reaction:
+                all_texts.append(f"Catalytic Activity: {reaction} (EC {ec})")
+        elif comment.get("commentType") == "SUBCELLULAR LOCATION":
+            locations = comment.get("subcellularLocations", [])
+            for loc in locations:
+                val = loc.get("location", {}).get("value", "")
+                if val:
+                    all_texts.append(f"Subcellular Location: {val}")
+        elif comment.get("commentType") == "INTERACTION":
+            for interaction in comment.get("interactions", []):
+                g1 = interaction.get("interactantOne", {}).get("geneName", "")
+                g2 = interaction.get("interactantTwo", {}).get("geneName", "")
+                count = interaction.get("numberOfExperiments", 0)
+                all_texts.append(f"Interaction: {g1} ↔ {g2} ({count} experiments)")
+    return "\n".join(all_texts)
+
+
+def is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+def summarize_uniprot(up_features: dict) -> dict:
+    """
+    Asks GPT-4 for a Structure / Function / Sequence summary of the UniProt comments.
+    """
+    if not up_features.get("comments"):
+        return {}
+    combined_text = uniprot_comment_text(up_features["comments"])
+    prompt = f"""
+            You're an expert assistant for structural biologists.
+
+Based on the following UniProt annotations, extract and summarize key insights specifically related to:
+- Structure (e.g., domains, motifs, folding)
+- Function (e.g., enzymatic activity, pathways, immune evasion)
+- Sequence features (e.g., polymorphisms, post-translational mods, isoforms)
+
+Ignore irrelevant details like variants or drug names unless structurally significant.
+Summarize in bullet points with clear sections.
+Return the result strictly as a JSON object with keys: "Structure", "Function", "Sequence".
+
+            ---
+            {combined_text}
+            ---
+            """
+    # A reply that is not JSON is not cached, so the next run asks again
+    gpt_response = get_gateway().complete(prompt, model="gpt-4", temperature=0.3, validate=is_json)
+    return json.loads(gpt_response)
+
+
+def fetch_paper(doi: str, email: str | None) -> PaperIndex | None:
+    """
+    Returns the passage index of the paper's open-access PDF (resolved via Unpaywall), or None.
+    The index is persisted per DOI, so a known paper is not downloaded or parsed again.
+    """
+    if doi == "N/A":
+        return None
+
+    def download():
+        ua_data = get_unpaywall_data(doi, email)
+        pdf_url = ua_data["doi_url"] if ua_data else None
+        return fetch_pdf_bytes(pdf_url) if pdf_url else None
+
+    return load_or_build_index(doi, download)
+
+
+def build_answer_prompt(doi: str, question: str, paper: PaperIndex, k: int = TOP_K_PASSAGES) -> tuple[str, list[dict]]:
+    """
+    Builds the Q&A prompt from the k passages of the paper that best match the question.
+    Returns the prompt and the passages it contains.
+    """
+    passages = paper.top_k(question, k)
+    prompt = f"""
+    You are an expert research assistant for protein engineers and biochemists.
+    Use the paper (DOI: {doi}) to answer the question.
+
+    Question: {question}
+    ---
+    Relevant passages from the paper:
+    {format_passages(passages)}
+    ---
+    Answer:"""
+    return prompt, passages
+
+
+def answer_question(doi: str, question: str, paper: PaperIndex, k: int = TOP_K_PASSAGES) -> tuple[str, list[dict]]:
+    """
+    Answers question from the best-matching passages of the paper.
+    Returns the answer and the passages that were put in the prompt.
+    """
+    prompt, passages = build_answer_prompt(doi, question, paper, k)
+    return get_gateway().complete(prompt, model="gpt-4", temperature=0.3), passages
+
+
+def build_analysis_pipeline(email: str | None = None) -> Pipeline:
+    """
+    Stage graph for one analysis. Inputs: pdb_id, question.
+
+        entry ── metadata ── paper ── answer_prompt
+        structure ── structure_file
+                  ├─ hotspot_analysis ── hotspots
+                  ├─ hotspot_frequency
+                  └─ conservation
+        m_csa
+        sifts ── uniprot_ids ── uniprot ── summary
+        uniprot, sifts, m_csa, hotspots ── annotations
+        structure, annotations ── viewer
+    """
+    return Pipeline([
+        Stage("entry", get_pdb_data, ["pdb_id"]),
+        Stage("metadata", paper_metadata, ["entry"]),
+        Stage("structure", load_structure, ["pdb_id"]),
+        Stage("structure_file", structure_pdb, ["structure"]),
+        # Kept across reruns and sessions by the (byte-bounded) result cache
+        Stage("hotspot_analysis", HotspotAnalysis, ["structure"]),
+        Stage("hotspots", lambda hotspot_analysis: hotspot_analysis.hotspots(), ["hotspot_analysis"]),
+        Stage("hotspot_frequency", hotspot_frequency, ["structure"]),
+        Stage("conservation", structure_conservation, ["structure"]),
+        Stage("m_csa", get_m_csa_active_sites, ["pdb_id"]),
+        Stage("sifts", get_sifts_mappings, ["pdb_id"]),
+        Stage("uniprot_ids", lambda sifts: list(sifts), ["sifts"]),
+        Stage("uniprot", load_uniprot, ["uniprot_ids"]),
+        Stage("annotations", build_annotations, ["uniprot", "sifts", "m_csa", "hotspots"]),
+        Stage("viewer", viewer_payload, ["structure", "annotations"]),
+        Stage("summary", lambda uniprot: summarize_uniprot(uniprot[1]), ["uniprot"]),
+        Stage("paper", lambda metadata: fetch_paper(metadata["doi"], email), ["metadata"]),
+        Stage(
+            "answer_prompt",
+            lambda metadata, question, paper: build_answer_prompt(metadata["doi"], question, paper) if paper else None,
+            ["metadata", "question", "paper"],
+        ),
+    ])
@@ -0,0 +1,296 @@
+"""
+Residue-level join of UniProt features, M-CSA catalytic residues and structural
+hotspots, queryable by UniProt position or by PDB chain and author residue number.
+
+SIFTS segments (PDBe /mappings/uniprot) map each chain onto the UniProt sequence;
+within a segment, residues are matched one to one from its first residue on. Every
+annotation is stored once per coordinate system in an IntervalIndex, so "what covers
+A145" or "what lies in 3300-3400" costs a binary search plus the hits.
+"""
+import re
+from collections import defaultdict
+from typing import Iterable
+
+import numpy as np
+
+RESIDUE_LABEL = re.compile(r"^(.*?)(-?\d+)$")
+# Subtrees of at most 2**(SCAN_LEVEL + 1) intervals are scanned directly
+SCAN_LEVEL = 3
+
+
+def parse_residue(label: str) -> tuple[str, int] | None:
+    """
+    ('A', 145) for a residue label like 'A145', or None if it has no trailing number.
+    """
+    match = RESIDUE_LABEL.match(label.strip())
+    return (match[1], int(match[2])) if match else None
+
+
+def feature_category(feature_type: str) -> str:
+    """
+    Domain-map category of a UniProt feature type: domain, site, bond or other.
+    """
+    ftype = feature_type.lower()
+    if "domain" in ftype or "region" in ftype or "repeat" in ftype or "motif" in ftype:
+        return "domain"
+    if "site" in ftype or "binding" in ftype or "metal" in ftype:
+        return "site"
+    if "bond" in ftype or "disulfide" in ftype or "cross-link" in ftype:
+        return "bond"
+    return "other"
+
+
+class IntervalIndex:
+    """
+    Static index over closed integer intervals, stored as arrays sorted by start and
+    read as an implicit balanced tree (as in cgranges): the node at sorted position i
+    on level k has children i -/+ 2**(k-1), and max_end[i] is the largest end in its
+    subtree. Overlap queries cost O(log n + hits) and return ids in start order.
+    """
+
+    def __init__(self, starts, ends, ids=None):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        ids = np.arange(len(starts)) if ids is None else np.asarray(ids, dtype=np.int64)
+        order = np.lexsort((ends, starts))
+        self.starts, self.ends, self.ids = starts[order], ends[order], ids[order]
+        self.max_end = self.ends.copy()
+        self.levels = self._augment()
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _augment(self) -> int:
+        """
+        Fills max_end bottom-up, one vectorized pass per level, and returns the root level.
+        """
+        n = len(self.starts)
+        if n == 0:
+            return -1
+        # Largest end in the subtree holding the last position, for right children past n
+        last_i = (n - 1) & ~1
+        last = self.max_end[last_i]
+        k = 1
+        while 1 << k <= n:
+            x = 1 << (k - 1)
+            nodes = np.arange((x << 1) - 1, n, x << 2)
+            right = nodes + x
+            right_max = np.where(right < n, self.max_end[np.minimum(right, n - 1)], last)
+            self.max_end[nodes] = np.maximum(self.max_end[nodes], np.maximum(self.max_end[nodes - x], right_max))
+            last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+            if last_i < n:
+                last = max(last, self.max_end[last_i])
+            k += 1
+        return k - 1
+
+    def overlapping(self, start: int, end: int | None = None) -> np.ndarray:
+        """
+        ids of the intervals overlapping [start, end] (a single position by default).
+        """
+        end = start if end is None else end
+        n = len(self.starts)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        # The walk only collects [lo, hi) runs of sorted positions that may overlap;
+        # one vectorized test over their union then keeps the actual hits
+        los, his = [], []
+        stack = [(self.levels, (1 << self.levels) - 1, False)]
+        while stack:
+            level, node, left_done = stack.pop()
+            if level <= SCAN_LEVEL:
+                lo = node >> level << level
+                los.append(lo)
+                his.append(min(lo + (1 << (level + 1)) - 1, n))
+            elif not left_done:
+                stack.append((level, node, True))
+                child = node - (1 << (level - 1))
+                if child >= n or self.max_end[child] >= start:
+                    stack.append((level - 1, child, False))
+            elif node < n and self.starts[node] <= end:
+                los.append(node)
+                his.append(node + 1)
+                stack.append((level - 1, node + (1 << (level - 1)), False))
+        los, his = np.array(los, dtype=np.int64), np.array(his, dtype=np.int64)
+        lengths = his - los
+        offsets = np.cumsum(lengths) - lengths
+        candidates = np.repeat(los - offsets, lengths) + np.arange(lengths.sum())
+        hits = candidates[(self.starts[candidates] <= end) & (self.ends[candidates] >= start)]
+        return self.ids[hits]
+
+
+class ResidueMap:
+    """
+    UniProt position <-> (chain, author residue number) for one accession, from its
+    SIFTS segments.
+    """
+
+    def __init__(self, segments: Iterable[dict]):
+        rows = []
+        for seg in segments:
+            unp_start, unp_end = seg.get("unp_start"), seg.get("unp_end")
+            auth_start = (seg.get("start") or {}).get("author_residue_number")
+            if unp_start is None or unp_end is None or auth_start is None:
+                continue
+            rows.append((seg["chain_id"], int(unp_start), int(unp_end), int(auth_start)))
+        rows.sort()
+        self.segments = rows
+        self.chains = list(dict.fromkeys(row[0] for row in rows))
+        by_chain = defaultdict(list)
+        for chain, unp_start, unp_end, auth_start in rows:
+            by_chain[chain].append((auth_start, auth_start + unp_end - unp_start, unp_start))
+        # Per chain: (first author residue, last author residue, first UniProt position) columns
+        self._by_chain = {chain: np.array(sorted(spans), dtype=np.int64).T for chain, spans in by_chain.items()}
+
+    def to_uniprot(self, chain: str, resnum: int) -> int | None:
+        if chain not in self._by_chain:
+            return None
+        first, last, unp_first = self._by_chain[chain]
+        i = int(np.searchsorted(first, resnum, side="right")) - 1
+        if i < 0 or resnum > last[i]:
+            return None
+        return int(unp_first[i] + resnum - first[i])
+
+    def map_ranges(self, starts, ends) -> list[tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Maps UniProt ranges to author numbering, one vectorized pass per segment:
+        (chain, range indices, first residues, last residues) for every segment any
+        range overlaps, clipped to the segment.
+        """
+        starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        mapped = []
+        for chain, unp_start, unp_end, auth_start in self.segments:
+            hit = np.flatnonzero((starts <= unp_end) & (ends >= unp_start))
+            if len(hit):
+                shift = auth_start - unp_start
+                mapped.append((chain, hit, np.maximum(starts[hit], unp_start) + shift,
+                               np.minimum(ends[hit], unp_end) + shift))
+        return mapped
+
+    def to_residues(self, start: int, end: int | None = None) -> list[tuple[str, int, int]]:
+        """
+        (chain, first, last author residue) pieces covering UniProt positions start-end.
+        """
+        end = start if end is None else end
+        return [(chain, int(lo[0]), int(hi[0])) for chain, _, lo, hi in self.map_ranges([start], [end])]
+
+    def span(self, chain: str) -> tuple[int, int] | None:
+        """
+        First and last mapped author residue of chain.
+        """
+        if chain not in self._by_chain:
+            return None
+        first, last, _ = self._by_chain[chain]
+        return int(first[0]), int(last.max())
+
+
+class AnnotationIndex:
+    """
+    Annotations (dicts with source, type, category, label, start/end in UniProt
+    numbering, and chain/resnum for residue-level sources) indexed in both UniProt
+    and per-chain author numbering. Stored annotations are shared and read-only.
+    """
+
+    def __init__(self, annotations: list[dict], residue_map: ResidueMap | None = None):
+        self.annotations = annotations
+        self.residue_map = residue_map or ResidueMap([])
+        unp = [(i, a["start"], a["end"]) for i, a in enumerate(annotations) if a["start"] is not None]
+        self._unp = IntervalIndex([u[1] for u in unp], [u[2] for u in unp], [u[0] for u in unp])
+
+        pieces = defaultdict(list)
+        for i, a in enumerate(annotations):
+            if a.get("chain") is not None:
+                pieces[a["chain"]].append(np.array([[i], [a["resnum"]], [a["resnum"]]]))
+        ranged = np.array([i for i, a in enumerate(annotations) if a.get("chain") is None and a["start"] is not None],
+                          dtype=np.int64)
+        for chain, hit, lo, hi in self.residue_map.map_ranges([annotations[i]["start"] for i in ranged],
+                                                              [annotations[i]["end"] for i in ranged]):
+            pieces[chain].append(np.stack([ranged[hit], lo, hi]))
+        # Per chain: annotation, first and last residue columns of every piece
+        self._pieces = {chain: np.concatenate(cols, axis=1) for chain, cols in pieces.items()}
+        self._chains = {
+            chain: IntervalIndex(cols[1], cols[2]) for chain, cols in self._pieces.items()
+        }
+
+    @classmethod
+    def build(cls, features: Iterable[dict] = (), segments: Iterable[dict] = (), m_csa_sites: Iterable[dict] = (),
+              hotspots: Iterable[str] = ()) -> "AnnotationIndex":
+        """
+        Joins UniProt features (fetch_uniprot_features), the accession's SIFTS
+        segments, M-CSA active sites (get_m_csa_active_sites) and hotspot labels
+        such as 'A145'.
+        """
+        residue_map = ResidueMap(segments)
+        annotations = []
+        for feat in features:
+            location = feat.get("location", {})
+            start = location.get("start", {}).get("value")
+            end = location.get("end", {}).get("value")
+            if start is None or end is None:
+                continue
+            desc = feat.get("description", "").strip()
+            annotations.append({
+                "source": "uniprot", "type": feat["type"], "category": feature_category(feat["type"]),
+                "label": desc or f"{feat['type'].title()} {start}-{end}", "start": start, "end": end,
+            })
+
+        def residue(source, ftype, category, label, chain, resnum):
+            position = residue_map.to_uniprot(chain, resnum)
+            annotations.append({
+                "source": source, "type": ftype, "category": category, "label": label,
+                "start": position, "end": position, "chain": chain, "resnum": resnum,
+            })
+
+        for site in m_csa_sites:
+            for res in site.get("residues", []):
+                if res.get("chain") is None or res.get("resid") is None:
+                    continue
+                label = f"{res.get('code', '')}{res['resid']} {res.get('function', '')}".strip()
+                residue("m_csa", "Catalytic residue", "site", label, res["chain"], int(res["resid"]))
+        for hotspot in hotspots:
+            parsed = parse_residue(hotspot)
+            if parsed:
+                residue("hotspot", "Hotspot", "other", f"Contact hotspot {hotspot}", *parsed)
+        return cls(annotations, residue_map)
+
+    def __len__(self) -> int:
+        return len(self.annotations)
+
+    @property
+    def chains(self) -> list[str]:
+        return self.residue_map.chains
+
+    def overlapping(self, start: int, end: int | None = None) -> list[dict]:
+        """
+        Annotations overlapping UniProt positions start-end, by start position.
+        """
+        return [self.annotations[i] for i in self._unp.overlapping(start, end)]
+
+    def overlapping_residues(self, chain: str, start: int, end: int | None = None) -> list[tuple[dict, int, int]]:
+        """
+        (annotation, first, last author residue) for the annotations overlapping
+        residues start-end of chain, clipped to what the chain covers.
+        """
+        index = self._chains.get(chain)
+        if index is None:
+            return []
+        ann, los, his = self._pieces[chain][:, index.overlapping(start, end)]
+        # An annotation split over segments keeps its first piece
+        _, first = np.unique(ann, return_index=True)
+        first.sort()
+        return [(self.annotations[ann[j]], int(los[j]), int(his[j])) for j in first]
+
+    def at_residue(self, chain: str, resnum: int) -> list[dict]:
+        return [a for a, _, _ in self.overlapping_residues(chain, resnum)]
+
+    def describe_residue(self, chain: str, resnum: int) -> dict:
+        """
+        UniProt position and covering annotation labels of one residue, for tables.
+        """
+        annotations = self.at_residue(chain, resnum)
+        # The mature-chain feature covers every residue and says nothing about this one
+        listed = [a for a in annotations if a["source"] != "hotspot" and a["type"] != "Chain"]
+        return {
+            "uniprot": self.residue_map.to_uniprot(chain, resnum),
+            "annotations": "; ".join(f"{a['type']}: {a['label']}" for a in listed),
+            "hotspot": any(a["source"] == "hotspot" for a in annotations),
+        }
@@ -1,28 +1,10 @@
 # app.py
 import os
-import re
-import requests
-import json
+from contextlib import nullcontext
 
 import streamlit as st
-import openai
-
-from data_fetch       import (
-    get_pdb_data,   
-    get_uniprot_ids_from_sifts,
-    get_unpaywall_data,
-    fetch_pdf_text,
-    get_m_csa_active_sites,
-    fetch_uniprot_features,
-    get_pdb_id_from_sequence
-)
-from structure_tools  import build_3dmol_html, find_hotspots
-from sequence_tools   import conservation_scores, run_blast
-from predictors       import predict_ddg_dynamut
-from ui               import plot_domains, plot_conservation, show_mutation_form
 
-# Load secrets
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Load secrets (the OpenAI client reads OPENAI_API_KEY itself when first used)
 EMAIL          = os.getenv("UNPAYWALL_EMAIL")
 
 st.set_page_config(layout="wide", page_title="Protein Literature Assistant")
@@ -40,6 +22,8 @@ with st.sidebar:
 
     if sequence and not pdb_id:
         with st.spinner("🔍 Searching for matching PDB ID..."):
+            from data_fetch import get_pdb_id_from_sequence
+
             pdb_id = get_pdb_id_from_sequence(sequence)
             if pdb_id:
                 st.success(f"✅ Found matching PDB ID: {pdb_id}")
@@ -50,213 +34,237 @@ with st.sidebar:
     user_question = st.text_area("Your question:", "What is the function of the protein?")
     run           = st.button("🔎 Analyze")
 
-if run:
+    show_debug    = st.checkbox("Show debug metrics")
+    profile_run   = show_debug and st.checkbox("Profile the next analysis")
+    cache_box     = st.empty()
+
+# Everything above is the UI shell: it only needs streamlit and reaches the browser
+# before the analysis engine (numpy, the structure, HTTP and LLM layers) is imported
+from viewer           import HIGHLIGHTS, LOD_LABELS, build_3dmol_html, viewer_payload
+from ui               import plot_domains, plot_conservation, show_mutation_form, show_hotspot_explorer, show_metrics_panel
+from http_cache       import get_cache
+from analysis         import build_analysis_pipeline
+from llm              import get_gateway
+from metrics          import get_metrics, profile
+from result_cache     import get_result_cache, run_cached
+
+cache_stats = get_cache().stats()
+result_stats = get_result_cache().stats()
+cache_box.caption(
+    f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1e6:.1f} MB). "
+    f"Result cache: {result_stats['entries']} stages ({result_stats['bytes'] / 1e6:.1f} MB)"
+)
+
+if run and pdb_id:
+    # Later reruns (tab switches, form submits) render this analysis again, with every
+    # stage served from the result cache
+    st.session_state["analysis"] = {"pdb_id": pdb_id.upper(), "question": user_question.strip()}
+
+if "analysis" in st.session_state:
+    pdb_id = st.session_state["analysis"]["pdb_id"]
+    question = st.session_state["analysis"]["question"]
     try:
-        entry = get_pdb_data(pdb_id)
-
-        pdb_url = f"https://files.rcsb.org/download/{pdb_id.upper()}.pdb"
-        pdb_resp = requests.get(pdb_url)
-        pdb_resp.raise_for_status()
-        with open("temp.pdb", "wb") as pdb_file:
-            pdb_file.write(pdb_resp.content)
-
-        # — Metadata & additional info —
-        doi             = entry["rcsb_primary_citation"].get("pdbx_database_id_doi", "N/A")
-        title           = entry["rcsb_primary_citation"].get("title", "N/A")
-        authors         = entry["rcsb_primary_citation"].get("rcsb_authors", [])
-        journal         = entry["rcsb_primary_citation"].get("rcsb_journal_abbrev", "N/A")
-
-        # Catalytic sites
-        m_csa_sites    = get_m_csa_active_sites(pdb_id)
-
-        uniprot_ids = get_uniprot_ids_from_sifts(pdb_id)
-        
-
-        if uniprot_ids:
-            print(uniprot_ids)
-            uniprot_id = uniprot_ids[0]
-            up_features = fetch_uniprot_features(uniprot_id)
-        else:
-            uniprot_id = None
-            up_features = {
-                "features": [],
-                "comments": [],
-                "proteinDescription": {},
-                "genes": []
-            }
-
-        # Sequence conservation (optional MSA)
-        # msa = run_blast(sequence)
-        # cons_scores = conservation_scores(msa)
-
-        hotspots = find_hotspots("temp.pdb")
-
-        gpt_summary = {}
-
-        if up_features.get("comments"):
-                comments = up_features["comments"]
-                all_texts = []
-
-                for comment in comments:
-                    if comment.get("texts"):
-                        for text in comment["texts"]:
-                            all_texts.append(text.get("value", ""))
-                    elif comment.get("commentType") == "CATALYTIC ACTIVITY":
-                        reaction = comment.get("reaction", {}).get("name", "")
-                        ec = comment.get("reaction", {}).get("ecNumber", "")
-                        if reaction:
-                            all_texts.append(f"Catalytic Activity: {reaction} (EC {ec})")
-                    elif comment.get("commentType") == "SUBCELLULAR LOCATION":
-                        locations = comment.get("subcellularLocations", [])
-                        for loc in locations:
-                            val = loc.get("location", {}).get("value", "")
-                            if val:
-                                all_texts.append(f"Subcellular Location: {val}")
-                    elif comment.get("commentType") == "INTERACTION":
-                        for interaction in comment.get("interactions", []):
-                            g1 = interaction.get("interactantOne", {}).get("geneName", "")
-                            g2 = interaction.get("interactantTwo", {}).get("geneName", "")
-                            count = interaction.get("numberOfExperiments", 0)
-                            all_texts.append(f"Interaction: {g1} ↔ {g2} ({count} experiments)")
-
-                # Combine everything
-                combined_text = "\n".join(all_texts)
-
-                prompt = f"""
-            You're an expert assistant for structural biologists.
-
-Based on the following UniProt annotations, extract and summarize key insights specifically related to:
-- Structure (e.g., domains, motifs, folding)
-- Function (e.g., enzymatic activity, pathways, immune evasion)
-- Sequence features (e.g., polymorphisms, post-translational mods, isoforms)
-
-Ignore irrelevant details like variants or drug names unless structurally significant.
-Summarize in bullet points with clear sections.
-Return the result strictly as a JSON object with keys: "Structure", "Function", "Sequence".
-
-            ---
-            {combined_text}
-            ---
-            """
-                try:
-                    gpt_response = openai.chat.completions.create(
-                        model="gpt-4",
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0.3
-                    ).choices[0].message.content
-
-                    gpt_summary = json.loads(gpt_response)
-
-                except Exception as e:
-                    st.warning(f"GPT summary failed: {e}")   
-   
-
-        # Layout
-        st.subheader(f"Results for {pdb_id.upper()}")
+        # Layout first, so each section fills in as soon as its stages finish
+        st.subheader(f"Results for {pdb_id}")
         tab1, tab2, tab3 = st.tabs(["Literature & Catalysis", "Sequence & Domains", "Mutations & Predictions"])
 
         with tab1:
-            st.markdown("### 📄 Paper Metadata")
-            st.markdown(f"- **DOI:** {doi}")
-            st.markdown(f"- **Title:** {title}")
-            st.markdown(f"- **Authors:** {', '.join(authors)}")
-            st.markdown(f"- **Journal:** {journal}")
-            
-            if up_features and "proteinDescription" in up_features:
-                st.markdown("### 🧬 UniProt Functional Annotations")
-
-                # Protein name and EC number
-                name = up_features.get("proteinDescription", {}).get("recommendedName", {}).get("fullName", {}).get("value", "N/A")
-                ec = up_features.get("proteinDescription", {}) \
-                .get("recommendedName", {}) \
-                .get("ecNumbers", [{}])[0] \
-                .get("value", "N/A")
-
-                st.markdown(f"- **Protein Name:** {name}")
-                st.markdown(f"- **EC Number:** {ec}")
-
-                # Gene name
-                genes_list = up_features.get("genes", [])
-                gene = genes_list[0].get("geneName", {}).get("value", "N/A") if genes_list else "N/A"
-                st.markdown(f"- **Gene:** {gene}")
-
-            with st.expander("🧬 Functional Roles (Click to expand)"):
-                for func in gpt_summary.get("Function", []):
-                    st.markdown(f"- {func}")
-
-
+            metadata_box = st.container()
+            uniprot_box  = st.container()
+            roles_box    = st.container()
             st.markdown("### 🧠 LLM Answer to Your Question")
-
-            if doi != "N/A":
-                ua_data = get_unpaywall_data(doi, EMAIL)
-                pdf_url = None
-                if ua_data:
-                    pdf_url = ua_data["doi_url"]
-                else:
-                    pdf_url = None
-
-                if pdf_url:
-                    paper_text = fetch_pdf_text(pdf_url)
-                    if True: # paper_text.strip() and "Error" not in paper_text and "Forbidden" not in paper_text
-                        prompt = f"""
-    You are an expert research assistant for protein engineers and biochemists.
-    Use the paper (DOI: {doi}) to answer the question.
-    
-    Question: {user_question}
-    ---
-    Paper Excerpt (first 10000 chars):
-    {paper_text}
-    ---
-    Answer:"""
-    
-                        try:
-                            answer = openai.chat.completions.create(
-                                model="gpt-4",
-                                messages=[{"role": "user", "content": prompt}],
-                                temperature=0.3
-                            ).choices[0].message.content
-    
-                            st.success("Answer generated by GPT-4:")
-                            st.write(answer)
-    
-                            with st.expander("📄 Show Paper Excerpt (first 10000 chars)"):
-                                st.write(paper_text)
-    
-                        except Exception as e:
-                            st.warning(f"LLM failed: {e}")
-                        else:
-                            st.warning("❌ Paper fetched but appears empty or unreadable. GPT will not attempt to answer.")
-                    else:
-                        st.warning("No open-access PDF found via Unpaywall.")
-                else:
-                    st.warning("DOI not found; skipping GPT literature summary.")
+            answer_box   = st.container()
 
         with tab2:
             st.markdown("### Sequence Features & Domains")
-            if uniprot_id:
-                st.markdown(f"**UniProt Accession**: [{uniprot_id}](https://www.uniprot.org/uniprotkb/{uniprot_id})")
-
-            if up_features and up_features.get("features"):
-                st.plotly_chart(
-                    plot_domains(up_features["features"], entry["rcsb_entry_info"]["polymer_monomer_count_maximum"]),
-                    use_container_width=True
-                )
-                with st.expander("🧬 Sequence Information (Click to expand)"):
-                    for seq in gpt_summary.get("Sequence", []):
-                        st.markdown(f"- {seq}")
-
-            else:
-                st.write("🔍 No UniProt domain annotations found.")
+            domains_box = st.container()
+            conservation_box = st.container()
 
         with tab3:
             st.markdown("### Structural Hotspots")
-            st.write(hotspots or "No hotspots detected.")
+            hotspots_box = st.container()
             st.markdown("---")
             st.markdown("### Mutation ΔΔG Predictions")
-            show_mutation_form()
+            mutation_box = st.container()
 
         st.markdown("### 🧬 3D Structure Viewer")
-        st.components.v1.html(build_3dmol_html(pdb_id), height=550)
+        viewer_box = st.container()
+        timings_box = st.container()
+
+        pipeline = build_analysis_pipeline(EMAIL)
+        results  = {}
+
+        def value(name, default=None):
+            result = results.get(name)
+            return result.value if result is not None and result.ok else default
+
+        def render_metadata():
+            with metadata_box:
+                if not results["metadata"].ok:
+                    st.error(f"❌ Error: {results['metadata'].error}")
+                    return
+                meta = value("metadata")
+                st.markdown("### 📄 Paper Metadata")
+                st.markdown(f"- **DOI:** {meta['doi']}")
+                st.markdown(f"- **Title:** {meta['title']}")
+                st.markdown(f"- **Authors:** {', '.join(meta['authors'])}")
+                st.markdown(f"- **Journal:** {meta['journal']}")
+
+        def render_uniprot():
+            _, up_features = value("uniprot", (None, {}))
+            if up_features and "proteinDescription" in up_features:
+                with uniprot_box:
+                    st.markdown("### 🧬 UniProt Functional Annotations")
+
+                    # Protein name and EC number
+                    name = up_features.get("proteinDescription", {}).get("recommendedName", {}).get("fullName", {}).get("value", "N/A")
+                    ec = up_features.get("proteinDescription", {}) \
+                    .get("recommendedName", {}) \
+                    .get("ecNumbers", [{}])[0] \
+                    .get("value", "N/A")
+
+                    st.markdown(f"- **Protein Name:** {name}")
+                    st.markdown(f"- **EC Number:** {ec}")
+
+                    # Gene name
+                    genes_list = up_features.get("genes", [])
+                    gene = genes_list[0].get("geneName", {}).get("value", "N/A") if genes_list else "N/A"
+                    st.markdown(f"- **Gene:** {gene}")
+
+        def render_roles():
+            with roles_box:
+                if not results["summary"].ok and not results["summary"].skipped:
+                    st.warning(f"GPT summary failed: {results['summary'].error}")
+                with st.expander("🧬 Functional Roles (Click to expand)"):
+                    for func in value("summary", {}).get("Function", []):
+                        st.markdown(f"- {func}")
+
+        def render_answer():
+            with answer_box:
+                meta = value("metadata")
+                if meta is None:
+                    return
+                if meta["doi"] == "N/A":
+                    st.warning("DOI not found; skipping GPT literature summary.")
+                elif not results["paper"].ok:
+                    st.warning(f"Paper download failed: {results['paper'].error}")
+                elif not value("paper"):
+                    st.warning("No open-access PDF found via Unpaywall.")
+                elif not results["answer_prompt"].ok:
+                    st.warning(f"LLM failed: {results['answer_prompt'].error}")
+                else:
+                    prompt, passages = value("answer_prompt")
+                    try:
+                        st.success("Answer generated by GPT-4:")
+                        st.write_stream(get_gateway().stream(prompt, model="gpt-4", temperature=0.3))
+                    except Exception as e:
+                        st.warning(f"LLM failed: {e}")
+
+                    with st.expander(f"📄 Show Passages Used ({len(passages)})"):
+                        for passage in passages:
+                            st.markdown(f"**{passage['heading'] or 'Passage'}** (score {passage['score']:.2f})")
+                            st.write(passage["text"])
+
+        def render_domains():
+            with domains_box:
+                uniprot_id, up_features = value("uniprot", (None, {}))
+                if uniprot_id:
+                    st.markdown(f"**UniProt Accession**: [{uniprot_id}](https://www.uniprot.org/uniprotkb/{uniprot_id})")
+
+                entry = value("entry")
+                if entry and up_features and up_features.get("features"):
+                    # Drawn in the first mapped chain's residue numbering when SIFTS maps it
+                    annotations = value("annotations")
+                    chain = annotations.chains[0] if annotations and annotations.chains else None
+                    st.plotly_chart(
+                        plot_domains(annotations if chain else up_features["features"],
+                                     entry["rcsb_entry_info"]["polymer_monomer_count_maximum"], chain),
+                        use_container_width=True
+                    )
+                    with st.expander("🧬 Sequence Information (Click to expand)"):
+                        for seq in value("summary", {}).get("Sequence", []):
+                            st.markdown(f"- {seq}")
+
+                else:
+                    st.write("🔍 No UniProt domain annotations found.")
+
+        def render_conservation():
+            # Only shown when a local homology database is configured
+            scores = value("conservation")
+            if scores:
+                with conservation_box:
+                    st.markdown("### Sequence Conservation")
+                    st.plotly_chart(plot_conservation(scores), use_container_width=True)
+
+        def render_hotspots():
+            with hotspots_box:
+                if not results["hotspot_analysis"].ok:
+                    st.error(f"❌ Error: {results['hotspot_analysis'].error}")
+                else:
+                    show_hotspot_explorer(value("hotspot_analysis"), value("structure_file"), value("annotations"))
+                frequency, n_models = value("hotspot_frequency") or ({}, 0)
+                if n_models:
+                    with st.expander(f"Ensemble hotspot frequency ({n_models} models)"):
+                        st.dataframe(
+                            {"Residue": list(frequency), "Frequency": list(frequency.values())},
+                            use_container_width=True,
+                        )
+
+        def render_mutation_form():
+            with mutation_box:
+                if not results["structure_file"].ok:
+                    st.error(f"❌ Error: {results['structure_file'].error}")
+                else:
+                    show_mutation_form(value("structure_file"), value("annotations"))
+
+        def render_viewer():
+            with viewer_box:
+                if not results["structure"].ok:
+                    st.error(f"❌ Error: {results['structure'].error}")
+                    return
+                # Without annotations the structure is still shown, in chain colors only
+                payload = value("viewer") or viewer_payload(value("structure"))
+                st.components.v1.html(build_3dmol_html(payload), height=550)
+                caption = f"{LOD_LABELS[payload['lod']]}: {payload['atoms']:,} of {payload['total_atoms']:,} atoms sent"
+                shown = {style.get("highlight") for style in payload["styles"]}
+                legend = " ".join(f":{name}[■ {label}]" for key, _, name, label in HIGHLIGHTS if key in shown)
+                st.caption(caption + (f" · {legend}" if legend else ""))
+
+        # Each section renders once all the stages it reads from have completed
+        sections = [
+            (("structure", "viewer"), render_viewer),
+            (("metadata",), render_metadata),
+            (("uniprot",), render_uniprot),
+            (("summary",), render_roles),
+            (("metadata", "paper", "answer_prompt"), render_answer),
+            (("entry", "uniprot", "summary", "annotations"), render_domains),
+            (("conservation",), render_conservation),
+            (("hotspot_analysis", "hotspot_frequency", "structure_file", "annotations"), render_hotspots),
+            (("structure_file", "annotations"), render_mutation_form),
+        ]
+
+        with st.spinner("Running analysis..."), (profile() if profile_run else nullcontext({})) as report:
+            for result in run_cached(pipeline, get_result_cache(), (("email", EMAIL),), pdb_id=pdb_id, question=question):
+                results[result.name] = result
+                for section in list(sections):
+                    needs, render = section
+                    if all(name in results for name in needs):
+                        sections.remove(section)
+                        render()
+
+        with timings_box:
+            path, chain_time = pipeline.critical_path()
+            with st.expander(f"⏱ Stage timings ({pipeline.wall_time:.2f} s total)"):
+                st.table({
+                    name: f"{elapsed:.3f} s" + (" (cached)" if name in pipeline.reused else "")
+                    for name, elapsed in pipeline.timings.items()
+                })
+                st.caption(f"Longest dependency chain: {' → '.join(path)} ({chain_time:.2f} s)")
+                if pipeline.reused:
+                    st.caption(f"{len(pipeline.reused)} of {len(pipeline.stages)} stages served from the result cache")
+            if show_debug:
+                show_metrics_panel(get_metrics(), report.get("text", ""))
 
     except Exception as e:
         st.error(f"❌ Error: {e}")
@@ -0,0 +1,266 @@
+"""
+Headless batch runner: annotate a list of PDB IDs or FASTA sequences without the UI.
+
+    python batch.py targets.txt --out results.jsonl
+    python batch.py targets.fasta --out results/ --format parquet --workers 8
+
+Entry, SIFTS and UniProt data for PDB ID targets are prefetched up front through
+the bulk endpoints. Network stages run concurrently on an asyncio loop, CPU stages
+(hotspots, conservation) on a process pool. Finished targets are recorded in a
+checkpoint file next to the output, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis import load_structure, load_uniprot, paper_metadata
+from data_fetch import (
+    fetch_structure,
+    fetch_uniprot_features_bulk,
+    get_m_csa_active_sites,
+    get_pdb_data,
+    get_pdb_data_bulk,
+    get_pdb_id_from_sequence,
+    get_uniprot_ids_from_sifts,
+    get_uniprot_ids_from_sifts_bulk,
+)
+from metrics import get_metrics
+from sequence_tools import column_profiles
+from structure_tools import find_hotspots
+
+PARQUET_SCHEMA_FIELDS = [
+    ("target", "string"),
+    ("pdb_id", "string"),
+    ("title", "string"),
+    ("doi", "string"),
+    ("uniprot_id", "string"),
+    ("n_features", "int64"),
+    ("n_active_sites", "int64"),
+    ("hotspots", "list<string>"),
+    ("conservation", "list<double>"),
+    ("error", "string"),
+    ("seconds", "double"),
+]
+
+
+def read_targets(path: str) -> list[tuple[str, str | None]]:
+    """
+    Returns (target id, sequence) pairs. Plain files hold one PDB ID per line
+    (blank lines and '#' comments ignored); FASTA files yield one pair per record.
+    """
+    with open(path) as fh:
+        text = fh.read()
+    if text.lstrip().startswith(">"):
+        from Bio import SeqIO
+        with open(path) as fh:
+            return [(rec.id, str(rec.seq)) for rec in SeqIO.parse(fh, "fasta")]
+    targets = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            targets.append((line.upper(), None))
+    return targets
+
+
+def cpu_hotspots(pdb_id: str, contact_threshold: int, distance_cutoff: float) -> list[str]:
+    return find_hotspots(load_structure(pdb_id), contact_threshold, distance_cutoff)
+
+
+def cpu_conservation(msa_path: str) -> list[float]:
+    from Bio import AlignIO
+    return column_profiles(AlignIO.read(msa_path, "fasta"))["majority"].tolist()
+
+
+def prefetch_annotations(pdb_ids: list[str]) -> dict:
+    """
+    Entry data, SIFTS mappings and UniProt annotations for all PDB ID targets through
+    the bulk endpoints, a few requests per few hundred IDs instead of three per target.
+    Targets missing here are fetched one by one in analyze_target.
+    """
+    if not pdb_ids:
+        return {"entries": {}, "uniprot_ids": {}, "uniprot": {}}
+    uniprot_ids = get_uniprot_ids_from_sifts_bulk(pdb_ids)
+    return {
+        "entries": get_pdb_data_bulk(pdb_ids),
+        "uniprot_ids": uniprot_ids,
+        "uniprot": fetch_uniprot_features_bulk(ids[0] for ids in uniprot_ids.values() if ids),
+    }
+
+
+class CheckpointedWriter:
+    """
+    Appends results to JSONL (one flush per record) or to Parquet part files
+    (one part per flush), and records finished targets in <out>.done.
+    """
+
+    def __init__(self, out: str, fmt: str, flush_every: int = 100):
+        self.out = out
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.done_path = out.rstrip("/\\") + ".done"
+        self.buffer: list[dict] = []
+        if fmt == "parquet":
+            os.makedirs(out, exist_ok=True)
+        self.done = set()
+        if os.path.exists(self.done_path):
+            with open(self.done_path) as fh:
+                self.done = {line.strip() for line in fh if line.strip()}
+
+    def write(self, record: dict):
+        if self.fmt == "jsonl":
+            with open(self.out, "a") as fh:
+                fh.write(json.dumps(record) + "\n")
+            self._mark_done([record["target"]])
+        else:
+            self.buffer.append(record)
+            if len(self.buffer) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        if self.fmt != "parquet" or not self.buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"string": pa.string(), "int64": pa.int64(), "double": pa.float64(),
+                 "list<string>": pa.list_(pa.string()), "list<double>": pa.list_(pa.float64())}
+        schema = pa.schema([(name, types[kind]) for name, kind in PARQUET_SCHEMA_FIELDS])
+        part = len([f for f in os.listdir(self.out) if f.endswith(".parquet")])
+        path = os.path.join(self.out, f"part-{part:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(self.buffer, schema=schema), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self._mark_done([r["target"] for r in self.buffer])
+        self.buffer = []
+
+    def _mark_done(self, targets: list[str]):
+        with open(self.done_path, "a") as fh:
+            fh.writelines(t + "\n" for t in targets)
+        self.done.update(targets)
+
+
+async def analyze_target(target: str, sequence: str | None, args, pool: ProcessPoolExecutor,
+                         network: asyncio.Semaphore, prefetched: dict) -> dict:
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    record = {name: None for name, _ in PARQUET_SCHEMA_FIELDS}
+    record["target"] = target
+    try:
+        async with network:
+            pdb_id = target if sequence is None else await asyncio.to_thread(get_pdb_id_from_sequence, sequence)
+        if not pdb_id:
+            raise LookupError("no matching PDB entry for sequence")
+        record["pdb_id"] = pdb_id
+
+        async def fetch(func, *a):
+            async with network:
+                return await asyncio.to_thread(func, *a)
+
+        async def entry():
+            if pdb_id in prefetched["entries"]:
+                return prefetched["entries"][pdb_id]
+            return await fetch(get_pdb_data, pdb_id)
+
+        async def uniprot():
+            ids = prefetched["uniprot_ids"].get(pdb_id)
+            if ids is None:
+                ids = await fetch(get_uniprot_ids_from_sifts, pdb_id)
+            if ids and ids[0] in prefetched["uniprot"]:
+                return ids[0], prefetched["uniprot"][ids[0]]
+            return await fetch(load_uniprot, ids)
+
+        async def hotspots():
+            # Prefetch the file so the worker process only parses it from the response cache
+            await fetch(fetch_structure, pdb_id)
+            # Worker processes keep their own metrics, so time the CPU stages from here
+            with get_metrics().timer("batch.cpu_hotspots"):
+                return await loop.run_in_executor(
+                    pool, cpu_hotspots, pdb_id, args.contact_threshold, args.distance_cutoff
+                )
+
+        entry_data, sites, (uniprot_id, up_features), hot = await asyncio.gather(
+            entry(), fetch(get_m_csa_active_sites, pdb_id), uniprot(), hotspots(),
+        )
+        meta = paper_metadata(entry_data)
+        record.update(
+            title=meta["title"], doi=meta["doi"], uniprot_id=uniprot_id,
+            n_features=len(up_features.get("features", [])), n_active_sites=len(sites), hotspots=hot,
+        )
+
+        msa_path = os.path.join(args.msa_dir, f"{target}.fasta") if args.msa_dir else None
+        if msa_path and os.path.exists(msa_path):
+            with get_metrics().timer("batch.cpu_conservation"):
+                record["conservation"] = await loop.run_in_executor(pool, cpu_conservation, msa_path)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - t0
+    return record
+
+
+async def run(args) -> int:
+    # A target listed twice would run twice, with two worker processes parsing and
+    # storing the same entry at once; the first listing wins
+    unique = {}
+    for target, sequence in read_targets(args.targets):
+        unique.setdefault(target, sequence)
+    targets = list(unique.items())
+    writer = CheckpointedWriter(args.out, args.format, args.flush_every)
+    todo = [(t, s) for t, s in targets if t not in writer.done]
+    print(f"{len(targets)} targets, {len(targets) - len(todo)} already done, {len(todo)} to run", file=sys.stderr)
+
+    prefetched = {"entries": {}, "uniprot_ids": {}, "uniprot": {}}
+    if not args.no_bulk:
+        try:
+            prefetched = await asyncio.to_thread(prefetch_annotations, [t for t, s in todo if s is None])
+        except Exception as e:
+            print(f"bulk prefetch failed, fetching per target: {type(e).__name__}: {e}", file=sys.stderr)
+
+    network = asyncio.Semaphore(args.concurrency)
+    # Bound the number of targets in flight so memory stays flat on long lists
+    in_flight = asyncio.Semaphore(args.concurrency * 2)
+    failures = 0
+
+    async def guarded(target, sequence):
+        async with in_flight:
+            return await analyze_target(target, sequence, args, pool, network, prefetched)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        tasks = [asyncio.create_task(guarded(t, s)) for t, s in todo]
+        for i, task in enumerate(asyncio.as_completed(tasks), 1):
+            record = await task
+            failures += record["error"] is not None
+            writer.write(record)
+            status = "error: " + record["error"] if record["error"] else f"{len(record['hotspots'] or [])} hotspots"
+            print(f"[{i}/{len(todo)}] {record['target']}: {status}", file=sys.stderr)
+    writer.flush()
+    return 1 if failures and failures == len(todo) else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("targets", help="file of PDB IDs (one per line) or FASTA records")
+    ap.add_argument("--out", required=True, help="JSONL file, or directory of Parquet parts")
+    ap.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="processes for CPU stages")
+    ap.add_argument("--concurrency", type=int, default=16, help="concurrent network requests")
+    ap.add_argument("--flush-every", type=int, default=100, help="records per Parquet part")
+    ap.add_argument("--msa-dir", help="directory of <target>.fasta alignments for conservation")
+    ap.add_argument("--contact-threshold", type=int, default=30)
+    ap.add_argument("--distance-cutoff", type=float, default=6.0)
+    ap.add_argument("--no-bulk", action="store_true",
+                    help="fetch entry and UniProt data per target instead of through the bulk endpoints")
+    ap.add_argument("--metrics", help="write timings and cache metrics here at the end "
+                                      "(JSON for .json, Prometheus text otherwise)")
+    args = ap.parse_args(argv)
+    try:
+        return asyncio.run(run(args))
+    finally:
+        if args.metrics:
+            get_metrics().write(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
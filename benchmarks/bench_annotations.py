@@ -0,0 +1,77 @@
+"""
+Residue annotation lookups on a large protein: building the AnnotationIndex, and
+hotspot-table-sized batches of residue queries through it against a linear scan of
+the feature list (what every "what covers A123" question cost before).
+"""
+import numpy as np
+from fixtures import synthetic_features
+from harness import benchmark
+
+from annotation_index import AnnotationIndex
+from ui import residue_rows
+
+SEQ_LENGTH = 34_350  # titin, the longest UniProt entry
+N_QUERIES = 500
+
+
+def segments(seq_length: int) -> list[dict]:
+    """
+    Two chains covering the protein in 5 SIFTS-like segments each, author numbering from 1.
+    """
+    bounds = np.linspace(1, seq_length + 1, 6).astype(int)
+    return [
+        {"chain_id": chain, "unp_start": int(lo), "unp_end": int(hi) - 1,
+         "start": {"author_residue_number": int(lo)}, "end": {"author_residue_number": int(hi) - 1}}
+        for chain in "AB" for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def features(n: int) -> list[dict]:
+    """
+    synthetic_features without its whole-length Chain features (a UniProt entry has
+    one or a few), plus a single mature chain.
+    """
+    kept = [f for f in synthetic_features(n, SEQ_LENGTH) if f["type"] != "Chain"]
+    return kept + [{"type": "Chain", "location": {"start": {"value": 1}, "end": {"value": SEQ_LENGTH}},
+                    "description": "Titin"}]
+
+
+class AnnotationCase:
+    def __init__(self, n: int):
+        self.features = features(n)
+        self.segments = segments(SEQ_LENGTH)
+        self.index = AnnotationIndex.build(self.features, self.segments)
+        rng = np.random.default_rng(0)
+        self.residues = [f"{'AB'[c]}{r}" for c, r in zip(rng.integers(0, 2, N_QUERIES),
+                                                         rng.integers(1, SEQ_LENGTH + 1, N_QUERIES))]
+        assert [r["Annotations"] for r in residue_rows(self.residues[:20], self.index)] == \
+            [r["Annotations"] for r in linear_rows(self.residues[:20], self.features)]
+
+
+def linear_rows(residues: list[str], features: list[dict]) -> list[dict]:
+    # Author numbering equals UniProt numbering in these segments
+    rows = []
+    for label in residues:
+        pos = int(label[1:])
+        hits = [f for f in features if f["type"] != "Chain"
+                and f["location"]["start"]["value"] <= pos <= f["location"]["end"]["value"]]
+        hits.sort(key=lambda f: (f["location"]["start"]["value"], f["location"]["end"]["value"]))
+        rows.append({"Residue": label, "UniProt": pos, "Annotations": "; ".join(
+            f"{f['type']}: {f['description'].strip() or f['type'].title() + ' ' + str(f['location']['start']['value']) + '-' + str(f['location']['end']['value'])}"
+            for f in hits)})
+    return rows
+
+
+@benchmark("annotations.build", params=[1_000, 20_000], quick_params=[1_000], setup=AnnotationCase, repeat=3)
+def build(case):
+    AnnotationIndex.build(case.features, case.segments)
+
+
+@benchmark("annotations.residue_rows", params=[1_000, 20_000], quick_params=[1_000], setup=AnnotationCase)
+def indexed(case):
+    residue_rows(case.residues, case.index)
+
+
+@benchmark("annotations.linear_scan", params=[1_000, 20_000], quick_params=[1_000], setup=AnnotationCase, repeat=3)
+def linear(case):
+    linear_rows(case.residues, case.features)
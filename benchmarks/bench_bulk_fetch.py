@@ -0,0 +1,179 @@
+"""
+Bulk entry / SIFTS / UniProt fetchers against per-ID calls, for N synthetic entries
+served by mock RCSB, PDBe and UniProt endpoints built from the 6LU7 recordings.
+
+Setup checks that the bulk results match the per-ID ones on every field the app
+reads; the mock UniProt search pages at MOCK_PAGE_SIZE so the cursor path is used.
+"""
+import json
+from urllib.parse import urlencode
+
+from fixtures import RESPONSES, OfflineUpstreams
+from harness import benchmark
+
+import data_fetch
+from analysis import paper_metadata
+
+MOCK_PAGE_SIZE = 25
+UNIPROT_FIELD_TYPES = {
+    "ft_domain": "Domain", "ft_region": "Region", "ft_repeat": "Repeat", "ft_motif": "Motif",
+    "ft_act_site": "Active site", "ft_binding": "Binding site", "ft_site": "Site", "ft_metal": "Metal binding",
+    "ft_disulfid": "Disulfide bond", "ft_crosslnk": "Cross-link", "ft_mod_res": "Modified residue",
+    "ft_chain": "Chain", "ft_helix": "Helix", "ft_strand": "Beta strand", "ft_turn": "Turn",
+    "ft_mutagen": "Mutagenesis",
+}
+UNIPROT_COMMENT_TYPES = {
+    "cc_function": "FUNCTION", "cc_catalytic_activity": "CATALYTIC ACTIVITY", "cc_subunit": "SUBUNIT",
+    "cc_subcellular_location": "SUBCELLULAR LOCATION", "cc_interaction": "INTERACTION",
+}
+
+
+def _recorded(fragment: str) -> dict:
+    with open(RESPONSES) as fh:
+        return next(r["json"] for r in json.load(fh)["responses"] if fragment in r["url"])
+
+
+ENTRY = _recorded("/core/entry/6LU7")
+SIFTS = _recorded("/mappings/uniprot/6lu7")["6lu7"]
+UNIPROT = _recorded("/uniprotkb/P0DTD1.json")
+
+
+def pdb_ids(n: int) -> list[str]:
+    return [f"9{i:03d}" for i in range(n)]
+
+
+def accession(pdb_id: str) -> str:
+    return f"Q9{pdb_id[1:]}0"
+
+
+def _json(data, headers: dict | None = None) -> tuple:
+    return 200, "application/json", json.dumps(data).encode(), headers or {}
+
+
+def _entry(pdb_id: str) -> dict:
+    return {**ENTRY, "rcsb_id": pdb_id}
+
+
+def _sifts(pdb_id: str) -> dict:
+    return {pdb_id.lower(): {"UniProt": {accession(pdb_id.upper()): next(iter(SIFTS["UniProt"].values()))}}}
+
+
+def _uniprot(acc: str, fields: list[str] | None = None) -> dict:
+    record = {**UNIPROT, "primaryAccession": acc}
+    if fields is None:
+        return record
+    feature_types = {UNIPROT_FIELD_TYPES[f] for f in fields if f in UNIPROT_FIELD_TYPES}
+    comment_types = {UNIPROT_COMMENT_TYPES[f] for f in fields if f in UNIPROT_COMMENT_TYPES}
+    kept = {"entryType": record["entryType"], "primaryAccession": acc}
+    if "protein_name" in fields:
+        kept["proteinDescription"] = record["proteinDescription"]
+    if "gene_names" in fields:
+        kept["genes"] = record["genes"]
+    kept["comments"] = [c for c in record["comments"] if c["commentType"] in comment_types]
+    kept["features"] = [f for f in record["features"] if f["type"] in feature_types]
+    return kept
+
+
+def graphql(path, query, body):
+    request = json.loads(body)
+    entries = []
+    for pdb_id in request["variables"]["ids"]:
+        entry = _entry(pdb_id)
+        citation = entry["rcsb_primary_citation"]
+        entries.append({
+            "rcsb_id": pdb_id,
+            "rcsb_entry_info": {"polymer_monomer_count_maximum": entry["rcsb_entry_info"]["polymer_monomer_count_maximum"]},
+            "rcsb_primary_citation": {k: citation.get(k) for k in
+                                      ("title", "rcsb_authors", "rcsb_journal_abbrev", "year", "pdbx_database_id_doi")},
+        })
+    return _json({"data": {"entries": entries}})
+
+
+def sifts_bulk(path, query, body):
+    mapping = {}
+    for pdb_id in body.decode().split(","):
+        mapping.update(_sifts(pdb_id.upper()))
+    return _json(mapping)
+
+
+def uniprot_search(path, query, body):
+    accessions = [term.split(":", 1)[1] for term in query["query"][0].split(" OR ")]
+    fields = query["fields"][0].split(",")
+    size = min(int(query["size"][0]), MOCK_PAGE_SIZE)
+    cursor = int(query.get("cursor", ["0"])[0])
+    page = [_uniprot(acc, fields) for acc in accessions[cursor:cursor + size]]
+    headers = {}
+    if cursor + size < len(accessions):
+        next_query = {k: v[0] for k, v in query.items()} | {"cursor": cursor + size}
+        headers["Link"] = f'<https://rest.uniprot.org/uniprotkb/search?{urlencode(next_query)}>; rel="next"'
+    return _json({"results": page}, headers)
+
+
+ROUTES = [
+    ("POST", "/data.rcsb.org/graphql", graphql),
+    ("GET", "/data.rcsb.org/rest/v1/core/entry/", lambda path, q, b: _json(_entry(path))),
+    ("POST", "/www.ebi.ac.uk/pdbe/api/mappings/uniprot/", sifts_bulk),
+    ("GET", "/www.ebi.ac.uk/pdbe/api/mappings/uniprot/", lambda path, q, b: _json(_sifts(path.upper()))),
+    ("GET", "/rest.uniprot.org/uniprotkb/search", uniprot_search),
+    ("GET", "/rest.uniprot.org/uniprotkb/", lambda path, q, b: _json(_uniprot(path.removesuffix(".json")))),
+]
+
+
+def single(ids: list[str]) -> tuple[dict, dict, dict]:
+    entries = {pdb_id: data_fetch.get_pdb_data(pdb_id) for pdb_id in ids}
+    mappings = {pdb_id: data_fetch.get_uniprot_ids_from_sifts(pdb_id) for pdb_id in ids}
+    features = {m[0]: data_fetch.fetch_uniprot_features(m[0]) for m in mappings.values() if m}
+    return entries, mappings, features
+
+
+def bulk(ids: list[str]) -> tuple[dict, dict, dict]:
+    mappings = data_fetch.get_uniprot_ids_from_sifts_bulk(ids)
+    entries = data_fetch.get_pdb_data_bulk(ids)
+    features = data_fetch.fetch_uniprot_features_bulk(m[0] for m in mappings.values() if m)
+    return entries, mappings, features
+
+
+def check(single_results: tuple, bulk_results: tuple):
+    entries, mappings, features = single_results
+    bulk_entries, bulk_mappings, bulk_features = bulk_results
+    assert bulk_mappings == mappings, "SIFTS mappings differ"
+    for pdb_id, entry in entries.items():
+        assert paper_metadata(bulk_entries[pdb_id]) == paper_metadata(entry), f"{pdb_id} citation differs"
+        assert (bulk_entries[pdb_id]["rcsb_entry_info"]["polymer_monomer_count_maximum"]
+                == entry["rcsb_entry_info"]["polymer_monomer_count_maximum"]), f"{pdb_id} length differs"
+    for acc, annotations in features.items():
+        got = bulk_features[acc]
+        assert got["proteinDescription"] == annotations["proteinDescription"] and got["genes"] == annotations["genes"]
+        assert got["comments"] == annotations["comments"], f"{acc} comments differ"
+        types = {UNIPROT_FIELD_TYPES[f] for f in data_fetch.UNIPROT_BULK_FIELDS if f in UNIPROT_FIELD_TYPES}
+        wanted = [f for f in annotations["features"] if f["type"] in types]
+        assert got["features"] == wanted, f"{acc} features differ"
+
+
+class BulkCase(OfflineUpstreams):
+    def __init__(self, n: int):
+        super().__init__(routes=ROUTES)
+        self.ids = pdb_ids(n)
+        check(single(self.ids), bulk(self.ids))
+        self.clear()
+
+    def fetch(self, func) -> dict:
+        requests, sent = self.server.requests, self.server.bytes_sent
+        func(self.ids)
+        n = len(self.ids)
+        return {
+            "requests": self.server.requests - requests,
+            "kb_per_entry": round((self.server.bytes_sent - sent) / n / 1024, 1),
+        }
+
+
+@benchmark("data_fetch.per_id_cold", params=[10, 200], quick_params=[10],
+           setup=BulkCase, before_each=BulkCase.clear, repeat=3, threshold=1.5)
+def per_id(case):
+    return case.fetch(single)
+
+
+@benchmark("data_fetch.bulk_cold", params=[10, 200], quick_params=[10],
+           setup=BulkCase, before_each=BulkCase.clear, repeat=3, threshold=1.5)
+def bulk_fetch(case):
+    return case.fetch(bulk)
@@ -0,0 +1,41 @@
+"""
+data_fetch against the recorded-response stand-in: cold (through the HTTP client
+and the local server) and warm (served from the response cache).
+"""
+from fixtures import UNPAYWALL_EMAIL, OfflineUpstreams
+from harness import benchmark
+
+import data_fetch
+
+PDB_ID = "6LU7"
+# nsp5 (Mpro), chain A of 6LU7
+MPRO = "SGFRKMAFPSGKVEGCMVQVTCGTTTLNGLWLDDVVYCPRHVICTSEDMLNPNYEDLLIRKSNHNFLVQAGNVQLRVIGHSMQNCVLKLKVDTANPKTPKYKFVRIQPGQTFSVLACYNGSPSGVYQCAMRPNFTIKGSFLNGSCGSVGFNIDYDCVSFCYMHHMELPTGVHAGTDLEGNFYGPFVDRQTAQAAGTDTTITVNVLAWLYAAVINGDRWFLNRFTTTLNDFNLVAMKYNYEPLTQDHVDILGPLSAQTGIAVLDMCASLKELLQNGMNGRTILGSALLEDEFTPFDVVRQCSGVTFQ"
+
+CALLS = {
+    "get_pdb_data": lambda: data_fetch.get_pdb_data(PDB_ID),
+    "fetch_structure": lambda: data_fetch.fetch_structure(PDB_ID),
+    "fetch_pdb_file": lambda: data_fetch.fetch_pdb_file(PDB_ID),
+    "get_uniprot_ids_from_sifts": lambda: data_fetch.get_uniprot_ids_from_sifts(PDB_ID),
+    "fetch_uniprot_features": lambda: data_fetch.fetch_uniprot_features("P0DTD1"),
+    "get_m_csa_active_sites": lambda: data_fetch.get_m_csa_active_sites(PDB_ID),
+    "get_unpaywall_data": lambda: data_fetch.get_unpaywall_data("10.1038/s41586-020-2223-y", UNPAYWALL_EMAIL),
+    "get_pdb_id_from_sequence": lambda: data_fetch.get_pdb_id_from_sequence(MPRO),
+}
+
+
+class FetchCase(OfflineUpstreams):
+    def __init__(self, name: str):
+        super().__init__()
+        self.call = CALLS[name]
+
+
+@benchmark("data_fetch.cold", params=list(CALLS), quick_params=["get_pdb_data", "fetch_structure"],
+           setup=FetchCase, before_each=FetchCase.clear, threshold=1.5)
+def cold(case):
+    case.call()
+
+
+@benchmark("data_fetch.warm", params=list(CALLS), quick_params=["get_pdb_data", "fetch_structure"],
+           setup=FetchCase)
+def warm(case):
+    case.call()
@@ -0,0 +1,23 @@
+"""
+UniProt feature grouping and the domain map figure on feature lists of increasing size.
+"""
+from fixtures import synthetic_features
+from harness import benchmark
+
+from ui import group_features_by_ontology, plot_domains
+
+SEQ_LENGTH = 7096  # pp1ab, the longest chain behind 6LU7
+
+
+@benchmark("features.group_by_ontology", params=[100, 1000, 10_000], quick_params=[100, 1000],
+           setup=lambda n: synthetic_features(n, SEQ_LENGTH))
+def group(features):
+    group_features_by_ontology(features)
+
+
+@benchmark("features.plot_domains", params=[50, 300, 1000, 3000], quick_params=[50, 300],
+           setup=lambda n: synthetic_features(n, SEQ_LENGTH), repeat=3)
+def plot(features):
+    # Streamlit serializes the figure on every render, so that is part of the cost
+    payload = plot_domains(features, SEQ_LENGTH).to_json()
+    return {"json_bytes": len(payload)}
@@ -0,0 +1,89 @@
+"""
+Compares the cell-list contact engine in find_hotspots with the original
+per-residue atom loop, on temp.pdb and on a synthetic 200k-atom structure.
+
+    python benchmarks/bench_hotspots.py [--atoms 200000] [--legacy-residues 200]
+
+The legacy loop is O(residues x atoms), so on the synthetic structure it is only
+timed on the first --legacy-residues residues and extrapolated to the full set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from Bio.PDB import PDBParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structure_tools import find_hotspots  # noqa: E402
+
+from fixtures import write_synthetic_pdb  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_hotspots(structure, contact_threshold=30, distance_cutoff=6.0, max_residues=None):
+    """
+    The original find_hotspots loop, kept here as the reference implementation.
+    """
+    atoms = list(structure.get_atoms())
+    hotspots = []
+    visited = []
+    for model in structure:
+        for chain in model:
+            for res in chain:
+                if 'CA' not in res:
+                    continue
+                if max_residues is not None and len(visited) >= max_residues:
+                    return sorted(hotspots), visited
+                visited.append(f"{chain.id}{res.id[1]}")
+                ca = res['CA'].get_vector()
+                count = sum(
+                    1 for atom in atoms
+                    if (atom.get_vector() - ca).norm() < distance_cutoff
+                )
+                if count > contact_threshold:
+                    hotspots.append(f"{chain.id}{res.id[1]}")
+    return sorted(hotspots), visited
+
+
+def bench(label: str, pdb_path: str, legacy_residues: int | None):
+    structure = PDBParser(QUIET=True).get_structure("X", pdb_path)
+    n_atoms = sum(1 for _ in structure.get_atoms())
+    n_res = sum(1 for res in structure.get_residues() if 'CA' in res)
+
+    t0 = time.perf_counter()
+    fast = find_hotspots(pdb_path)
+    t_fast = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    slow, visited = legacy_hotspots(structure, max_residues=legacy_residues)
+    seen = len(visited)
+    t_slow = (time.perf_counter() - t0) * n_res / max(seen, 1)
+
+    # Only the residues the legacy loop visited can be compared
+    visited = set(visited)
+    match = sorted(h for h in fast if h in visited) == slow
+    note = "" if seen == n_res else f" (legacy extrapolated from {seen} residues)"
+    print(f"{label}: {n_atoms} atoms, {n_res} residues")
+    print(f"  cell list : {t_fast:9.3f} s (includes parsing)")
+    print(f"  legacy    : {t_slow:9.3f} s{note}")
+    print(f"  speedup   : {t_slow / t_fast:9.1f}x   identical hotspots: {match}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--atoms", type=int, default=200_000)
+    ap.add_argument("--legacy-residues", type=int, default=200)
+    args = ap.parse_args()
+
+    bench("temp.pdb (6LU7)", os.path.join(ROOT, "temp.pdb"), legacy_residues=None)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdb")
+        write_synthetic_pdb(path, args.atoms)
+        bench(f"synthetic {args.atoms} atoms", path, legacy_residues=args.legacy_residues)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Cold import time of the app's modules, each in a fresh interpreter with
+`python -X importtime`, so a new top-level import shows up as a regression.
+
+Setup also checks the import budget: importing a module in DEFERRED must not load
+the heavy dependencies listed for it, which are only needed on some code paths.
+"""
+import os
+import subprocess
+import sys
+
+from fixtures import ROOT
+from harness import benchmark
+
+HEAVY = ("openai", "fitz", "pymupdf", "Bio.Blast", "Bio.Align", "Bio.SeqIO")
+DEFERRED = {
+    "data_fetch": HEAVY,
+    "llm": HEAVY,
+    "sequence_tools": HEAVY,
+    "analysis": HEAVY,
+    # The shell part of app.py plus ui's result widgets
+    "app": HEAVY,
+}
+MODULES = ["streamlit", "data_fetch", "llm", "sequence_tools", "analysis", "ui", "app"]
+
+
+def import_profile(module: str) -> tuple[dict[str, int], int]:
+    """
+    Imports module in a new interpreter and returns ({module: cumulative us}, total us)
+    from the -X importtime report.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=ROOT, env=env, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(cumulative)
+    return modules, modules.get(module, 0)
+
+
+class ImportCase:
+    def __init__(self, module: str):
+        self.module = module
+        loaded, _ = import_profile(module)
+        eager = [dep for dep in DEFERRED.get(module, ()) if dep in loaded]
+        assert not eager, f"importing {module} loads {', '.join(eager)}"
+
+
+@benchmark("imports.cold", params=MODULES, quick_params=["analysis", "app"], setup=ImportCase,
+           repeat=5, min_time=0, threshold=1.5)
+def cold_import(case):
+    loaded, total = import_profile(case.module)
+    return {"import_ms": round(total / 1000, 1), "modules": len(loaded)}
@@ -0,0 +1,38 @@
+"""
+PDF section chunking on local files, and PDF text download against the stand-in.
+"""
+from fixtures import TEMP_PDF, OfflineUpstreams, synthetic_pdf
+from harness import benchmark
+
+from data_fetch import chunk_pdf_sections, fetch_pdf_text
+
+PDF_URL = "https://www.nature.com/articles/s41586-020-2223-y.pdf"
+
+
+def pdf_bytes(source) -> bytes:
+    if source == "temp.pdf":
+        with open(TEMP_PDF, "rb") as fh:
+            return fh.read()
+    return synthetic_pdf(int(source.split("p")[0]))
+
+
+@benchmark("pdf.chunk_sections", params=["temp.pdf", "20p", "100p"], quick_params=["temp.pdf"], setup=pdf_bytes)
+def chunk(data):
+    return {"chunks": sum(1 for _ in chunk_pdf_sections(data))}
+
+
+@benchmark("pdf.chunk_sections_first", params=["100p"], quick_params=[], setup=pdf_bytes)
+def chunk_first(data):
+    # The retrieval index stops early; only the first pages should be extracted
+    next(chunk_pdf_sections(data))
+
+
+@benchmark("pdf.fetch_text_cold", setup=lambda _: OfflineUpstreams(), before_each=OfflineUpstreams.clear,
+           threshold=1.5)
+def fetch_cold(upstreams):
+    fetch_pdf_text(PDF_URL)
+
+
+@benchmark("pdf.fetch_text_warm", setup=lambda _: OfflineUpstreams())
+def fetch_warm(upstreams):
+    fetch_pdf_text(PDF_URL)
@@ -0,0 +1,99 @@
+"""
+Local seqres k-mer index: build time and size, direct searches, and
+get_pdb_id_from_sequence answered locally against the RCSB search round trip
+(recorded 6LU7 response on the stand-in server).
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from bench_data_fetch import MPRO
+from fixtures import OfflineUpstreams, write_synthetic_seqres
+from harness import benchmark
+
+import data_fetch
+import seqres_index
+from seqres_index import SeqresIndex
+
+
+def _mutant(sequence: str, n: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    residues = list(sequence)
+    for i in rng.choice(len(residues), n, replace=False):
+        residues[i] = "W" if residues[i] != "W" else "A"
+    return "".join(residues)
+
+
+QUERIES = {
+    "exact": MPRO,
+    "mutant": _mutant(MPRO, 3),
+    "fragment": MPRO[40:200],
+    "miss": "".join(np.random.default_rng(1).choice(list("ACDEFGHIKLMNPQRSTVWY"), 300)),
+}
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class SeqresCase:
+    """
+    A synthetic seqres dump of n_entries entries plus 6LU7, and its index.
+    """
+
+    def __init__(self, n_entries: int):
+        self.tmp = tempfile.mkdtemp()
+        self.fasta = os.path.join(self.tmp, "pdb_seqres.txt")
+        write_synthetic_seqres(self.fasta, n_entries, include={"6LU7": MPRO})
+        self.path = os.path.join(self.tmp, "index")
+        self.index = SeqresIndex.build(self.fasta, self.path)
+        assert self.index.search(MPRO, top_n=1)[0]["pdb_id"] == "6LU7"
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class SearchCase(SeqresCase):
+    def __init__(self, query: str):
+        super().__init__(20_000)
+        self.query = QUERIES[query]
+
+
+class LookupCase(OfflineUpstreams):
+    """
+    get_pdb_id_from_sequence with the process index swapped for a synthetic one
+    ("local"), or pointed at an empty directory so RCSB search is asked ("remote").
+    """
+
+    def __init__(self, mode: str):
+        super().__init__()
+        self.saved = seqres_index._default_index, seqres_index.SEQRES_INDEX
+        self.seqres = SeqresCase(2_000) if mode == "local" else None
+        seqres_index._default_index = self.seqres.index if self.seqres else None
+        seqres_index.SEQRES_INDEX = self.seqres.path if self.seqres else self._stack.enter_context(
+            tempfile.TemporaryDirectory())
+        assert data_fetch.get_pdb_id_from_sequence(MPRO) == "6LU7"
+
+    def close(self):
+        seqres_index._default_index, seqres_index.SEQRES_INDEX = self.saved
+        if self.seqres:
+            self.seqres.close()
+        super().close()
+
+
+@benchmark("seqres.build", params=[2_000, 20_000], quick_params=[2_000], setup=SeqresCase, repeat=3)
+def build(case):
+    index = SeqresIndex.build(case.fasta, case.path)
+    return {"sequences": index.meta["sequences"], "index_mb": round(_dir_bytes(case.path) / 1024 ** 2, 1)}
+
+
+@benchmark("seqres.search", params=list(QUERIES), quick_params=["exact", "miss"], setup=SearchCase)
+def search(case):
+    case.index.search(case.query)
+
+
+@benchmark("seqres.get_pdb_id_from_sequence", params=["local", "remote"],
+           setup=LookupCase, before_each=LookupCase.clear, threshold=1.5)
+def lookup(case):
+    data_fetch.get_pdb_id_from_sequence(MPRO)
@@ -0,0 +1,24 @@
+"""
+Alignment column statistics at several MSA shapes (sequences x columns).
+"""
+from fixtures import synthetic_msa
+from harness import benchmark
+
+from sequence_tools import column_profiles, conservation_scores
+
+SHAPES = ["50x300", "500x300", "2000x1200"]
+
+
+def msa(shape: str):
+    n_seqs, length = map(int, shape.split("x"))
+    return synthetic_msa(n_seqs, length)
+
+
+@benchmark("sequence.conservation_scores", params=SHAPES, quick_params=SHAPES[:2], setup=msa)
+def conservation(alignment):
+    conservation_scores(alignment)
+
+
+@benchmark("sequence.column_profiles", params=SHAPES, quick_params=SHAPES[:2], setup=msa)
+def profiles(alignment):
+    column_profiles(alignment)
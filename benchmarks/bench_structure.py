@@ -0,0 +1,46 @@
+"""
+Structure parsing and hotspot contact counting at several assembly sizes.
+"""
+from fixtures import TEMP_PDB, synthetic_pdb_bytes
+from harness import benchmark
+
+from structure_store import parse_structure
+from structure_tools import HotspotAnalysis, find_hotspots
+
+SIZES = ["6LU7", 20_000, 100_000]
+QUICK_SIZES = ["6LU7", 20_000]
+
+
+def pdb_bytes(size) -> bytes:
+    if size == "6LU7":
+        with open(TEMP_PDB, "rb") as fh:
+            return fh.read()
+    return synthetic_pdb_bytes(size)
+
+
+def parsed(size):
+    return parse_structure(pdb_bytes(size))
+
+
+@benchmark("structure.parse_pdb", params=SIZES, quick_params=QUICK_SIZES, setup=pdb_bytes)
+def parse(data):
+    structure = parse_structure(data)
+    return {"atoms": structure.n_atoms}
+
+
+@benchmark("hotspots.find_hotspots", params=SIZES, quick_params=QUICK_SIZES, setup=parsed)
+def hotspots(structure):
+    return {"hotspots": len(find_hotspots(structure))}
+
+
+@benchmark("hotspots.analysis_build", params=SIZES, quick_params=QUICK_SIZES, setup=parsed)
+def analysis_build(structure):
+    HotspotAnalysis(structure)
+
+
+@benchmark("hotspots.analysis_query", params=SIZES, quick_params=QUICK_SIZES,
+           setup=lambda size: HotspotAnalysis(parsed(size)))
+def analysis_query(analysis):
+    # Counts for a cutoff are cached after the first call, so this is the cost of a
+    # threshold / chain / range change in the explorer
+    analysis.hotspots(contact_threshold=25, distance_cutoff=6.0)
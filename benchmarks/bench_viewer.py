@@ -0,0 +1,77 @@
+"""
+3D viewer payload: build time and size at each level of detail, against the full PDB
+file the browser used to download from RCSB, and (with node on PATH) the page's
+client-side decode time, with 3Dmol itself stubbed out.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from fixtures import TEMP_PDB, synthetic_pdb_bytes
+from harness import benchmark
+
+from annotation_index import AnnotationIndex
+from structure_store import parse_structure
+from viewer import build_3dmol_html, viewer_payload
+
+# 6LU7 is drawn in full, 100k atoms as a backbone cartoon, 400k as a C-alpha trace
+SIZES = ["6LU7", 100_000, 400_000]
+QUICK_SIZES = ["6LU7", 100_000]
+# Stands in for 3Dmol and the DOM, so node runs the page script up to render()
+NODE_STUB = """
+const elt = { dataset: {} };
+globalThis.document = { getElementById: () => elt };
+globalThis.$3Dmol = { createViewer: () => ({
+  addModel: () => {}, setStyle: () => {}, addStyle: () => {}, zoomTo: () => {}, render: () => {} }) };
+process.on('exit', () => process.stdout.write(JSON.stringify({ render_ms: Number(elt.dataset.renderMs) })));
+console.log = () => {};
+"""
+
+
+class ViewerCase:
+    """
+    A parsed structure, with every 25th residue marked as a hotspot so the payload
+    carries highlight selections.
+    """
+
+    def __init__(self, size):
+        if size == "6LU7":
+            with open(TEMP_PDB, "rb") as fh:
+                data = fh.read()
+        else:
+            data = synthetic_pdb_bytes(size)
+        self.pdb_kb = round(len(data) / 1024)
+        self.structure = parse_structure(data)
+        self.annotations = AnnotationIndex.build(hotspots=self.structure.residue_labels()[::25].tolist())
+
+
+class DecodeCase(ViewerCase):
+    def __init__(self, size):
+        super().__init__(size)
+        html = build_3dmol_html(viewer_payload(self.structure, self.annotations))
+        self.tmp = tempfile.mkdtemp()
+        self.script = os.path.join(self.tmp, "viewer.js")
+        with open(self.script, "w") as fh:
+            fh.write(NODE_STUB + re.findall(r"<script>(.*?)</script>", html, re.S)[0])
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+@benchmark("viewer.payload", params=SIZES, quick_params=QUICK_SIZES, setup=ViewerCase)
+def payload(case):
+    result = viewer_payload(case.structure, case.annotations)
+    return {
+        "lod": result["lod"], "atoms_sent": result["atoms"],
+        "html_kb": round(len(build_3dmol_html(result)) / 1024), "pdb_kb": case.pdb_kb,
+    }
+
+
+if shutil.which("node"):
+    @benchmark("viewer.client_decode", params=SIZES, quick_params=QUICK_SIZES, setup=DecodeCase, repeat=3)
+    def client_decode(case):
+        proc = subprocess.run(["node", case.script], capture_output=True, text=True, check=True)
+        return json.loads(proc.stdout)
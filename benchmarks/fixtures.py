@@ -0,0 +1,292 @@
+"""
+Offline inputs for the benchmarks: synthetic structures, alignments, feature lists
+and PDFs, plus a local HTTP stand-in that replays recorded upstream responses.
+"""
+import contextlib
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+RESPONSES = os.path.join(FIXTURE_DIR, "responses.json")
+TEMP_PDB = os.path.join(ROOT, "temp.pdb")
+TEMP_PDF = os.path.join(ROOT, "temp.pdf")
+UNPAYWALL_EMAIL = "bench@example.org"
+
+FEATURE_TYPES = [
+    "Domain", "Region", "Motif", "Binding site", "Active site", "Site", "Metal binding",
+    "Disulfide bond", "Cross-link", "Modified residue", "Helix", "Beta strand", "Turn", "Chain",
+]
+
+
+def write_synthetic_pdb(path: str, n_atoms: int, seed: int = 0):
+    """
+    Writes a protein-density random-walk assembly with 8 atoms per residue.
+    """
+    rng = np.random.default_rng(seed)
+    atom_names = ["N", "CA", "C", "O", "CB", "CG", "CD", "CE"]
+    chains = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    n_res = n_atoms // len(atom_names)
+    res_per_chain = 900
+    box = (n_atoms / 0.05) ** (1 / 3)  # ~0.05 atoms / Å^3, close to a packed protein
+    lines = []
+    serial = 0
+    for r in range(n_res):
+        chain = chains[(r // res_per_chain) % len(chains)]
+        resseq = r % res_per_chain + 1
+        if resseq == 1:
+            pos = rng.uniform(0, box, 3)
+        else:
+            pos = np.clip(pos + rng.normal(0, 2.2, 3), 0, box)
+        for name in atom_names:
+            xyz = pos + rng.normal(0, 1.2, 3)
+            serial += 1
+            lines.append(
+                f"ATOM  {serial % 100000:5d} {name:<4s} ALA {chain}{resseq:4d}    "
+                f"{xyz[0]:8.3f}{xyz[1]:8.3f}{xyz[2]:8.3f}  1.00  0.00           {name[0]:>2s}"
+            )
+    lines.append("END")
+    with open(path, "w") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+def synthetic_pdb_bytes(n_atoms: int, seed: int = 0) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdb")
+        write_synthetic_pdb(path, n_atoms, seed)
+        with open(path, "rb") as fh:
+            return fh.read()
+
+
+def synthetic_msa(n_seqs: int, length: int, seed: int = 0, mutation_rate: float = 0.3, gap_rate: float = 0.05):
+    """
+    A MultipleSeqAlignment of mutated copies of one random ancestor, with gaps.
+    """
+    from Bio.Align import MultipleSeqAlignment
+    from Bio.Seq import Seq
+    from Bio.SeqRecord import SeqRecord
+
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+    ancestor = rng.choice(alphabet, length)
+    rows = np.tile(ancestor, (n_seqs, 1))
+    mutate = rng.random(rows.shape) < mutation_rate
+    rows[mutate] = rng.choice(alphabet, int(mutate.sum()))
+    rows[rng.random(rows.shape) < gap_rate] = ord("-")
+    return MultipleSeqAlignment(
+        SeqRecord(Seq(row.tobytes().decode()), id=f"seq{i}") for i, row in enumerate(rows)
+    )
+
+
+def write_synthetic_seqres(path: str, n_entries: int, seed: int = 0, include: dict[str, str] | None = None):
+    """
+    Writes a pdb_seqres.txt-style FASTA: n_entries random entries of 1-4 chains
+    (homomers repeat a sequence, as in the PDB), some nucleic acid records, and the
+    {entry ID: sequence} pairs in include as single-chain entries.
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+    families = [rng.choice(alphabet, rng.integers(60, 900)) for _ in range(max(1, n_entries // 3))]
+    with open(path, "w") as fh:
+        for pdb_id, sequence in (include or {}).items():
+            fh.write(f">{pdb_id.lower()}_A mol:protein length:{len(sequence)}  INCLUDED\n{sequence}\n")
+        for i in range(n_entries):
+            pdb_id = f"{1 + i // 46656}{np.base_repr(i % 46656, 36).lower():0>3}"
+            # Family members are point mutants of each other, like related PDB entries
+            seq = families[rng.integers(len(families))].copy()
+            mutate = rng.random(len(seq)) < 0.02
+            seq[mutate] = rng.choice(alphabet, int(mutate.sum()))
+            seq = seq.tobytes().decode()
+            for c in range(rng.integers(1, 5)):
+                fh.write(f">{pdb_id}_{'ABCD'[c]} mol:protein length:{len(seq)}  SYNTHETIC\n{seq}\n")
+            if i % 10 == 0:
+                fh.write(f">{pdb_id}_E mol:na length:12  DNA\nACGTACGTACGT\n")
+
+
+def synthetic_features(n: int, seq_length: int, seed: int = 0) -> list[dict]:
+    """
+    UniProt-style feature dicts (type, location, description) spread over seq_length.
+    """
+    rnd = random.Random(seed)
+    features = []
+    for i in range(n):
+        ftype = rnd.choice(FEATURE_TYPES)
+        start = rnd.randint(1, seq_length)
+        span = {"Domain": 200, "Region": 80, "Chain": seq_length, "Disulfide bond": 60, "Helix": 14}.get(ftype, 6)
+        end = min(seq_length, start + rnd.randint(0, span))
+        features.append({
+            "type": ftype,
+            "location": {"start": {"value": start}, "end": {"value": end}},
+            "description": f"{ftype} {i}" if rnd.random() < 0.7 else "",
+        })
+    return features
+
+
+def synthetic_pdf(n_pages: int, seed: int = 0) -> bytes:
+    """
+    A text-only PDF with an all-caps section heading every few pages.
+    """
+    import fitz
+
+    rnd = random.Random(seed)
+    words = ("protease residue binding catalytic structure inhibitor dimer substrate active site "
+             "cleavage mutation helix strand domain ligand affinity crystal resolution").split()
+    headings = ["INTRODUCTION", "RESULTS", "DISCUSSION", "METHODS", "STRUCTURE DETERMINATION", "REFERENCES"]
+    doc = fitz.open()
+    for p in range(n_pages):
+        page = doc.new_page()
+        lines = []
+        if p % 3 == 0:
+            lines.append(headings[(p // 3) % len(headings)])
+        for _ in range(45):
+            lines.append(" ".join(rnd.choice(words) for _ in range(12)))
+        page.insert_text((40, 50), "\n".join(lines), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class StandInServer:
+    """
+    Threaded local HTTP server replaying the recorded responses in responses.json.
+    Requests arrive as /<original host><original path>?<query>, see route_upstreams.
+
+    routes adds mock endpoints for requests with no recording: (method, path prefix,
+    handler) where handler(path, query, body) returns (status, content type, body,
+    headers) and path is the part after the prefix.
+    """
+
+    def __init__(self, manifest: str = RESPONSES, routes: list | None = None):
+        with open(manifest) as fh:
+            recorded = json.load(fh)["responses"]
+        self.responses = {}
+        for entry in recorded:
+            parts = urlsplit(entry["url"])
+            key = (entry["method"], f"/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else ""))
+            self.responses[key] = (entry["status"], entry["content_type"], self._body(entry))
+        self.routes = routes or []
+        self.hosts = sorted({urlsplit(entry["url"]).netloc for entry in recorded}
+                            | {prefix.split("/")[1] for _, prefix, _ in self.routes})
+        self.requests = 0
+        self.bytes_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; avoid the delayed-ACK stall
+            disable_nagle_algorithm = True
+
+            def _reply(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                status, content_type, body, headers = server.respond(
+                    method, self.path, self.rfile.read(length) if length else b""
+                )
+                server.requests += 1
+                server.bytes_sent += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply("GET")
+
+            def do_POST(self):
+                self._reply("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def respond(self, method: str, path: str, body: bytes) -> tuple[int, str, bytes, dict]:
+        if (method, path) in self.responses:
+            return (*self.responses[(method, path)], {})
+        parts = urlsplit(path)
+        for route_method, prefix, handler in self.routes:
+            if route_method == method and parts.path.startswith(prefix):
+                return handler(parts.path[len(prefix):], parse_qs(parts.query), body)
+        return 404, "text/plain", b"no recorded response", {}
+
+    @staticmethod
+    def _body(entry: dict) -> bytes:
+        if "json" in entry:
+            return json.dumps(entry["json"]).encode()
+        if "file" in entry:
+            with open(os.path.join(ROOT, entry["file"]), "rb") as fh:
+                data = fh.read()
+            return gzip.compress(data, mtime=0) if entry.get("gzip") else data
+        return entry.get("text", "").encode()
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@contextlib.contextmanager
+def route_upstreams(server: StandInServer, cache_dir: str):
+    """
+    Points the process-wide HTTP client at the stand-in (https://host/path becomes
+    <server>/host/path) with upstream rate limits lifted, and swaps in an empty
+    response cache under cache_dir. Both are restored on exit.
+    """
+    import http_cache
+    import http_client
+    from requests.adapters import HTTPAdapter
+
+    class RewriteAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            parts = urlsplit(request.url)
+            request.url = f"{server.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+            return super().send(request, **kwargs)
+
+    unlimited = {host: (1e9, 10 ** 9, 64) for host in server.hosts}
+    client = http_client.HttpClient(limits=unlimited)
+    client.session.mount("https://", RewriteAdapter(pool_maxsize=16, max_retries=0))
+    cache = http_cache.ResponseCache(os.path.join(cache_dir, "responses.sqlite3"))
+    saved = http_client._default_client, http_cache._default_cache
+    http_client._default_client, http_cache._default_cache = client, cache
+    try:
+        yield cache
+    finally:
+        http_client._default_client, http_cache._default_cache = saved
+
+
+class OfflineUpstreams:
+    """
+    Benchmark setup object: a running stand-in server with the HTTP client and
+    response cache routed to it until close(). clear() empties the cache so the next
+    call takes the cold (network) path.
+    """
+
+    def __init__(self, routes: list | None = None):
+        self._stack = contextlib.ExitStack()
+        self.server = self._stack.enter_context(StandInServer(routes=routes))
+        cache_dir = self._stack.enter_context(tempfile.TemporaryDirectory())
+        self.cache = self._stack.enter_context(route_upstreams(self.server, cache_dir))
+
+    def clear(self):
+        self.cache.clear()
+
+    def close(self):
+        self._stack.close()
@@ -0,0 +1,201 @@
+"""
+Minimal benchmark registry, timer and result comparison, in the spirit of
+pytest-benchmark / asv but without either dependency.
+
+    @benchmark("hotspots.find", params=[2_500, 20_000], setup=make_structure)
+    def find(structure):
+        find_hotspots(structure)
+
+setup(param) runs once per parameter and its return value is passed to the
+benchmark; before_each(ctx) runs untimed before every repetition (e.g. to clear a
+cache for a cold-path measurement). A benchmark may return a dict of extra numbers
+(payload bytes, row counts) that are stored next to the timings.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+DEFAULT_THRESHOLD = 1.25
+# Differences below this many seconds are timer noise, never regressions
+MIN_DELTA = 0.0005
+
+
+class Benchmark:
+    def __init__(self, name: str, func: Callable, params: list | None = None, quick_params: list | None = None,
+                 setup: Callable | None = None, before_each: Callable | None = None,
+                 repeat: int = 5, min_time: float = 0.2, threshold: float | None = None):
+        self.name = name
+        self.func = func
+        self.params = params if params is not None else [None]
+        self.quick_params = quick_params
+        self.setup = setup
+        self.before_each = before_each
+        self.repeat = repeat
+        self.min_time = min_time
+        self.threshold = threshold
+
+    def cases(self, quick: bool = False) -> list:
+        return self.quick_params if quick and self.quick_params is not None else self.params
+
+
+REGISTRY: list[Benchmark] = []
+
+
+def benchmark(name: str, params: list | None = None, quick_params: list | None = None,
+              setup: Callable | None = None, before_each: Callable | None = None,
+              repeat: int = 5, min_time: float = 0.2, threshold: float | None = None) -> Callable:
+    """
+    Registers the decorated function as a benchmark; threshold overrides the run-wide
+    regression ratio for noisy (e.g. network-bound) cases.
+    """
+    def decorate(func):
+        REGISTRY.append(Benchmark(name, func, params, quick_params, setup, before_each, repeat, min_time, threshold))
+        return func
+    return decorate
+
+
+def case_id(name: str, param) -> str:
+    return name if param is None else f"{name}[{param}]"
+
+
+def measure(bench: Benchmark, ctx, repeat: int | None = None) -> dict:
+    """
+    Times bench.func(ctx). With a before_each hook every repetition is a single
+    call; otherwise calls are looped until a repetition lasts min_time, and the
+    per-call time is reported.
+    """
+    repeat = repeat or bench.repeat
+    args = () if ctx is None else (ctx,)
+    if bench.before_each:
+        bench.before_each(ctx)
+    start = time.perf_counter()
+    extra = bench.func(*args)  # warm-up, and a first estimate of the call time
+    first = time.perf_counter() - start
+    number = 1
+    if bench.before_each is None and first < bench.min_time:
+        number = max(1, int(bench.min_time / max(first, 1e-7)))
+
+    samples = []
+    for _ in range(repeat):
+        if bench.before_each:
+            bench.before_each(ctx)
+        start = time.perf_counter()
+        for _ in range(number):
+            bench.func(*args)
+        samples.append((time.perf_counter() - start) / number)
+    result = {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": repeat,
+        "number": number,
+    }
+    if bench.threshold is not None:
+        result["threshold"] = bench.threshold
+    if isinstance(extra, dict):
+        result["extra"] = extra
+    return result
+
+
+def environment() -> dict:
+    import numpy
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def run(pattern: str = "", quick: bool = False, repeat: int | None = None, report=print) -> dict:
+    """
+    Runs every registered benchmark whose case id contains pattern and returns the
+    results document ({"meta": ..., "results": {case id: timings}}).
+    """
+    results = {}
+    for bench in REGISTRY:
+        for param in bench.cases(quick):
+            cid = case_id(bench.name, param)
+            if pattern and pattern not in cid:
+                continue
+            ctx = bench.setup(param) if bench.setup else param
+            try:
+                results[cid] = measure(bench, ctx, 3 if quick and repeat is None else repeat)
+            finally:
+                close = getattr(ctx, "close", None)
+                if callable(close):
+                    close()
+            r = results[cid]
+            extra = "".join(f"  {k}={v}" for k, v in r.get("extra", {}).items())
+            report(f"{cid:<52s} {format_seconds(r['median']):>10s}  (min {format_seconds(r['min'])}){extra}")
+    return {"meta": environment(), "results": results}
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds * 1e9:.3g} ns"
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD,
+            min_delta: float = MIN_DELTA) -> list[dict]:
+    """
+    Returns one row per case present in both documents: the median ratio and whether
+    it counts as a regression (slower by more than the case's threshold and by more
+    than min_delta seconds).
+    """
+    rows = []
+    for cid, new in current["results"].items():
+        old = baseline["results"].get(cid)
+        if old is None:
+            continue
+        limit = new.get("threshold", threshold)
+        ratio = new["median"] / old["median"] if old["median"] else float("inf")
+        rows.append({
+            "case": cid,
+            "baseline": old["median"],
+            "current": new["median"],
+            "ratio": ratio,
+            "regression": ratio > limit and new["median"] - old["median"] > min_delta,
+        })
+    return rows
+
+
+def format_comparison(rows: list[dict]) -> str:
+    lines = [f"{'case':<52s} {'baseline':>10s} {'current':>10s} {'ratio':>7s}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['case']:<52s} {format_seconds(row['baseline']):>10s} "
+            f"{format_seconds(row['current']):>10s} {row['ratio']:7.2f}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def load(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save(doc: dict, path: str):
+    with open(path, "w") as fh:
+        json.dump(doc, fh, indent=1, sort_keys=True)
+        fh.write("\n")
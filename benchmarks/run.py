@@ -0,0 +1,70 @@
+"""
+Runs the offline benchmark suite (every bench_*.py module in this directory) and
+compares results between commits.
+
+    python benchmarks/run.py --out results.json              # full run
+    python benchmarks/run.py --quick -k hotspots             # subset, smaller inputs
+    python benchmarks/run.py --baseline main.json --out pr.json
+    python benchmarks/run.py --compare main.json pr.json     # no run, exit 1 on regression
+
+No network is used: data_fetch and PDF downloads go to a local server replaying
+fixtures/responses.json, with an empty response cache in a temporary directory.
+"""
+import argparse
+import glob
+import importlib
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import harness  # noqa: E402
+
+
+def discover(modules: list[str] | None = None):
+    for path in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not modules or name in modules:
+            importlib.import_module(name)
+
+
+def report_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    rows = harness.compare(baseline, current, threshold)
+    print(harness.format_comparison(rows))
+    regressions = [row["case"] for row in rows if row["regression"]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {threshold:g}x: {', '.join(regressions)}")
+        return 1
+    print(f"\nno regressions over {threshold:g}x in {len(rows)} shared cases")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", dest="pattern", default="", help="only cases whose id contains this")
+    ap.add_argument("-m", "--module", action="append", help="only this bench_* module (repeatable)")
+    ap.add_argument("--quick", action="store_true", help="smaller inputs and 3 rounds, for a smoke run")
+    ap.add_argument("--repeat", type=int, help="rounds per case (default: per benchmark)")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare this run against")
+    ap.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two results files")
+    ap.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD,
+                    help="median slowdown ratio counted as a regression (default %(default)s)")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        return report_comparison(harness.load(args.compare[0]), harness.load(args.compare[1]), args.threshold)
+
+    discover(args.module)
+    current = harness.run(args.pattern, args.quick, args.repeat)
+    if args.out:
+        harness.save(current, args.out)
+    if args.baseline:
+        print()
+        return report_comparison(harness.load(args.baseline), current, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,83 +1,240 @@
+import logging
 import requests
-import fitz  # PyMuPDF
 import re
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Iterable, Iterator
+from urllib.parse import urlencode
 
+from http_cache import cached_get, cached_post, get_cache
+from http_client import gunzip_limited
+from metrics import timed
+from seqres_index import get_seqres_index
+from structure_store import MAX_STRUCTURE_BYTES
 
+if TYPE_CHECKING:
+    import fitz
+
+logger = logging.getLogger(__name__)
+
+MAX_PDF_BYTES = 50 * 1024 * 1024
+# Tried in order: compressed BinaryCIF is the smallest and fastest to parse, and every
+# entry has an mmCIF file while large ones have no legacy PDB file
+STRUCTURE_URLS = {
+    "bcif": "https://models.rcsb.org/{}.bcif.gz",
+    "cif": "https://files.rcsb.org/download/{}.cif.gz",
+    "pdb": "https://files.rcsb.org/download/{}.pdb.gz",
+}
+SECTION_HEADING = re.compile(r"\n([A-Z ]{4,})\n")
+
+# IDs per request for the bulk fetchers; keeps request bodies and URLs well under upstream limits
+RCSB_BULK_CHUNK = 200
+SIFTS_BULK_CHUNK = 100
+UNIPROT_BULK_CHUNK = 100
+UNIPROT_PAGE_SIZE = 500
+# Only the entry fields the app reads (paper_metadata and the domain map length).
+# The alias keeps the REST spelling of the DOI key, so both shapes work with paper_metadata.
+RCSB_ENTRY_QUERY = """
+query entries($ids: [String!]!) {
+  entries(entry_ids: $ids) {
+    rcsb_id
+    rcsb_entry_info { polymer_monomer_count_maximum }
+    rcsb_primary_citation {
+      title
+      rcsb_authors
+      rcsb_journal_abbrev
+      year
+      pdbx_database_id_doi: pdbx_database_id_DOI
+    }
+  }
+}
+"""
+# Annotations the app renders: names, genes, the comment types summarized for the LLM
+# and the feature types on the domain map. Sequence, variants and cross-references,
+# most of a full record, are left out.
+UNIPROT_BULK_FIELDS = (
+    "accession", "protein_name", "gene_names",
+    "cc_function", "cc_catalytic_activity", "cc_subunit", "cc_subcellular_location", "cc_interaction",
+    "ft_domain", "ft_region", "ft_repeat", "ft_motif", "ft_compbias", "ft_zn_fing",
+    "ft_act_site", "ft_binding", "ft_site", "ft_disulfid", "ft_crosslnk", "ft_mod_res", "ft_lipid", "ft_carbohyd",
+    "ft_chain", "ft_peptide", "ft_signal", "ft_transmem", "ft_topo_dom", "ft_helix", "ft_strand", "ft_turn",
+)
+LINK_NEXT = re.compile(r'<([^>]+)>;\s*rel="next"')
+# A local seqres hit at least this good is returned without asking RCSB search
+LOCAL_MIN_IDENTITY = 0.95
+LOCAL_MIN_COVERAGE = 0.9
+
+
+def _chunks(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _unique(ids: Iterable[str], normalize) -> list[str]:
+    return list(dict.fromkeys(normalize(i) for i in ids if i))
+
+
+@timed()
 def get_pdb_data(pdb_id: str) -> dict:
     """
     Fetches RCSB PDB entry JSON and adds polymer entity info for a given PDB ID.
     """
     pdb_id = pdb_id.upper()
     url = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-    r = requests.get(url)
+    r = cached_get(url, source="rcsb")
     r.raise_for_status()
     entry = r.json()
 
     return entry
 
+
+@timed()
+def fetch_pdb_file(pdb_id: str) -> bytes:
+    """
+    Downloads the legacy-format coordinate file for a PDB ID.
+    """
+    url = f"https://files.rcsb.org/download/{pdb_id.upper()}.pdb"
+    r = cached_get(url, source="rcsb_files")
+    r.raise_for_status()
+    return r.content
+
+
+@timed()
+def fetch_structure(pdb_id: str, formats: tuple[str, ...] | None = None) -> tuple[str, bytes]:
+    """
+    Downloads the coordinates of a PDB ID in the first available format and returns
+    (format, decompressed bytes). The gzipped body is what gets cached; it is
+    decompressed in memory in chunks, capped at MAX_STRUCTURE_BYTES.
+    """
+    if formats is None:
+        # BinaryCIF needs msgpack; without it start from mmCIF
+        formats = tuple(fmt for fmt in STRUCTURE_URLS if fmt != "bcif" or find_spec("msgpack"))
+    for fmt in formats:
+        r = cached_get(STRUCTURE_URLS[fmt].format(pdb_id.upper()), source="rcsb_files", max_bytes=MAX_STRUCTURE_BYTES)
+        if r.status_code == 404:
+            continue
+        r.raise_for_status()
+        return fmt, gunzip_limited(r.content, MAX_STRUCTURE_BYTES)
+    raise LookupError(f"No coordinate file found for {pdb_id}")
+
+
+@timed()
 def get_uniprot_ids_from_sifts(pdb_id: str) -> list[str]:
+    return list(get_sifts_mappings(pdb_id))
+
+
+@timed()
+def get_sifts_mappings(pdb_id: str) -> dict[str, list[dict]]:
+    """
+    SIFTS segments of pdb_id per mapped UniProt accession ({} when unmapped). Each
+    segment has chain_id, unp_start/unp_end and start/end author residue numbers.
+    """
     url = f"https://www.ebi.ac.uk/pdbe/api/mappings/uniprot/{pdb_id.lower()}"
-    r = requests.get(url)
+    r = cached_get(url, source="pdbe")
     if not r.ok:
-        return []
+        return {}
 
     data = r.json().get(pdb_id.lower(), {}).get("UniProt", {})
-    return list(data.keys()) 
+    return {accession: entry.get("mappings", []) for accession, entry in data.items()}
 
 
+@timed()
 def get_unpaywall_data(doi: str, email: str) -> dict | None:
     """
     Retrieves Unpaywall JSON for a given DOI.
     """
     url = f"https://api.unpaywall.org/v2/{doi}?email={email}"
-    r = requests.get(url)
+    r = cached_get(url, source="unpaywall")
     if r.status_code != 200:
         return None
     return r.json()
 
 
-def fetch_pdf_text(pdf_url: str, max_chars: int = 10000) -> str:
+@timed()
+def fetch_pdf_bytes(pdf_url: str, max_bytes: int = MAX_PDF_BYTES) -> bytes:
     """
-    Downloads a PDF and extracts up to max_chars of text.
+    Downloads a PDF into memory, refusing files larger than max_bytes.
     """
-    r = requests.get(pdf_url)
+    r = cached_get(pdf_url, source="pdf", max_bytes=max_bytes)
     r.raise_for_status()
-    with open("temp.pdf", "wb") as f:
-        f.write(r.content)
-    doc = fitz.open("temp.pdf")
-    text = "".join(page.get_text() for page in doc)
-    return text[:max_chars]
+    return r.content
+
+
+def open_pdf(pdf: str | bytes) -> "fitz.Document":
+    """
+    Opens a PDF from a path or from in-memory bytes, without touching the disk for the latter.
+    """
+    import fitz  # PyMuPDF; ~0.1 s to import, so only paths that read PDFs pay for it
+
+    if isinstance(pdf, (bytes, bytearray)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+
+def iter_pdf_pages(pdf: "str | bytes | fitz.Document") -> Iterator[str]:
+    """
+    Yields the text of each page, extracting a page only when it is requested.
+    """
+    doc = open_pdf(pdf) if isinstance(pdf, (str, bytes, bytearray)) else pdf
+    for page in doc:
+        yield page.get_text()
 
 
-def chunk_pdf_sections(pdf_path: str) -> list[str]:
+@timed()
+def fetch_pdf_text(pdf_url: str, max_chars: int = 10000, max_bytes: int = MAX_PDF_BYTES) -> str:
+    """
+    Downloads a PDF and extracts up to max_chars of text.
+    Pages after the one that fills the character budget are never extracted.
+    """
+    pieces = []
+    total = 0
+    for text in iter_pdf_pages(fetch_pdf_bytes(pdf_url, max_bytes)):
+        pieces.append(text)
+        total += len(text)
+        if total >= max_chars:
+            break
+    return "".join(pieces)[:max_chars]
+
+
+@timed()
+def chunk_pdf_sections(pdf: str | bytes) -> Iterator[str]:
     """
     Splits PDF text into sections based on naive heading detection.
+    Yields the same sequence as re.split on the full text (section, heading, section, ...),
+    but page by page, so callers can stop early without extracting the whole document.
     """
-    doc = fitz.open(pdf_path)
-    full_text = "".join(page.get_text() for page in doc)
-    # Simple split on all-caps headings
-    sections = re.split(r"\n([A-Z ]{4,})\n", full_text)
-    return sections
+    buffer = ""
+    for text in iter_pdf_pages(pdf):
+        buffer += text
+        pos = 0
+        # Simple split on all-caps headings; a match ending inside the buffer is final
+        for m in SECTION_HEADING.finditer(buffer):
+            yield buffer[pos:m.start()]
+            yield m.group(1)
+            pos = m.end()
+        buffer = buffer[pos:]
+    yield buffer
 
 
+@timed()
 def get_m_csa_active_sites(pdb_id: str) -> list[dict]:
     """
     Queries the M-CSA API for catalytic active site annotations.
     """
     url = f"https://www.ebi.ac.uk/thornton-srv/m-csa/rest/structure/{pdb_id.upper()}"
-    r = requests.get(url)
+    r = cached_get(url, source="m_csa")
     if r.ok:
         return r.json().get("activeSites", [])
     return []
 
 
+@timed()
 def fetch_uniprot_features(uniprot_id: str) -> dict:
     """
     Retrieves annotations from UniProt including features, comments, gene, and protein description.
     """
     url = f"https://rest.uniprot.org/uniprotkb/{uniprot_id}.json"
     try:
-        r = requests.get(url)
+        r = cached_get(url, source="uniprot")
         r.raise_for_status()
         data = r.json()
         return {
@@ -94,11 +251,102 @@ def fetch_uniprot_features(uniprot_id: str) -> dict:
             "genes": []
         }
 
+@timed()
+def get_pdb_data_bulk(pdb_ids: Iterable[str], chunk_size: int = RCSB_BULK_CHUNK) -> dict[str, dict]:
+    """
+    Entry data for many PDB IDs through the RCSB Data API GraphQL endpoint, one request
+    per chunk_size IDs, restricted to the fields in RCSB_ENTRY_QUERY.
+    Returns {PDB ID: entry}; IDs RCSB does not know are left out.
+    """
+    entries = {}
+    for chunk in _chunks(_unique(pdb_ids, str.upper), chunk_size):
+        r = cached_post(
+            "https://data.rcsb.org/graphql", source="rcsb",
+            json_body={"query": RCSB_ENTRY_QUERY, "variables": {"ids": chunk}},
+        )
+        r.raise_for_status()
+        payload = r.json()
+        data = payload.get("data") or {}
+        if payload.get("errors") and not data.get("entries"):
+            raise ValueError(f"RCSB GraphQL error: {payload['errors'][0].get('message')}")
+        for entry in data.get("entries") or []:
+            if entry:
+                entries[entry["rcsb_id"].upper()] = entry
+    return entries
+
+
+@timed()
+def get_uniprot_ids_from_sifts_bulk(pdb_ids: Iterable[str], chunk_size: int = SIFTS_BULK_CHUNK) -> dict[str, list[str]]:
+    """
+    SIFTS UniProt mappings for many PDB IDs, posted to the PDBe API as comma-separated
+    lists of chunk_size IDs. Returns {PDB ID: accessions} with an empty list for
+    unmapped entries, like get_uniprot_ids_from_sifts.
+    """
+    ids = _unique(pdb_ids, str.lower)
+    mappings = {pdb_id.upper(): [] for pdb_id in ids}
+    for chunk in _chunks(ids, chunk_size):
+        r = get_cache().request(
+            "POST", "https://www.ebi.ac.uk/pdbe/api/mappings/uniprot/", source="pdbe",
+            body=",".join(chunk).encode(), headers={"Content-Type": "text/plain"},
+        )
+        if not r.ok:
+            continue
+        for pdb_id, data in r.json().items():
+            mappings[pdb_id.upper()] = list(data.get("UniProt", {}).keys())
+    return mappings
+
+
+@timed()
+def fetch_uniprot_features_bulk(uniprot_ids: Iterable[str], fields: tuple[str, ...] = UNIPROT_BULK_FIELDS,
+                                chunk_size: int = UNIPROT_BULK_CHUNK) -> dict[str, dict]:
+    """
+    Annotations for many accessions from the UniProt search endpoint, an OR query per
+    chunk_size accessions with only the requested fields, following the Link header
+    through every result page. Returns {accession: annotations} in the
+    fetch_uniprot_features shape, empty for accessions UniProt does not return.
+    """
+    ids = _unique(uniprot_ids, str.strip)
+    records = {}
+    for chunk in _chunks(ids, chunk_size):
+        url = "https://rest.uniprot.org/uniprotkb/search?" + urlencode({
+            "query": " OR ".join(f"accession:{accession}" for accession in chunk),
+            "fields": ",".join(fields),
+            "format": "json",
+            "size": UNIPROT_PAGE_SIZE,
+        })
+        while url:
+            r = cached_get(url, source="uniprot")
+            r.raise_for_status()
+            for data in r.json().get("results", []):
+                records[data["primaryAccession"]] = {
+                    "features": data.get("features", []),
+                    "comments": data.get("comments", []),
+                    "proteinDescription": data.get("proteinDescription", {}),
+                    "genes": data.get("genes", []),
+                }
+            link = LINK_NEXT.search(r.headers.get("Link", ""))
+            url = link.group(1) if link else None
+    empty = {"features": [], "comments": [], "proteinDescription": {}, "genes": []}
+    return {accession: records.get(accession, dict(empty)) for accession in ids}
+
+
+@timed()
 def get_pdb_id_from_sequence(sequence: str) -> str | None:
+    """
+    Best-matching PDB ID for a protein sequence (FASTA or plain). A built local seqres
+    index answers exact and near-exact matches offline; RCSB sequence search is used
+    when there is no index or no local hit passes LOCAL_MIN_IDENTITY / LOCAL_MIN_COVERAGE.
+    """
     # Clean sequence (in case it's in FASTA format)
     if sequence.startswith(">"):
         sequence = "\n".join(line for line in sequence.splitlines() if not line.startswith(">"))
-        sequence = sequence.replace("\n", "")
+    sequence = "".join(sequence.split())
+
+    index = get_seqres_index()
+    if index is not None:
+        hits = index.search(sequence, top_n=1)
+        if hits and hits[0]["identity"] >= LOCAL_MIN_IDENTITY and hits[0]["coverage"] >= LOCAL_MIN_COVERAGE:
+            return hits[0]["pdb_id"]
 
     url = "https://search.rcsb.org/rcsbsearch/v2/query"
     query = {
@@ -119,12 +367,12 @@ def get_pdb_id_from_sequence(sequence: str) -> str | None:
     }
 
     try:
-        r = requests.post(url, json=query)
+        r = cached_post(url, source="rcsb_search", json_body=query)
         r.raise_for_status()
         result = r.json()
         hits = result.get("result_set", [])
         if hits:
             return hits[0]["identifier"]  # Return top hit
     except Exception as e:
-        st.warning(f"Sequence → PDB search failed: {e}")
+        logger.warning("Sequence → PDB search failed: %s", e)
     return None
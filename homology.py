@@ -0,0 +1,346 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Align import MultipleSeqAlignment, substitution_matrices
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from http_cache import CACHE_DIR
+from metrics import timed
+
+MSA_CACHE_DIR = os.path.join(CACHE_DIR, "msa")
+HOMOLOGY_DB = os.getenv("PROTAI_HOMOLOGY_DB")
+
+_BLOSUM = substitution_matrices.load("BLOSUM62")
+ALPHABET = _BLOSUM.alphabet
+SUBSTITUTION = np.array(_BLOSUM, dtype=np.int32)
+# ASCII byte -> matrix index; anything unknown scores as X
+CODES = np.full(256, ALPHABET.index("X"), dtype=np.uint8)
+for _i, _aa in enumerate(ALPHABET):
+    CODES[ord(_aa)] = _i
+    CODES[ord(_aa.lower())] = _i
+
+NEG = -(1 << 28)
+
+
+def encode(sequence: str) -> np.ndarray:
+    return CODES[np.frombuffer(sequence.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+# Traceback bits kept per cell: where H came from (low two bits), and whether E and F
+# opened their gap there rather than extending one
+STOP, DIAGONAL, FROM_E, FROM_F = 0, 1, 2, 3
+E_OPENED, F_OPENED = 4, 8
+
+
+def smith_waterman(query: np.ndarray, targets: list[np.ndarray], gap_open: int = 11, gap_extend: int = 1,
+                   keep: bool = False):
+    """
+    Affine-gap Smith-Waterman of one encoded query against a batch of encoded targets,
+    swept along anti-diagonals so every cell of a diagonal, for every target, is
+    computed in one NumPy step. A gap of length L costs gap_open + L * gap_extend.
+
+    Returns the best local score per target. With keep=True it also returns the
+    traceback bits of every cell, one byte each, indexed [target, query position,
+    target position], and the (query, target) position of each target's best cell.
+    """
+    n = len(query)
+    lengths = np.array([len(t) for t in targets])
+    m = int(lengths.max()) if len(targets) else 0
+    width = max(m, 1)
+    batch = len(targets)
+    padded = np.zeros((batch, width), dtype=np.uint8)
+    for b, t in enumerate(targets):
+        padded[b, :len(t)] = t
+
+    go, ge = gap_open + gap_extend, gap_extend
+    i = np.arange(1, n + 1)
+    qsub = SUBSTITUTION[query]  # (n, alphabet)
+    target_len = lengths[:, None]
+    h2 = np.zeros((batch, n + 1), dtype=np.int32)
+    h1 = np.zeros((batch, n + 1), dtype=np.int32)
+    e1 = np.full((batch, n + 1), NEG, dtype=np.int32)
+    f1 = np.full((batch, n + 1), NEG, dtype=np.int32)
+    best = np.zeros(batch, dtype=np.int32)
+    if keep:
+        trace = np.zeros((batch, n + 1, width + 1), dtype=np.uint8)
+        # Cell (i, d - i) of a row-major matrix sits at flat offset i * width + d
+        flat = trace.reshape(batch, -1)
+        end = np.zeros((batch, 2), dtype=np.int64)
+
+    for d in range(2, n + m + 1):
+        j = d - i
+        valid = (j >= 1) & (j <= target_len)
+        tcodes = padded[:, np.minimum(np.maximum(j - 1, 0), width - 1)]
+        score = qsub[i - 1, tcodes] if batch else np.zeros((0, n), dtype=np.int32)
+
+        e_open, f_open = h1[:, 1:] - go, h1[:, :-1] - go
+        e = np.maximum(e_open, e1[:, 1:] - ge)
+        f = np.maximum(f_open, f1[:, :-1] - ge)
+        diagonal = h2[:, :-1] + score
+        h = np.maximum(np.maximum(diagonal, 0), np.maximum(e, f))
+
+        hn = np.empty_like(h1)
+        en = np.empty_like(e1)
+        fn = np.empty_like(f1)
+        hn[:, 0] = 0
+        en[:, 0] = NEG
+        fn[:, 0] = NEG
+        np.copyto(hn[:, 1:], np.where(valid, h, 0))
+        np.copyto(en[:, 1:], np.where(valid, e, NEG))
+        np.copyto(fn[:, 1:], np.where(valid, f, NEG))
+        top = hn.max(axis=1)
+        if keep:
+            # DIAGONAL, else FROM_E, else FROM_F; STOP where h is 0
+            bits = (h != e).astype(np.uint8)
+            bits += 1
+            bits *= h != diagonal
+            bits += 1
+            bits *= h != 0
+            bits += (e == e_open) * np.uint8(E_OPENED)
+            bits += (f == f_open) * np.uint8(F_OPENED)
+            lo, hi = max(1, d - width), min(n, d - 1)
+            flat[:, lo * width + d:hi * width + d + 1:width] = bits[:, lo - 1:hi]
+            better = np.flatnonzero(top > best)
+            end[better, 0] = hn[better].argmax(axis=1)
+            end[better, 1] = d - end[better, 0]
+        np.maximum(best, top, out=best)
+        h2, h1, e1, f1 = h1, hn, en, fn
+
+    if keep:
+        return best, trace, end
+    return best
+
+
+def align_batch(query: np.ndarray, targets: list[np.ndarray], gap_open: int = 11,
+                gap_extend: int = 1) -> list[tuple[int, list[tuple[int, int]]]]:
+    """
+    Aligns a batch of targets and returns (score, aligned (query index, target index) pairs)
+    for each, in order.
+    """
+    best, trace, end = smith_waterman(query, targets, gap_open, gap_extend, keep=True)
+    return [traceback(trace[b], tuple(end[b]), int(best[b])) for b in range(len(targets))]
+
+
+def traceback(trace: np.ndarray, end: tuple[int, int], best: int) -> tuple[int, list[tuple[int, int]]]:
+    """
+    Walks one target's traceback bits (indexed [query position, target position]) back
+    from its best cell.
+    """
+    if best <= 0:
+        return 0, []
+    i, j = int(end[0]), int(end[1])
+    state = "H"
+    pairs = []
+    while i > 0 and j > 0:
+        cell = trace[i, j]
+        if state == "H":
+            source = cell & 3
+            if source == STOP:
+                break
+            if source == DIAGONAL:
+                pairs.append((i - 1, j - 1))
+                i, j = i - 1, j - 1
+            else:
+                state = "E" if source == FROM_E else "F"
+        elif state == "E":
+            state = "H" if cell & E_OPENED else "E"
+            j -= 1
+        else:
+            state = "H" if cell & F_OPENED else "F"
+            i -= 1
+    return best, pairs[::-1]
+
+
+class LocalSearchBackend:
+    """
+    Homology search over a user-supplied FASTA database: a k-mer prefilter picks
+    candidates, which are then scored with batched Smith-Waterman. Hits above
+    min_score are realigned with traceback and stacked into a query-anchored MSA.
+    """
+
+    def __init__(self, fasta_path: str, k: int = 3, max_candidates: int = 1000, max_hits: int = 250,
+                 min_score: int = 50, min_kmer_z: float = 4.0, batch_cells: int = 4_000_000):
+        self.fasta_path = fasta_path
+        self.k = k
+        self.max_candidates = max_candidates
+        self.max_hits = max_hits
+        self.min_score = min_score
+        self.min_kmer_z = min_kmer_z
+        self.batch_cells = batch_cells
+        self.ids = []
+        self.sequences = []
+        self.encoded = []
+        with open(fasta_path) as fh:
+            for rec in SeqIO.parse(fh, "fasta"):
+                self.ids.append(rec.id)
+                self.sequences.append(str(rec.seq))
+                self.encoded.append(encode(str(rec.seq)))
+        self._build_kmer_index()
+
+    @property
+    def signature(self) -> str:
+        st = os.stat(self.fasta_path)
+        return f"local:{os.path.abspath(self.fasta_path)}:{st.st_size}:{st.st_mtime_ns}:{self.k}:{self.min_score}"
+
+    def _kmers(self, codes: np.ndarray) -> np.ndarray:
+        if len(codes) < self.k:
+            return np.zeros(0, dtype=np.int64)
+        windows = np.lib.stride_tricks.sliding_window_view(codes.astype(np.int64), self.k)
+        return windows @ (len(ALPHABET) ** np.arange(self.k - 1, -1, -1))
+
+    def _build_kmer_index(self):
+        kmers, owners = [], []
+        for seq_id, codes in enumerate(self.encoded):
+            unique = np.unique(self._kmers(codes))
+            kmers.append(unique)
+            owners.append(np.full(len(unique), seq_id, dtype=np.int32))
+        kmers = np.concatenate(kmers) if kmers else np.zeros(0, dtype=np.int64)
+        owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int32)
+        order = np.argsort(kmers, kind="stable")
+        self._db_lengths = np.array([len(codes) for codes in self.encoded], dtype=np.float64)
+        self._kmer_keys = kmers[order]
+        self._kmer_owners = owners[order]
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """
+        Database indices sharing clearly more k-mers with the query than chance would
+        explain (z-score >= min_kmer_z against a random-sequence background), best first.
+        """
+        kmers = np.unique(self._kmers(query))
+        start = np.searchsorted(self._kmer_keys, kmers, side="left")
+        stop = np.searchsorted(self._kmer_keys, kmers, side="right")
+        hits = np.concatenate([self._kmer_owners[a:b] for a, b in zip(start, stop)] or [np.zeros(0, np.int32)])
+        shared = np.bincount(hits, minlength=len(self.ids))
+        expected = len(kmers) * -np.expm1(-self._db_lengths / 20.0 ** self.k)
+        z = (shared - expected) / np.sqrt(expected + 1)
+        ranked = np.argsort(-z, kind="stable")
+        ranked = ranked[(z[ranked] >= self.min_kmer_z) & (shared[ranked] >= 2)]
+        return ranked[:self.max_candidates]
+
+    def _batches(self, query: np.ndarray, indices: np.ndarray, cells: int):
+        """
+        Splits indices into consecutive runs whose padded DP matrices stay within cells.
+        """
+        lo = 0
+        while lo < len(indices):
+            hi = lo + 1
+            width = len(self.encoded[indices[lo]])
+            while hi < len(indices):
+                width = max(width, len(self.encoded[indices[hi]]))
+                if (hi - lo + 1) * len(query) * width > cells:
+                    break
+                hi += 1
+            yield lo, hi
+            lo = hi
+
+    def search(self, sequence: str) -> tuple[MultipleSeqAlignment, list[dict]]:
+        query = encode(sequence)
+        cands = self.candidates(query)
+        # Group candidates of similar length so padded batches waste little work
+        cands = cands[np.argsort([len(self.encoded[c]) for c in cands], kind="stable")]
+        scores = np.zeros(len(cands), dtype=np.int32)
+        for lo, hi in self._batches(query, cands, self.batch_cells):
+            scores[lo:hi] = smith_waterman(query, [self.encoded[c] for c in cands[lo:hi]])
+
+        keep = np.argsort(-scores, kind="stable")
+        keep = cands[keep[scores[keep] >= self.min_score][:self.max_hits]]
+        aligned = []
+        for lo, hi in self._batches(query, keep, self.batch_cells):
+            aligned.extend(align_batch(query, [self.encoded[c] for c in keep[lo:hi]]))
+
+        rows = [SeqRecord(Seq(sequence), id="query", description="")]
+        hits = []
+        for db_idx, (score, pairs) in zip(keep, aligned):
+            target = self.sequences[db_idx]
+            row = ["-"] * len(sequence)
+            for qi, tj in pairs:
+                row[qi] = target[tj]
+            identical = sum(sequence[qi] == target[tj] for qi, tj in pairs)
+            rows.append(SeqRecord(Seq("".join(row)), id=self.ids[db_idx], description=""))
+            hits.append({
+                "id": self.ids[db_idx],
+                "score": score,
+                "identity": identical / len(pairs) if pairs else 0.0,
+                "coverage": len(pairs) / len(sequence),
+            })
+        return MultipleSeqAlignment(rows), hits
+
+
+class RemoteBlastBackend:
+    """
+    NCBI BLAST over the network; HSPs are stacked into a query-anchored MSA.
+    """
+
+    def __init__(self, program: str = "blastp", database: str = "nr"):
+        self.program = program
+        self.database = database
+
+    @property
+    def signature(self) -> str:
+        return f"ncbi:{self.program}:{self.database}"
+
+    def search(self, sequence: str) -> tuple[MultipleSeqAlignment, list[dict]]:
+        from sequence_tools import run_blast
+
+        record = run_blast(sequence, self.program, self.database)
+        rows = [SeqRecord(Seq(sequence), id="query", description="")]
+        hits = []
+        for alignment in record.alignments:
+            hsp = alignment.hsps[0]
+            row = ["-"] * len(sequence)
+            qi = hsp.query_start - 1
+            for q, s in zip(hsp.query, hsp.sbjct):
+                if q == "-":
+                    continue
+                if s != "-":
+                    row[qi] = s
+                qi += 1
+            rows.append(SeqRecord(Seq("".join(row)), id=alignment.hit_id, description=""))
+            hits.append({
+                "id": alignment.hit_id,
+                "score": hsp.score,
+                "identity": hsp.identities / hsp.align_length,
+                "coverage": (hsp.query_end - hsp.query_start + 1) / len(sequence),
+            })
+        return MultipleSeqAlignment(rows), hits
+
+
+_backends: dict[str, LocalSearchBackend] = {}
+_backend_lock = threading.Lock()
+
+
+def get_backend(fasta_path: str | None = HOMOLOGY_DB):
+    """
+    Returns the local backend for fasta_path (loaded once per process), or None when
+    no local database is configured.
+    """
+    if not fasta_path:
+        return None
+    with _backend_lock:
+        if fasta_path not in _backends:
+            _backends[fasta_path] = LocalSearchBackend(fasta_path)
+        return _backends[fasta_path]
+
+
+@timed()
+def build_msa(sequence: str, backend=None) -> MultipleSeqAlignment:
+    """
+    Returns a query-anchored MSA for sequence, cached on disk by sequence and backend.
+    Uses the configured local database when backend is not given, NCBI BLAST otherwise.
+    """
+    from Bio import AlignIO
+
+    backend = backend or get_backend() or RemoteBlastBackend()
+    key = hashlib.sha256(f"{backend.signature}\n{sequence.upper()}".encode()).hexdigest()
+    path = os.path.join(MSA_CACHE_DIR, f"{key}.fasta")
+    if os.path.exists(path):
+        return AlignIO.read(path, "fasta")
+    msa, _ = backend.search(sequence)
+    os.makedirs(MSA_CACHE_DIR, exist_ok=True)
+    AlignIO.write(msa, path + ".tmp", "fasta")
+    os.replace(path + ".tmp", path)
+    return msa
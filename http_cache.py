@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import requests
+
+import http_client
+from metrics import get_metrics
+
+CACHE_DIR = os.getenv("PROTAI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "protaiagent"))
+CACHE_MAX_BYTES = int(os.getenv("PROTAI_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+DAY = 24 * 3600
+
+# Seconds a stored response is served without asking the upstream again
+SOURCE_TTLS = {
+    "rcsb": 7 * DAY,
+    "rcsb_files": 30 * DAY,
+    "rcsb_search": 1 * DAY,
+    "pdbe": 7 * DAY,
+    "m_csa": 30 * DAY,
+    "uniprot": 7 * DAY,
+    "unpaywall": 1 * DAY,
+    "pdf": 30 * DAY,
+}
+DEFAULT_TTL = 1 * DAY
+
+# 404 is cached too, so entries without M-CSA / SIFTS data do not hit the network again
+CACHEABLE_STATUS = (200, 404)
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response backed by a cache row or a live response.
+    """
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict, from_cache: bool):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class ResponseCache:
+    """
+    SQLite-backed HTTP response cache with per-source TTLs, size-bounded LRU eviction
+    and ETag / Last-Modified revalidation of stale entries.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, ttls: dict | None = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = {**SOURCE_TTLS, **(ttls or {})}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def request_key(method: str, url: str, body: bytes | None = None) -> str:
+        digest = hashlib.sha256(f"{method.upper()} {url}\n".encode())
+        digest.update(body or b"")
+        return digest.hexdigest()
+
+    def request(self, method: str, url: str, source: str, body: bytes | None = None,
+                headers: dict | None = None, max_bytes: int | None = None, **kwargs) -> CachedResponse:
+        """
+        Serves a fresh cached response, revalidates a stale one, or fetches and stores a new one.
+        With max_bytes the body is streamed and the download aborted once it grows past the cap.
+        Extra keyword arguments are passed through to the network request.
+        """
+        key = self.request_key(method, url, body)
+        row = self._lookup(key)
+        now = time.time()
+        ttl = self.ttls.get(source, DEFAULT_TTL)
+
+        if row and now - row["stored_at"] < ttl:
+            self._count("hits", source)
+            self._touch(key, now)
+            return self._to_response(row)
+
+        send_headers = dict(headers or {})
+        if row:
+            if row["headers"].get("ETag"):
+                send_headers["If-None-Match"] = row["headers"]["ETag"]
+            if row["headers"].get("Last-Modified"):
+                send_headers["If-Modified-Since"] = row["headers"]["Last-Modified"]
+
+        try:
+            self.counters["network_requests"] += 1
+            r = self._send(method, url, body=body, headers=send_headers, stream=max_bytes is not None, **kwargs)
+        except requests.exceptions.RequestException:
+            if row:
+                # Upstream is unreachable; a stale answer beats none
+                self._count("stale_served", source)
+                return self._to_response(row)
+            raise
+
+        if row and r.status_code == 304:
+            r.close()
+            self._count("revalidated", source)
+            with self._lock:
+                self._db.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+                self._db.commit()
+            return self._to_response(row)
+
+        self._count("misses", source)
+        content = http_client.read_limited(r, max_bytes) if max_bytes is not None else r.content
+        get_metrics().inc("protai_http_received_bytes_total", len(content), source=source)
+        # Link carries the next-page cursor of paginated APIs (UniProt search)
+        kept = {k: r.headers[k] for k in ("ETag", "Last-Modified", "Content-Type", "Link") if k in r.headers}
+        if r.status_code in CACHEABLE_STATUS:
+            self._store(key, source, url, r.status_code, kept, content, now)
+        return CachedResponse(url, r.status_code, content, kept, from_cache=False)
+
+    def get(self, url: str, source: str, **kwargs) -> CachedResponse:
+        return self.request("GET", url, source, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["revalidated"]
+        return {
+            **{k: self.counters[k] for k in ("hits", "misses", "revalidated", "stale_served", "evictions", "network_requests")},
+            "hit_rate": (self.counters["hits"] + self.counters["revalidated"]) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def _count(self, result: str, source: str):
+        self.counters[result] += 1
+        get_metrics().inc("protai_cache_lookups_total", source=source, result=result)
+
+    def _send(self, method: str, url: str, body: bytes | None, headers: dict, **kwargs):
+        return http_client.request(method, url, data=body, headers=headers, **kwargs)
+
+    def _lookup(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, stored_at = row
+        return {"url": url, "status": status, "headers": json.loads(headers), "body": body, "stored_at": stored_at}
+
+    def _touch(self, key: str, now: float):
+        with self._lock:
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+    def _store(self, key, source, url, status, headers, body, now):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, source, url, status, json.dumps(headers), body, len(body), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.counters["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _to_response(row: dict) -> CachedResponse:
+        return CachedResponse(row["url"], row["status"], row["body"], row["headers"], from_cache=True)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """
+    Returns the process-wide response cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite3"))
+    return _default_cache
+
+
+def cached_get(url: str, source: str, **kwargs) -> CachedResponse:
+    return get_cache().get(url, source, **kwargs)
+
+
+def cached_post(url: str, source: str, json_body=None, **kwargs) -> CachedResponse:
+    body = json.dumps(json_body, sort_keys=True).encode()
+    headers = {"Content-Type": "application/json", **kwargs.pop("headers", {})}
+    return get_cache().request("POST", url, source, body=body, headers=headers, **kwargs)
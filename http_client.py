@@ -0,0 +1,239 @@
+import email.utils
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    Retrying,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from metrics import get_metrics
+
+DEFAULT_TIMEOUT = (float(os.getenv("PROTAI_CONNECT_TIMEOUT", "5")), float(os.getenv("PROTAI_READ_TIMEOUT", "60")))
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRY_AFTER = 60.0
+
+# host -> (requests per second, burst size, max concurrent requests)
+UPSTREAM_LIMITS = {
+    "data.rcsb.org": (10.0, 20, 8),
+    "files.rcsb.org": (10.0, 20, 8),
+    "models.rcsb.org": (10.0, 20, 8),
+    "search.rcsb.org": (5.0, 10, 4),
+    "www.ebi.ac.uk": (10.0, 20, 6),
+    "rest.uniprot.org": (10.0, 20, 6),
+    "api.unpaywall.org": (5.0, 10, 4),
+    "dynamut-api.example.org": (2.0, 4, 4),
+    "mcsmp-api.example.org": (2.0, 4, 4),
+}
+DEFAULT_LIMITS = (5.0, 10, 4)
+
+
+class ResponseTooLarge(ValueError):
+    pass
+
+
+def read_limited(response: requests.Response, max_bytes: int, chunk_size: int = 64 * 1024) -> bytes:
+    """
+    Reads a streamed response body, aborting as soon as it grows past max_bytes.
+    """
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        response.close()
+        raise ResponseTooLarge(f"{response.url} is {int(declared)} bytes, over the {max_bytes} byte limit")
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            response.close()
+            raise ResponseTooLarge(f"{response.url} exceeded the {max_bytes} byte limit")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def gunzip_limited(data: bytes, max_bytes: int, chunk_size: int = 1024 * 1024) -> bytes:
+    """
+    Decompresses gzip data chunk by chunk, aborting once the output grows past max_bytes.
+    Data without the gzip magic number is returned unchanged.
+    """
+    if data[:2] != b"\x1f\x8b":
+        return data
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = []
+    size = 0
+    pending = data
+    while pending:
+        chunk = decompressor.decompress(pending, chunk_size)
+        pending = decompressor.unconsumed_tail
+        size += len(chunk)
+        if size > max_bytes:
+            raise ResponseTooLarge(f"Decompressed data exceeded the {max_bytes} byte limit")
+        chunks.append(chunk)
+        if decompressor.eof:
+            break
+    chunks.append(decompressor.flush())
+    return b"".join(chunks)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def retry_after_seconds(response: requests.Response) -> float | None:
+    """
+    Parses a Retry-After header given either as seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class wait_retry_after:
+    """
+    tenacity wait strategy: honor Retry-After when the upstream sent one,
+    otherwise fall back to jittered exponential backoff.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def __call__(self, retry_state) -> float:
+        outcome = retry_state.outcome
+        if outcome is not None and not outcome.failed:
+            seconds = retry_after_seconds(outcome.result())
+            if seconds is not None:
+                return min(seconds, MAX_RETRY_AFTER)
+        return self.fallback(retry_state)
+
+
+class HttpClient:
+    """
+    Shared requests.Session with keep-alive pools, default timeouts, retries with
+    backoff, and a token bucket plus concurrency cap per upstream host.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_attempts: int = 4, pool_maxsize: int = 16,
+                 limits: dict | None = None):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.limits = {**UPSTREAM_LIMITS, **(limits or {})}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.limits) + 4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._buckets: dict[str, TokenBucket] = {}
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_limits(self, host: str) -> tuple[TokenBucket, threading.BoundedSemaphore]:
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst, concurrency = self.limits.get(host, DEFAULT_LIMITS)
+                self._buckets[host] = TokenBucket(rate, burst)
+                self._slots[host] = threading.BoundedSemaphore(concurrency)
+            return self._buckets[host], self._slots[host]
+
+    def _send_once(self, method: str, url: str, **kwargs) -> requests.Response:
+        bucket, slots = self._host_limits(urlsplit(url).netloc)
+        bucket.acquire()
+        with slots:
+            return self.session.request(method, url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request, retrying connection errors, timeouts and 429/5xx responses.
+        When the retries run out the last response is returned (or the last error raised).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        started = time.perf_counter()
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_retry_after(wait_random_exponential(multiplier=0.5, max=30)),
+            retry=(
+                retry_if_exception_type((requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                | retry_if_result(lambda r: r.status_code in RETRY_STATUS)
+            ),
+            retry_error_callback=lambda state: state.outcome.result(),
+            reraise=True,
+        )
+        metrics = get_metrics()
+        try:
+            response = retrying(self._send_once, method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            metrics.inc("protai_http_requests_total", host=host, status=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("protai_http_request_seconds", time.perf_counter() - started, host=host)
+        metrics.inc("protai_http_requests_total", host=host, status=response.status_code)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """
+    Returns the process-wide HTTP client, creating it on first use.
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+    return _default_client
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    return get_client().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_client().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return get_client().post(url, **kwargs)
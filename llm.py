@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterator
+
+from http_cache import CACHE_DIR
+from metrics import get_metrics
+
+DEFAULT_MODEL = "gpt-4"
+DEFAULT_TTL = 30 * 24 * 3600
+MAX_ENTRIES = 5000
+MAX_RECORDS = 1000
+
+
+class CallRecord:
+    def __init__(self, model: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 first_token: float | None = None, source: str = "api"):
+        self.model = model
+        self.latency = latency
+        self.first_token = first_token
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        # "api", "cache" or "coalesced"
+        self.source = source
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class LLMGateway:
+    """
+    Single entry point for chat completions. Responses are cached by a hash of
+    (model, prompt, temperature) with a TTL and LRU eviction, identical requests that
+    are already in flight are coalesced onto one API call, and every call's latency
+    and token usage is recorded. Callers that parse the reply pass validate, so a
+    reply they cannot use is neither cached nor served from the cache.
+    """
+
+    def __init__(self, client=None, cache_path: str | None = None, ttl: float = DEFAULT_TTL,
+                 max_entries: int = MAX_ENTRIES):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.records: list[CallRecord] = []
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        cache_path = cache_path or os.path.join(CACHE_DIR, "llm.sqlite3")
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                usage TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def cache_key(model: str, prompt: str, temperature: float) -> str:
+        payload = json.dumps({"model": model, "prompt": prompt, "temperature": temperature}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _chat(self):
+        import openai  # ~0.7 s to import; paid by the first completion, not at start-up
+
+        return (self.client or openai).chat.completions
+
+    def _record(self, record: CallRecord):
+        metrics = get_metrics()
+        metrics.observe("protai_llm_seconds", record.latency, model=record.model, source=record.source)
+        metrics.inc("protai_llm_tokens_total", record.prompt_tokens, model=record.model, kind="prompt")
+        metrics.inc("protai_llm_tokens_total", record.completion_tokens, model=record.model, kind="completion")
+        with self._lock:
+            self.records.append(record)
+            del self.records[:-MAX_RECORDS]
+
+    def _cached(self, key: str, validate: Callable[[str], bool] | None = None) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT content, stored_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                return None
+            if validate is not None and not validate(row[0]):
+                self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0]
+
+    def _store(self, key: str, model: str, content: str, usage: dict):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(usage), now, now),
+            )
+            self._db.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def _claim(self, key: str) -> tuple[Future, bool]:
+        """
+        Returns (future, owner). The owner makes the API call; everyone else waits on the future.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def _release(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def complete(self, prompt: str, model: str = DEFAULT_MODEL, temperature: float = 0.3,
+                 validate: Callable[[str], bool] | None = None) -> str:
+        """
+        Returns the completion text for a single-user-message prompt. With validate,
+        only text it accepts is cached; rejected text is still returned.
+        """
+        return "".join(self.stream(prompt, model, temperature, validate))
+
+    def stream(self, prompt: str, model: str = DEFAULT_MODEL, temperature: float = 0.3,
+               validate: Callable[[str], bool] | None = None) -> Iterator[str]:
+        """
+        Yields the completion as it is generated. Cached and coalesced responses are
+        yielded as a single chunk.
+        """
+        key = self.cache_key(model, prompt, temperature)
+        t0 = time.perf_counter()
+        cached = self._cached(key, validate)
+        if cached is not None:
+            self._record(CallRecord(model, time.perf_counter() - t0, source="cache"))
+            yield cached
+            return
+
+        future, owner = self._claim(key)
+        if not owner:
+            content = future.result()
+            self._record(CallRecord(model, time.perf_counter() - t0, source="coalesced"))
+            yield content
+            return
+
+        # The previous owner may have finished between the cache check and the claim
+        cached = self._cached(key, validate)
+        if cached is not None:
+            future.set_result(cached)
+            self._release(key)
+            self._record(CallRecord(model, time.perf_counter() - t0, source="cache"))
+            yield cached
+            return
+
+        parts = []
+        usage = {}
+        first_token = None
+        try:
+            response = self._chat().create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in response:
+                if getattr(chunk, "usage", None):
+                    usage = {
+                        "prompt_tokens": chunk.usage.prompt_tokens,
+                        "completion_tokens": chunk.usage.completion_tokens,
+                    }
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token is None:
+                        first_token = time.perf_counter() - t0
+                    parts.append(delta)
+                    yield delta
+        except BaseException as e:
+            future.set_exception(e)
+            self._release(key)
+            raise
+
+        content = "".join(parts)
+        if validate is None or validate(content):
+            self._store(key, model, content, usage)
+        future.set_result(content)
+        self._release(key)
+        self._record(CallRecord(model, time.perf_counter() - t0, first_token=first_token, **usage))
+
+    def stats(self) -> dict:
+        with self._lock:
+            records = list(self.records)
+        api = [r for r in records if r.source == "api"]
+        return {
+            "calls": len(records),
+            "api_calls": len(api),
+            "cache_hits": sum(r.source == "cache" for r in records),
+            "coalesced": sum(r.source == "coalesced" for r in records),
+            "prompt_tokens": sum(r.prompt_tokens for r in api),
+            "completion_tokens": sum(r.completion_tokens for r in api),
+            "api_latency": sum(r.latency for r in api),
+        }
+
+
+_default_gateway = None
+_default_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Returns the process-wide gateway, creating it on first use.
+    """
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = LLMGateway()
+    return _default_gateway
@@ -0,0 +1,285 @@
+"""
+In-process metrics: labelled counters and latency histograms, a timing decorator /
+context manager, Prometheus text and JSON export, and an opt-in cProfile hook.
+
+    @timed()                                  # protai_call_seconds{name="data_fetch.get_pdb_data"}
+    def get_pdb_data(pdb_id): ...
+
+    with get_metrics().timer("hotspots.scan"):
+        ...
+
+    with profile() as report:                 # report["text"] once the block exits
+        pipeline.run(...)
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterator
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "protai_call_seconds": "Latency of instrumented functions",
+    "protai_call_errors_total": "Instrumented calls that raised",
+    "protai_pipeline_stage_seconds": "Latency of analysis pipeline stages",
+    "protai_http_request_seconds": "Latency of upstream HTTP requests, including retries",
+    "protai_http_requests_total": "Upstream HTTP responses by host and status",
+    "protai_http_received_bytes_total": "Response body bytes received from upstream",
+    "protai_cache_lookups_total": "HTTP response cache lookups by source and result",
+    "protai_result_cache_lookups_total": "Analysis stage result cache lookups by result",
+    "protai_llm_seconds": "LLM call latency",
+    "protai_llm_tokens_total": "LLM tokens by model and kind",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile (the largest bucket bound
+        for observations past the last bucket).
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and histograms keyed by metric name and labels.
+    """
+
+    def __init__(self):
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, metric: str, value: float = 1, /, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, metric: str, value: float, /, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(metric, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, metric: str = "protai_call_seconds"):
+        """
+        Records the elapsed time of the block under metric{name=...}, and counts the
+        block in protai_call_errors_total when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("protai_call_errors_total", name=name)
+            raise
+        finally:
+            self.observe(metric, time.perf_counter() - start, name=name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        JSON-serializable view: counters as {name: [{labels, value}]}, histograms with
+        count, sum, mean and approximate p50 / p95.
+        """
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key), "count": h.count, "sum": h.sum,
+                        "mean": h.sum / h.count if h.count else 0.0,
+                        "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in self.histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Writes JSON when path ends in .json, Prometheus text otherwise (e.g. for the
+        node_exporter textfile collector).
+        """
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w") as fh:
+            fh.write(text)
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _default_registry
+
+
+def timed(name: str | None = None, metric: str = "protai_call_seconds") -> Callable:
+    """
+    Decorator recording each call's latency under metric{name=...}; the name defaults
+    to module.qualname. Generator functions are timed over their whole iteration.
+    """
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with get_metrics().timer(label, metric):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(label, metric):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+class ProfileSession:
+    """
+    Collects cProfile runs from any thread while active. cProfile only sees the thread
+    it runs in, so pipeline stages profile themselves and report here. The active
+    session is a context variable: each Streamlit session's script thread has its own,
+    and pipeline workers run in a copy of the submitting thread's context.
+    """
+
+    def __init__(self):
+        self.profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profiles.append(profiler)
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=out)
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+_active_session: contextvars.ContextVar[ProfileSession | None] = contextvars.ContextVar(
+    "protai_profile_session", default=None
+)
+
+
+@contextlib.contextmanager
+def profiled():
+    """
+    Profiles the enclosed block into the active profile session, if there is one.
+    """
+    session = _active_session.get()
+    if session is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        session.add(profiler)
+
+
+@contextlib.contextmanager
+def profile(sort: str = "cumulative", limit: int = 40) -> Iterator[dict]:
+    """
+    Opt-in profiling of one run: the calling thread and every pipeline stage started
+    inside the block are profiled, and on exit the merged pstats report is stored in
+    the yielded dict under "text".
+    """
+    session = ProfileSession()
+    result = {"text": ""}
+    token = _active_session.set(session)
+    try:
+        with profiled():
+            yield result
+    finally:
+        _active_session.reset(token)
+        result["text"] = session.report(sort, limit)
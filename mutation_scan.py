@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
+
+from Bio.SeqUtils import seq1
+
+from annotation_index import parse_residue
+from http_cache import CACHE_DIR
+from predictors import predict_batch, upload_structure
+from structure_store import StructureArrays, open_structure
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def saturation_mutations(structure: StructureArrays | str | bytes, residues: list[str]) -> list[dict]:
+    """
+    Expands residues (e.g. find_hotspots output, 'A123') into all 19 substitutions each,
+    as {'chain', 'resnum', 'mutation'} dicts with mutations written like 'H41A'.
+    Residues that are missing from the structure or are not standard amino acids are skipped.
+    """
+    structure = open_structure(structure)
+    first_model = structure.res_model == (structure.res_model.min() if structure.n_residues else 0)
+    names = structure.res_name_vocab[structure.res_name]
+    wild_types = {}
+    for label, name in zip(structure.residue_labels()[first_model], names[first_model]):
+        wild_types.setdefault(str(label), seq1(str(name)))
+
+    mutations = []
+    for site in residues:
+        wt = wild_types.get(site, "X")
+        if wt not in AMINO_ACIDS:
+            continue
+        # Chain ids can be several characters long in mmCIF / BinaryCIF entries ('AA123')
+        chain, resnum = parse_residue(site)
+        for aa in AMINO_ACIDS:
+            if aa != wt:
+                mutations.append({"chain": chain, "resnum": resnum, "mutation": f"{wt}{resnum}{aa}"})
+    return mutations
+
+
+class MutationScanner:
+    """
+    Runs many mutations against one structure: the structure is uploaded once, mutations
+    are sent in batches with bounded parallelism, and results are memoized on disk by
+    (service, structure hash, chain, resnum, mutation).
+    """
+
+    def __init__(self, pdb_file: str | bytes, service: str = "dynamut", batch_size: int = 25,
+                 max_workers: int = 4, memo_path: str | None = None):
+        self.pdb_file = pdb_file
+        self.service = service
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        if isinstance(pdb_file, bytes):
+            self.structure_hash = hashlib.sha256(pdb_file).hexdigest()
+        else:
+            with open(pdb_file, "rb") as fh:
+                self.structure_hash = hashlib.sha256(fh.read()).hexdigest()
+        self._structure_id = None
+        self._lock = threading.Lock()
+        memo_path = memo_path or os.path.join(CACHE_DIR, "mutations.sqlite3")
+        os.makedirs(os.path.dirname(memo_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(memo_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                service TEXT, structure TEXT, chain TEXT, resnum INTEGER, mutation TEXT, result TEXT,
+                PRIMARY KEY (service, structure, chain, resnum, mutation)
+            )
+        """)
+        self._db.commit()
+
+    def _memo_get(self, m: dict) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM predictions WHERE service = ? AND structure = ? AND chain = ? AND resnum = ? AND mutation = ?",
+                (self.service, self.structure_hash, m["chain"], m["resnum"], m["mutation"]),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _memo_put(self, m: dict, result: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)",
+                (self.service, self.structure_hash, m["chain"], m["resnum"], m["mutation"], json.dumps(result)),
+            )
+            self._db.commit()
+
+    def structure_id(self) -> str:
+        with self._lock:
+            if self._structure_id is None:
+                self._structure_id = upload_structure(self.service, self.pdb_file)
+            return self._structure_id
+
+    def _run_batch(self, batch: list[dict]) -> list[dict]:
+        results = predict_batch(self.service, self.structure_id(), batch)
+        merged = []
+        for m, result in zip(batch, results):
+            result = {**m, **result}
+            self._memo_put(m, result)
+            merged.append(result)
+        return merged
+
+    def scan(self, mutations: list[dict]) -> Iterator[list[dict]]:
+        """
+        Yields lists of results ({'chain', 'resnum', 'mutation', 'ddg', ...}) as they
+        become available: memoized results first, then each completed batch.
+        A failed batch yields its mutations with an 'error' key instead of a ddg.
+        """
+        known, todo = [], []
+        for m in mutations:
+            hit = self._memo_get(m)
+            if hit is not None:
+                known.append(hit)
+            else:
+                todo.append(m)
+        if known:
+            yield known
+        if not todo:
+            return
+
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._run_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield [{**m, "error": str(e)} for m in futures[future]]
@@ -0,0 +1,160 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+
+from metrics import get_metrics, profiled
+
+
+class Stage:
+    """
+    A named unit of work. func is called with the results of deps as keyword arguments.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], deps: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+class StageResult:
+    def __init__(self, name: str, value: Any = None, error: BaseException | None = None,
+                 started: float = 0.0, elapsed: float = 0.0, skipped: bool = False):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.started = started
+        self.elapsed = elapsed
+        self.skipped = skipped
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Pipeline:
+    """
+    Runs a dependency graph of stages on a thread pool. Every stage starts as soon as
+    all of its dependencies have finished, and results are yielded in completion order.
+    A stage whose dependency failed is not run; it is reported with that dependency's error.
+    """
+
+    def __init__(self, stages: Iterable[Stage], max_workers: int = 8):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        self.results: dict[str, StageResult] = {}
+        # Stages whose result was passed in via reuse on the last run
+        self.reused: set[str] = set()
+        self.wall_time = 0.0
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return {name: result.elapsed for name, result in self.results.items()}
+
+    def input_deps(self, name: str) -> tuple[str, ...]:
+        """
+        The run inputs (names that are not stages) a stage depends on, directly or
+        through other stages, in sorted order.
+        """
+        found = set()
+        stack = [name]
+        while stack:
+            for dep in self.stages[stack.pop()].deps:
+                if dep in self.stages:
+                    stack.append(dep)
+                else:
+                    found.add(dep)
+        return tuple(sorted(found))
+
+    def run(self, reuse: dict[str, StageResult] | None = None, **inputs) -> Iterator[StageResult]:
+        """
+        Executes the graph, yielding a StageResult for each stage as it completes.
+        Keyword arguments are made available to stages as already-completed dependencies.
+        Successful results in reuse (e.g. from an earlier run with the same inputs) are
+        yielded first and their stages are not run again.
+        """
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages and dep not in inputs:
+                    raise ValueError(f"Stage {stage.name!r} depends on unknown stage or input {dep!r}")
+        values = dict(inputs)
+        pending = dict(self.stages)
+        self.results = {}
+        self.reused = set()
+        running = {}
+        t0 = time.perf_counter()
+
+        for name, result in (reuse or {}).items():
+            if name in pending and result.ok:
+                del pending[name]
+                self.results[name] = result
+                self.reused.add(name)
+                values[name] = result.value
+                yield result
+
+        def launch_ready(pool):
+            skipped = []
+            for name, stage in list(pending.items()):
+                failed = [d for d in stage.deps if d in self.results and not self.results[d].ok]
+                if failed:
+                    del pending[name]
+                    skipped.append(StageResult(name, error=self.results[failed[0]].error, skipped=True))
+                elif all(d in values for d in stage.deps):
+                    del pending[name]
+                    kwargs = {d: values[d] for d in stage.deps}
+                    # Carries the caller's context (e.g. its profile session) into the worker
+                    running[pool.submit(contextvars.copy_context().run, self._call, stage, kwargs)] = name
+            return skipped
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for result in launch_ready(pool):
+                    self.results[result.name] = result
+                    yield result
+                if not running:
+                    if pending:
+                        # Anything left waits on a skipped stage; keep propagating
+                        continue
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    del running[future]
+                    self.results[result.name] = result
+                    if result.ok:
+                        values[result.name] = result.value
+                    yield result
+        self.wall_time = time.perf_counter() - t0
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """
+        Returns the longest chain of dependent stages by recorded time and its total,
+        the lower bound on wall-clock time for the run.
+        """
+        best: dict[str, tuple[float, list[str]]] = {}
+
+        def longest(name):
+            if name not in best:
+                stage = self.stages[name]
+                own = self.timings.get(name, 0.0)
+                chains = [longest(d) for d in stage.deps if d in self.stages]
+                total, path = max(chains, default=(0.0, []), key=lambda c: c[0])
+                best[name] = (total + own, path + [name])
+            return best[name]
+
+        total, path = max((longest(n) for n in self.stages), default=(0.0, []), key=lambda c: c[0])
+        return path, total
+
+    @staticmethod
+    def _call(stage: Stage, kwargs: dict) -> StageResult:
+        started = time.perf_counter()
+        try:
+            with profiled():
+                value = stage.func(**kwargs)
+        except Exception as e:
+            result = StageResult(stage.name, error=e, started=started, elapsed=time.perf_counter() - started)
+        else:
+            result = StageResult(stage.name, value=value, started=started, elapsed=time.perf_counter() - started)
+        get_metrics().observe("protai_pipeline_stage_seconds", result.elapsed, stage=stage.name,
+                             status="ok" if result.ok else "error")
+        return result
@@ -1,27 +1,68 @@
-import requests
+import os
 
+import http_client
+from metrics import timed
 
-def predict_ddg_dynamut(pdb_file: str, chain: str, resnum: int, mutation: str) -> dict:
+
+def _structure_upload(pdb_file: str | bytes) -> tuple[str, bytes]:
     """
-    Calls a DynaMut-like service to predict ΔΔG for a mutation.
+    (filename, contents) for a PDB file path or in-memory PDB-format bytes.
     """
-    url = 'https://dynamut-api.example.org/predict'
+    if isinstance(pdb_file, bytes):
+        return 'structure.pdb', pdb_file
+    # Read the structure up front so a retried request re-sends the full body
     with open(pdb_file, 'rb') as f:
-        files = {'structure': f}
-        data = {'chain': chain, 'resnum': resnum, 'mutation': mutation}
-        r = requests.post(url, files=files, data=data)
+        return os.path.basename(pdb_file), f.read()
+
+
+@timed()
+def _post_prediction(url: str, pdb_file: str | bytes, chain: str, resnum: int, mutation: str) -> dict:
+    files = {'structure': _structure_upload(pdb_file)}
+    data = {'chain': chain, 'resnum': resnum, 'mutation': mutation}
+    r = http_client.post(url, files=files, data=data)
     r.raise_for_status()
     return r.json()
 
 
-def predict_mcsmp_pi(pdb_file: str, chain: str, resnum: int, mutation: str) -> dict:
+def predict_ddg_dynamut(pdb_file: str | bytes, chain: str, resnum: int, mutation: str) -> dict:
+    """
+    Calls a DynaMut-like service to predict ΔΔG for a mutation.
+    """
+    return _post_prediction('https://dynamut-api.example.org/predict', pdb_file, chain, resnum, mutation)
+
+
+def predict_mcsmp_pi(pdb_file: str | bytes, chain: str, resnum: int, mutation: str) -> dict:
     """
     Calls an mCSM-PPI-like service to predict binding changes upon mutation.
     """
-    url = 'https://mcsmp-api.example.org/predict'
-    with open(pdb_file, 'rb') as f:
-        files = {'structure': f}
-        data = {'chain': chain, 'resnum': resnum, 'mutation': mutation}
-        r = requests.post(url, files=files, data=data)
+    return _post_prediction('https://mcsmp-api.example.org/predict', pdb_file, chain, resnum, mutation)
+
+
+# Batch protocol: upload the structure once, then send many mutations per request
+PREDICTOR_SERVICES = {
+    'dynamut': 'https://dynamut-api.example.org',
+    'mcsm_ppi': 'https://mcsmp-api.example.org',
+}
+
+
+@timed()
+def upload_structure(service: str, pdb_file: str | bytes) -> str:
+    """
+    Uploads a structure to a predictor service and returns its structure_id.
+    """
+    files = {'structure': _structure_upload(pdb_file)}
+    r = http_client.post(f"{PREDICTOR_SERVICES[service]}/structures", files=files)
+    r.raise_for_status()
+    return r.json()['structure_id']
+
+
+@timed()
+def predict_batch(service: str, structure_id: str, mutations: list[dict]) -> list[dict]:
+    """
+    Predicts a batch of mutations ({'chain', 'resnum', 'mutation'}) against an uploaded structure.
+    Returns one result dict per mutation, in order.
+    """
+    payload = {'structure_id': structure_id, 'mutations': mutations}
+    r = http_client.post(f"{PREDICTOR_SERVICES[service]}/predict/batch", json=payload)
     r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    return r.json()['results']
@@ -0,0 +1,134 @@
+"""
+Process-wide memo of completed analysis stages, shared by every Streamlit session.
+
+Each stage result is stored under (stage, the run inputs it depends on, parameters),
+so asking a new question about the same entry reuses everything but the answer.
+Entries are evicted least-recently-used once the estimated size passes max_bytes.
+Stored values are shared between sessions and must be treated as read-only.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator
+
+import numpy as np
+
+from metrics import get_metrics
+from pipeline import Pipeline, StageResult
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("PROTAI_RESULT_CACHE_BYTES", str(512 * 1024 ** 2)))
+RESULT_CACHE_MAX_ENTRIES = 2048
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    Approximate memory held by obj: array buffers, strings and bytes, containers and
+    plain objects' attributes, each object counted once.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            total += item.nbytes
+        elif isinstance(item, (str, bytes, bytearray, int, float, bool)) or item is None:
+            total += sys.getsizeof(item)
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(item)
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            total += sys.getsizeof(item)
+            stack.append(vars(item))
+        else:
+            total += sys.getsizeof(item)
+    return total
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of StageResults bounded by entry count and estimated bytes.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[StageResult, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> StageResult | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        get_metrics().inc("protai_result_cache_lookups_total", result="hit" if entry else "miss")
+        return entry[0] if entry else None
+
+    def put(self, key: Hashable, result: StageResult):
+        size = estimate_size(result.value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def stage_key(pipeline: Pipeline, name: str, inputs: dict, params: tuple = ()) -> tuple:
+    return name, tuple((dep, inputs[dep]) for dep in pipeline.input_deps(name)), params
+
+
+def run_cached(pipeline: Pipeline, cache: "ResultCache", params: tuple = (), **inputs) -> Iterator[StageResult]:
+    """
+    Runs pipeline, taking every stage already in cache for these inputs and params
+    from there and storing the ones that succeed. Failures are not stored, so they
+    are retried on the next run.
+    """
+    keys = {name: stage_key(pipeline, name, inputs, params) for name in pipeline.stages}
+    reuse = {}
+    for name, key in keys.items():
+        result = cache.get(key)
+        if result is not None:
+            reuse[name] = result
+    for result in pipeline.run(reuse=reuse, **inputs):
+        if result.ok and result.name not in reuse:
+            cache.put(keys[result.name], result)
+        yield result
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Returns the process-wide result cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from typing import Callable, Iterable
+
+import numpy as np
+
+from data_fetch import chunk_pdf_sections
+from http_cache import CACHE_DIR
+from metrics import timed
+
+INDEX_DIR = os.path.join(CACHE_DIR, "papers")
+INDEX_VERSION = 1
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were which with
+what how why when where who does do did can could would should their there these those than then into
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def split_passages(sections: Iterable[str], max_chars: int = 1200, overlap: int = 200) -> list[dict]:
+    """
+    Turns chunk_pdf_sections output (text, heading, text, ...) into passages of at most
+    max_chars, each tagged with the heading it falls under. Long sections are cut into
+    overlapping windows, preferring paragraph or sentence boundaries.
+    """
+    passages = []
+    heading = ""
+    for i, chunk in enumerate(sections):
+        if i % 2 == 1:
+            heading = chunk.strip()
+            continue
+        text = re.sub(r"[ \t]+", " ", chunk).strip()
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + max_chars)
+            if end < len(text):
+                cut = max(text.rfind("\n\n", start, end), text.rfind(". ", start, end))
+                if cut > start + max_chars // 2:
+                    end = cut + 1
+            body = text[start:end].strip()
+            if body:
+                passages.append({"heading": heading, "text": body})
+            if end >= len(text):
+                break
+            start = max(end - overlap, start + 1)
+    return passages
+
+
+class PaperIndex:
+    """
+    BM25 index over the passages of one paper, stored as NumPy postings arrays.
+    """
+
+    def __init__(self, passages: list[dict], vocab: dict[str, int], term_indptr: np.ndarray,
+                 term_docs: np.ndarray, term_tf: np.ndarray, doc_len: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.vocab = vocab
+        self.term_indptr = term_indptr
+        self.term_docs = term_docs
+        self.term_tf = term_tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, passages: list[dict]) -> "PaperIndex":
+        vocab: dict[str, int] = {}
+        rows, cols, tfs = [], [], []
+        doc_len = np.zeros(len(passages), dtype=np.float32)
+        for doc, passage in enumerate(passages):
+            tokens = tokenize(f"{passage['heading']} {passage['text']}")
+            doc_len[doc] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                rows.append(vocab.setdefault(term, len(vocab)))
+                cols.append(doc)
+                tfs.append(tf)
+        rows = np.asarray(rows, dtype=np.int32)
+        order = np.argsort(rows, kind="stable")
+        term_indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(vocab)))]).astype(np.int64)
+        return cls(
+            passages, vocab, term_indptr,
+            np.asarray(cols, dtype=np.int32)[order], np.asarray(tfs, dtype=np.float32)[order], doc_len,
+        )
+
+    @classmethod
+    def from_pdf(cls, pdf: str | bytes) -> "PaperIndex":
+        return cls.build(split_passages(chunk_pdf_sections(pdf)))
+
+    def scores(self, query: str) -> np.ndarray:
+        n_docs = len(self.passages)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if n_docs == 0:
+            return scores
+        avg_len = max(float(self.doc_len.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / avg_len)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.term_indptr[term_id], self.term_indptr[term_id + 1]
+            docs, tf = self.term_docs[lo:hi], self.term_tf[lo:hi]
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int = 5) -> list[dict]:
+        """
+        Returns the k best-scoring passages for query, in document order, each with a 'score'.
+        Falls back to the opening passages when no query term occurs in the paper.
+        """
+        scores = self.scores(query)
+        if not scores.any():
+            best = np.arange(min(k, len(self.passages)))
+        else:
+            best = np.argsort(-scores, kind="stable")[:k]
+            best = np.sort(best[scores[best] > 0])
+        return [{**self.passages[i], "score": float(scores[i])} for i in best]
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "postings.npz"),
+            term_indptr=self.term_indptr, term_docs=self.term_docs, term_tf=self.term_tf, doc_len=self.doc_len,
+        )
+        with open(os.path.join(path, "passages.json"), "w") as fh:
+            json.dump({"version": INDEX_VERSION, "passages": self.passages, "vocab": self.vocab}, fh)
+
+    @classmethod
+    def load(cls, path: str) -> "PaperIndex":
+        with open(os.path.join(path, "passages.json")) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Stale paper index at {path}")
+        arrays = np.load(os.path.join(path, "postings.npz"))
+        return cls(meta["passages"], meta["vocab"], arrays["term_indptr"], arrays["term_docs"],
+                   arrays["term_tf"], arrays["doc_len"])
+
+
+def index_path(doi: str) -> str:
+    return os.path.join(INDEX_DIR, hashlib.sha256(doi.lower().encode()).hexdigest()[:32])
+
+
+@timed()
+def load_or_build_index(doi: str, fetch_pdf: Callable[[], bytes | None]) -> PaperIndex | None:
+    """
+    Returns the persisted index for doi, building it from fetch_pdf() on first use.
+    Returns None when fetch_pdf finds no PDF.
+    """
+    path = index_path(doi)
+    try:
+        return PaperIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    pdf = fetch_pdf()
+    if pdf is None:
+        return None
+    index = PaperIndex.from_pdf(pdf)
+    index.save(path)
+    return index
+
+
+def format_passages(passages: list[dict]) -> str:
+    return "\n\n".join(
+        f"[{i}] {p['heading'] + ': ' if p['heading'] else ''}{p['text']}" for i, p in enumerate(passages, 1)
+    )
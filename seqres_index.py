@@ -0,0 +1,266 @@
+"""
+Offline sequence -> PDB chain lookup over a local seqres FASTA dump
+(https://files.wwpdb.org/pub/pdb/derived_data/pdb_seqres.txt.gz).
+
+Identical chains are collapsed to one sequence. Each sequence's distinct k-mers go
+into an inverted index (sorted k-mer keys, CSR postings) stored as .npy columns and
+memory-mapped on load. A query ranks sequences by shared k-mers and checks the best
+candidates with an ungapped identity count along their dominant diagonals.
+
+    python seqres_index.py pdb_seqres.txt.gz          # build into PROTAI_SEQRES_INDEX
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from http_cache import CACHE_DIR
+from metrics import timed
+
+SEQRES_INDEX = os.getenv("PROTAI_SEQRES_INDEX", os.path.join(CACHE_DIR, "seqres"))
+INDEX_VERSION = 1
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+UNKNOWN = len(AMINO_ACIDS)
+# ASCII byte -> 0..19, anything else (X, U, gaps, lowercase noise) -> UNKNOWN
+CODES = np.full(256, UNKNOWN, dtype=np.uint8)
+for _i, _aa in enumerate(AMINO_ACIDS):
+    CODES[ord(_aa)] = _i
+    CODES[ord(_aa.lower())] = _i
+
+# Candidates must share this fraction of the query's distinct k-mers; random pairs share ~0.1%
+MIN_SHARED_FRACTION = 0.02
+FIELDS = ("residues", "seq_offsets", "kmer_keys", "kmer_indptr", "postings", "chain_ids", "chain_offsets")
+
+
+def encode(sequence: str) -> np.ndarray:
+    return CODES[np.frombuffer(sequence.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def kmer_codes(codes: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (k-mer codes, start positions) of the windows without unknown residues.
+    """
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+    valid = (windows < UNKNOWN).all(axis=1)
+    powers = (len(AMINO_ACIDS) ** np.arange(k - 1, -1, -1)).astype(np.uint32)
+    positions = np.flatnonzero(valid)
+    return (windows[positions].astype(np.uint32) @ powers).astype(np.uint32), positions
+
+
+def read_seqres(path: str):
+    """
+    Yields (chain id, sequence) for the protein records of a pdb_seqres-style FASTA,
+    plain or gzipped. Headers look like '>101m_A mol:protein length:154  MYOGLOBIN';
+    records marked mol:na are skipped and IDs are returned as '101M_A'.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as fh:
+        header, parts = None, []
+        for line in fh:
+            if line.startswith(">"):
+                if header is not None and parts:
+                    yield header, "".join(parts)
+                fields = line[1:].split()
+                protein = "mol:na" not in fields[1:2]
+                header, parts = (fields[0].upper() if protein else None), []
+            elif header is not None:
+                parts.append(line.strip())
+        if header is not None and parts:
+            yield header, "".join(parts)
+
+
+class SeqresIndex:
+    """
+    Memory-mapped k-mer index over the unique sequences of a seqres dump.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as fh:
+            self.meta = json.load(fh)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"seqres index at {path} has version {self.meta.get('version')}, expected {INDEX_VERSION}")
+        self.path = path
+        self.k = self.meta["k"]
+        for name in FIELDS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    @classmethod
+    @timed("seqres_index.build")
+    def build(cls, fasta_path: str, path: str = SEQRES_INDEX, k: int = 5) -> "SeqresIndex":
+        """
+        Indexes the protein chains of fasta_path into directory path, atomically.
+        """
+        unique: dict[str, int] = {}
+        chains: list[list[str]] = []
+        for chain_id, sequence in read_seqres(fasta_path):
+            seq_id = unique.setdefault(sequence, len(unique))
+            if seq_id == len(chains):
+                chains.append([])
+            chains[seq_id].append(chain_id)
+
+        encoded = [encode(sequence) for sequence in unique]
+        seq_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(codes) for codes in encoded], out=seq_offsets[1:])
+        # (k-mer << 32 | sequence) packed into one uint64, so a plain sort groups postings by k-mer
+        packed = np.concatenate([
+            (np.unique(kmer_codes(codes, k)[0]).astype(np.uint64) << np.uint64(32)) | np.uint64(seq_id)
+            for seq_id, codes in enumerate(encoded)
+        ] or [np.zeros(0, dtype=np.uint64)])
+        packed.sort()
+        kmers = (packed >> np.uint64(32)).astype(np.uint32)
+        keys, starts = np.unique(kmers, return_index=True)
+
+        chain_offsets = np.zeros(len(chains) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in chains], out=chain_offsets[1:])
+        columns = {
+            "residues": np.concatenate(encoded or [np.zeros(0, dtype=np.uint8)]),
+            "seq_offsets": seq_offsets,
+            "kmer_keys": keys,
+            "kmer_indptr": np.append(starts, len(packed)).astype(np.int64),
+            "postings": (packed & np.uint64(0xFFFFFFFF)).astype(np.uint32),
+            "chain_ids": np.array([cid for ids in chains for cid in sorted(ids)], dtype="S16"),
+            "chain_offsets": chain_offsets,
+        }
+        source = os.stat(fasta_path)
+        meta = {
+            "version": INDEX_VERSION, "k": k, "sequences": len(encoded), "chains": int(chain_offsets[-1]),
+            "source": os.path.abspath(fasta_path), "source_size": source.st_size,
+            "source_mtime_ns": source.st_mtime_ns,
+        }
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name, values in columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), values)
+        with open(os.path.join(tmp, "meta.json"), "w") as fh:
+            json.dump(meta, fh)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+        return cls(path)
+
+    def sequence_codes(self, seq_id: int) -> np.ndarray:
+        return self.residues[self.seq_offsets[seq_id]:self.seq_offsets[seq_id + 1]]
+
+    def candidates(self, query_kmers: np.ndarray, max_candidates: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Sequence IDs sharing the most distinct k-mers with the query, best first,
+        with their shared counts.
+        """
+        kmers = np.unique(query_kmers)
+        slot = np.searchsorted(self.kmer_keys, kmers)
+        found = slot < len(self.kmer_keys)
+        found[found] = self.kmer_keys[slot[found]] == kmers[found]
+        slot = slot[found]
+        if len(slot) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        postings = np.concatenate([self.postings[a:b] for a, b in zip(self.kmer_indptr[slot], self.kmer_indptr[slot + 1])])
+        seq_ids, shared = np.unique(postings, return_counts=True)
+        top = np.argsort(-shared, kind="stable")[:max_candidates]
+        return seq_ids[top].astype(np.int64), shared[top]
+
+    def diagonal_identity(self, query: np.ndarray, query_kmers: np.ndarray, query_pos: np.ndarray,
+                          seq_id: int, max_diagonals: int = 4) -> tuple[float, float]:
+        """
+        (identity, coverage) of an ungapped comparison on the diagonals most shared
+        k-mers agree on. Several diagonals let a few indels through: a query residue
+        counts as identical when it matches on any of them. Identity is over the
+        compared residues, coverage over the query.
+        """
+        target = np.asarray(self.sequence_codes(seq_id))
+        target_kmers, target_pos = kmer_codes(target, self.k)
+        order = np.argsort(target_kmers, kind="stable")
+        lo = np.searchsorted(target_kmers[order], query_kmers, side="left")
+        hi = np.searchsorted(target_kmers[order], query_kmers, side="right")
+        hit = hi > lo
+        if not hit.any():
+            return 0.0, 0.0
+        # One diagonal vote per query k-mer (its first occurrence in the target)
+        values, votes = np.unique(target_pos[order[lo[hit]]] - query_pos[hit], return_counts=True)
+        ranked = np.argsort(-votes, kind="stable")[:max_diagonals]
+        # Secondary diagonals need real support; a single shared k-mer is chance
+        strong = votes[ranked] >= max(2, votes[ranked[0]] // 10)
+        offsets = values[ranked[strong]] if strong.any() else values[ranked[:1]]
+
+        positions = np.arange(len(query))
+        compared = np.zeros(len(query), dtype=bool)
+        matched = np.zeros(len(query), dtype=bool)
+        for offset in offsets:
+            partner = positions + offset
+            inside = (partner >= 0) & (partner < len(target))
+            compared |= inside
+            matched[inside] |= query[inside] == target[partner[inside]]
+        n_compared = int(compared.sum())
+        if n_compared == 0:
+            return 0.0, 0.0
+        return float(matched.sum()) / n_compared, n_compared / len(query)
+
+    def search(self, sequence: str, top_n: int = 5, max_candidates: int = 50) -> list[dict]:
+        """
+        Top top_n PDB chains for sequence as dicts with pdb_id, chain, identity,
+        coverage and shared_kmers, best identity x coverage first. Chains with the
+        same sequence share a score and are listed in ID order.
+        """
+        query = encode("".join(sequence.split()))
+        query_kmers, query_pos = kmer_codes(query, self.k)
+        seq_ids, shared = self.candidates(query_kmers, max_candidates)
+        # Sequences sharing a single k-mer, or far fewer than the best, are chance hits
+        floor = max(2, int(MIN_SHARED_FRACTION * len(np.unique(query_kmers))))
+        keep = shared >= max(floor, shared[0] // 10) if len(shared) else shared.astype(bool)
+        seq_ids, shared = seq_ids[keep], shared[keep]
+        scored = []
+        for seq_id, count in zip(seq_ids, shared):
+            identity, coverage = self.diagonal_identity(query, query_kmers, query_pos, int(seq_id))
+            scored.append((identity * coverage, int(count), identity, coverage, int(seq_id)))
+        scored.sort(key=lambda s: (-s[0], -s[1], s[4]))
+
+        hits = []
+        for _, count, identity, coverage, seq_id in scored:
+            for chain_id in self.chain_ids[self.chain_offsets[seq_id]:self.chain_offsets[seq_id + 1]]:
+                pdb_id, _, chain = chain_id.decode().partition("_")
+                hits.append({"pdb_id": pdb_id, "chain": chain, "identity": identity,
+                             "coverage": coverage, "shared_kmers": count})
+                if len(hits) == top_n:
+                    return hits
+        return hits
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_seqres_index() -> SeqresIndex | None:
+    """
+    Returns the index built at SEQRES_INDEX (memory-mapped once per process), or None
+    while none has been built.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None and os.path.exists(os.path.join(SEQRES_INDEX, "meta.json")):
+            _default_index = SeqresIndex(SEQRES_INDEX)
+    return _default_index
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("fasta", help="pdb_seqres.txt(.gz) or any FASTA with PDBID_CHAIN identifiers")
+    ap.add_argument("--out", default=SEQRES_INDEX, help="index directory (default %(default)s)")
+    ap.add_argument("-k", type=int, default=5, help="k-mer length (default %(default)s)")
+    args = ap.parse_args(argv)
+    index = SeqresIndex.build(args.fasta, args.out, args.k)
+    print(f"{index.meta['chains']} chains, {index.meta['sequences']} unique sequences, "
+          f"{len(index.kmer_keys)} k-mers -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,78 @@
-from Bio.Blast import NCBIWWW, NCBIXML
-from Bio.Align import MultipleSeqAlignment
-from collections import Counter
+from typing import TYPE_CHECKING
 
+import numpy as np
 
+from metrics import timed
+
+if TYPE_CHECKING:
+    from Bio.Align import MultipleSeqAlignment
+
+GAP_CHARS = b"-."
+
+
+@timed()
 def run_blast(sequence: str, program: str = "blastp", database: str = "nr"):
     """
     Runs NCBI BLAST for the input sequence and returns the parsed record.
     """
+    from Bio.Blast import NCBIWWW, NCBIXML
+
     result_handle = NCBIWWW.qblast(program, database, sequence)
     return NCBIXML.read(result_handle)
 
 
-def conservation_scores(msa: MultipleSeqAlignment) -> list[float]:
+def encode_msa(msa: "MultipleSeqAlignment") -> np.ndarray:
     """
-    Computes per-residue conservation scores from an MSA.
+    Encodes an MSA once into a (n_sequences, alignment_length) uint8 matrix of ASCII codes.
     """
     length = msa.get_alignment_length()
-    scores = []
-    for i in range(length):
-        col = [rec.seq[i] for rec in msa]
-        freq = Counter(col)
-        top_count = freq.most_common(1)[0][1]
-        scores.append(top_count / len(col))
-    return scores
\ No newline at end of file
+    raw = b"".join(bytes(rec.seq) for rec in msa)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(len(msa), length)
+
+
+@timed()
+def column_profiles(msa: "MultipleSeqAlignment | np.ndarray", max_block_cells: int = 4_000_000) -> dict[str, np.ndarray]:
+    """
+    Computes per-column statistics from an MSA in a single pass:
+    - majority: fraction of sequences carrying the most common symbol (gaps included)
+    - entropy: Shannon entropy in bits over the non-gap symbols
+    - gap_fraction: fraction of sequences with a gap
+    Columns are processed in blocks of at most max_block_cells matrix cells to bound memory.
+    msa may also be a matrix already produced by encode_msa.
+    """
+    encoded = msa if isinstance(msa, np.ndarray) else encode_msa(msa)
+    n_seqs, length = encoded.shape
+    majority = np.zeros(length)
+    entropy = np.zeros(length)
+    gap_fraction = np.zeros(length)
+    if n_seqs == 0:
+        return {"majority": majority, "entropy": entropy, "gap_fraction": gap_fraction}
+
+    gap_codes = np.frombuffer(GAP_CHARS, dtype=np.uint8)
+    block = max(1, max_block_cells // n_seqs)
+    for lo in range(0, length, block):
+        cols = encoded[:, lo:lo + block]
+        width = cols.shape[1]
+        # One bincount over (column, symbol) pairs gives the whole block's profile
+        flat = cols.astype(np.int64) + 256 * np.arange(width)
+        counts = np.bincount(flat.ravel(), minlength=width * 256).reshape(width, 256)
+
+        majority[lo:lo + width] = counts.max(axis=1) / n_seqs
+        gaps = counts[:, gap_codes].sum(axis=1)
+        gap_fraction[lo:lo + width] = gaps / n_seqs
+
+        counts[:, gap_codes] = 0
+        residues = n_seqs - gaps
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = counts / residues[:, None]
+            terms = np.where(counts > 0, -p * np.log2(p), 0.0)
+        entropy[lo:lo + width] = terms.sum(axis=1)
+
+    return {"majority": majority, "entropy": entropy, "gap_fraction": gap_fraction}
+
+
+def conservation_scores(msa: "MultipleSeqAlignment") -> list[float]:
+    """
+    Computes per-residue conservation scores from an MSA.
+    """
+    return column_profiles(msa)["majority"].tolist()
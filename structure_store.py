@@ -0,0 +1,644 @@
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from typing import Iterator
+
+import numpy as np
+
+from http_cache import CACHE_DIR
+from http_client import gunzip_limited
+from metrics import timed
+
+STORE_DIR = os.path.join(CACHE_DIR, "structures")
+STORE_VERSION = 1
+# Renames tried when other processes keep overwriting the same entry
+SAVE_ATTEMPTS = 5
+MAX_STRUCTURE_BYTES = 2 * 1024 * 1024 * 1024
+
+ATOM_SITE_LOOP = re.compile(rb"^loop_[ \t]*\r?\n((?:[ \t]*_atom_site\.\S+[ \t]*\r?\n)+)", re.M)
+CIF_TOKEN = re.compile(rb"""'(?:[^']|'(?!\s))*'|"(?:[^"]|"(?!\s))*"|\S+""")
+CIF_MISSING = (b"?", b".")
+# BinaryCIF ByteArray type codes
+BCIF_TYPES = {1: "<i1", 2: "<i2", 3: "<i4", 4: "<u1", 5: "<u2", 6: "<u4", 32: "<f4", 33: "<f8"}
+
+
+class StructureArrays:
+    """
+    Columnar, array-backed view of a coordinate file.
+
+    Atom-level arrays (length n_atoms): coords, atom_name, element, occupancy, bfactor.
+    Residue-level arrays (length n_residues): res_model, res_chain, res_seq, res_icode,
+    res_name, res_het, plus res_offsets (length n_residues + 1) giving each residue's
+    atom slice. String columns are interned: they hold indices into the matching
+    *_vocab array.
+    """
+
+    FIELDS = (
+        "coords", "atom_name", "element", "occupancy", "bfactor",
+        "res_offsets", "res_model", "res_chain", "res_seq", "res_icode", "res_name", "res_het",
+        "atom_name_vocab", "element_vocab", "chain_vocab", "icode_vocab", "res_name_vocab",
+    )
+
+    def __init__(self, **arrays):
+        missing = set(self.FIELDS) - set(arrays)
+        if missing:
+            raise ValueError(f"Missing structure arrays: {sorted(missing)}")
+        self.arrays = arrays
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.coords)
+
+    @property
+    def n_residues(self) -> int:
+        return len(self.res_seq)
+
+    @property
+    def models(self) -> np.ndarray:
+        return np.unique(self.res_model)
+
+    def atom_residue_index(self) -> np.ndarray:
+        """
+        Residue index of every atom.
+        """
+        return np.repeat(np.arange(self.n_residues), np.diff(self.res_offsets))
+
+    def model_slice(self, model: int) -> "StructureArrays":
+        """
+        The residues and atoms of one model as a StructureArrays sharing this one's
+        buffers (memory-mapped columns stay memory-mapped).
+        """
+        lo, hi = np.searchsorted(self.res_model, [model, model + 1])
+        a_lo, a_hi = int(self.res_offsets[lo]), int(self.res_offsets[hi])
+        arrays = dict(self.arrays)
+        for name in ("coords", "atom_name", "element", "occupancy", "bfactor"):
+            arrays[name] = self.arrays[name][a_lo:a_hi]
+        for name in ("res_model", "res_chain", "res_seq", "res_icode", "res_name", "res_het"):
+            arrays[name] = self.arrays[name][lo:hi]
+        arrays["res_offsets"] = np.asarray(self.res_offsets[lo:hi + 1]) - a_lo
+        return StructureArrays(**arrays)
+
+    def residue_labels(self) -> np.ndarray:
+        """
+        Chain + residue number labels (e.g. 'A123') for every residue.
+        """
+        chains = self.chain_vocab[self.res_chain]
+        return np.char.add(chains.astype(str), self.res_seq.astype(str))
+
+    def sequence(self, chain: str | None = None) -> str:
+        """
+        One-letter sequence of the polymer residues of a chain (the first chain by default)
+        in the first model.
+        """
+        from Bio.SeqUtils import seq1
+
+        polymer = (self.res_model == (self.res_model.min() if self.n_residues else 0)) & ~self.res_het
+        chains = self.chain_vocab[self.res_chain]
+        if chain is None:
+            chain = chains[polymer][0] if polymer.any() else None
+        names = self.res_name_vocab[self.res_name[polymer & (chains == chain)]]
+        return "".join(seq1(str(name)) for name in names)
+
+    def find_atoms(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (residue indices, atom indices) of residues containing an atom with this name.
+        """
+        codes = np.flatnonzero(self.atom_name_vocab == name)
+        if len(codes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        atom_idx = np.flatnonzero(self.atom_name == codes[0])
+        return self.atom_residue_index()[atom_idx], atom_idx
+
+    def save(self, path: str, overwrite: bool = True):
+        """
+        Writes one .npy file per column into directory path, atomically. An existing
+        entry is renamed aside before it is removed, never emptied in place. With
+        overwrite=False an entry of this STORE_VERSION already at path is kept and the
+        new copy discarded, so processes storing the same entry at once all succeed.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name in self.FIELDS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(self.arrays[name]))
+        with open(os.path.join(tmp, "meta.json"), "w") as fh:
+            json.dump({"version": STORE_VERSION, "n_atoms": self.n_atoms, "n_residues": self.n_residues}, fh)
+        stale = tmp + ".stale"
+        for attempt in range(SAVE_ATTEMPTS):
+            try:
+                os.replace(tmp, path)
+                return
+            except OSError:
+                # A directory is only replaced by a rename when the target is empty
+                kept = not overwrite and stored_version(path) == STORE_VERSION
+                if kept or attempt == SAVE_ATTEMPTS - 1 or not os.path.isdir(path):
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    if kept:
+                        return
+                    raise
+            try:
+                os.replace(path, stale)
+            except FileNotFoundError:
+                continue  # another writer moved it aside first
+            shutil.rmtree(stale, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "StructureArrays":
+        mode = "r" if mmap else None
+        return cls(**{name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls.FIELDS})
+
+
+def stored_version(path: str) -> int | None:
+    """
+    STORE_VERSION recorded in a saved entry, or None when path holds no complete entry.
+    """
+    try:
+        with open(os.path.join(path, "meta.json")) as fh:
+            return json.load(fh).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def _column(mat: np.ndarray, start: int, end: int) -> np.ndarray:
+    return np.ascontiguousarray(mat[:, start:end]).view(f"S{end - start}").ravel()
+
+
+def _intern(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    vocab, codes = np.unique(np.char.strip(values.astype(str)), return_inverse=True)
+    return vocab, codes.astype(np.uint16 if len(vocab) < 65536 else np.uint32)
+
+
+def parse_pdb(source: str | bytes) -> StructureArrays:
+    """
+    Parses PDB-format text (a path or the raw bytes) into StructureArrays with
+    fixed-width column slicing instead of a per-atom object tree.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as fh:
+            source = fh.read()
+
+    lines = []
+    models = []
+    model = 0
+    seen_model = False
+    for line in source.splitlines():
+        record = line[:6]
+        if record == b"ATOM  " or record == b"HETATM":
+            lines.append(line[:80].ljust(80))
+            models.append(model)
+        elif record == b"MODEL ":
+            if seen_model:
+                model += 1
+            seen_model = True
+
+    if not lines:
+        return _empty_arrays()
+
+    mat = np.frombuffer(b"".join(lines), dtype="S1").reshape(-1, 80)
+    occupancy = np.char.strip(_column(mat, 54, 60))
+    bfactor = np.char.strip(_column(mat, 60, 66))
+    return _assemble(
+        is_het=_column(mat, 0, 6) == b"HETATM",
+        name=np.char.strip(_column(mat, 12, 16)),
+        res_name=np.char.strip(_column(mat, 17, 20)),
+        chain=_column(mat, 21, 22),
+        resseq=_column(mat, 22, 26).astype(np.int32),
+        icode=_column(mat, 26, 27),
+        coords=np.stack([_column(mat, lo, lo + 8).astype(np.float64) for lo in (30, 38, 46)], axis=1),
+        occupancy=np.where(occupancy == b"", b"1.0", occupancy).astype(np.float32),
+        bfactor=np.where(bfactor == b"", b"0.0", bfactor).astype(np.float32),
+        element=_column(mat, 76, 78),
+        model=np.asarray(models, dtype=np.int32),
+    )
+
+
+def _assemble(is_het: np.ndarray, name: np.ndarray, res_name: np.ndarray, chain: np.ndarray, resseq: np.ndarray,
+              icode: np.ndarray, coords: np.ndarray, occupancy: np.ndarray, bfactor: np.ndarray,
+              element: np.ndarray, model: np.ndarray) -> StructureArrays:
+    """
+    Builds StructureArrays from per-atom-record columns (byte strings for text fields,
+    model as a 0-based index in file order).
+    Residues and alternate locations are resolved the way Bio.PDB does: atoms are
+    grouped per (model, chain, hetero flag, resseq, icode), and of several altlocs
+    for one atom the highest occupancy (first on ties) is kept.
+    """
+    if len(name) == 0:
+        return _empty_arrays()
+    atom_model = model
+
+    # Bio.PDB hetero flag: ' ' for ATOM, 'W' for waters, 'H_<resname>' otherwise
+    is_water = is_het & np.isin(res_name, [b"HOH", b"WAT"])
+    het_flag = np.where(is_het & ~is_water, res_name, np.where(is_water, b"W", b""))
+
+    # Residue key -> residue index, in first-appearance order within (model, chain)
+    sep = np.bytes_(b"|")
+    res_key = atom_model.astype("S6")
+    for part in (chain, het_flag, resseq.astype("S11"), icode):
+        res_key = np.char.add(np.char.add(res_key, sep), part)
+    _, first_idx, res_inverse = np.unique(res_key, return_index=True, return_inverse=True)
+    chain_key = np.char.add(atom_model.astype("S6"), np.char.add(sep, chain))
+    _, chain_first, chain_inverse = np.unique(chain_key, return_index=True, return_inverse=True)
+    res_chain_first = chain_first[chain_inverse[first_idx]]
+    res_order = np.lexsort((first_idx, res_chain_first, atom_model[first_idx]))
+    rank = np.empty_like(res_order)
+    rank[res_order] = np.arange(len(res_order))
+    atom_res = rank[res_inverse]
+
+    # One atom per (residue, name): highest occupancy, earliest on ties
+    atom_key = np.char.add(atom_res.astype("S10"), np.char.add(sep, name))
+    _, atom_group = np.unique(atom_key, return_inverse=True)
+    index = np.arange(len(name))
+    by_pref = np.lexsort((index, -occupancy, atom_group))
+    winners = by_pref[np.r_[True, atom_group[by_pref][1:] != atom_group[by_pref][:-1]]]
+    group_first = np.full(atom_group.max() + 1, len(name))
+    np.minimum.at(group_first, atom_group, index)
+    # Keep each atom at the position of its first altloc, as Bio.PDB's DisorderedAtom does
+    winner_pos = group_first[atom_group[winners]]
+    keep = winners[np.lexsort((winner_pos, atom_res[winners]))]
+
+    atom_res = atom_res[keep]
+    counts = np.bincount(atom_res, minlength=len(first_idx))
+    res_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    res_rows = first_idx[res_order]
+
+    atom_name_vocab, atom_name = _intern(name[keep])
+    element_vocab, element = _intern(element[keep])
+    chain_vocab, res_chain = _intern(chain[res_rows])
+    icode_vocab, res_icode = _intern(icode[res_rows])
+    res_name_vocab, res_name = _intern(res_name[res_rows])
+    # Blank chain ids are meaningful labels; keep them as a single space
+    chain_vocab = np.where(chain_vocab == "", " ", chain_vocab)
+
+    return StructureArrays(
+        coords=np.asarray(coords, dtype=np.float64)[keep].astype(np.float32), atom_name=atom_name,
+        element=element, occupancy=occupancy[keep], bfactor=bfactor[keep],
+        res_offsets=res_offsets, res_model=atom_model[res_rows], res_chain=res_chain,
+        res_seq=resseq[res_rows], res_icode=res_icode, res_name=res_name, res_het=is_het[res_rows],
+        atom_name_vocab=atom_name_vocab, element_vocab=element_vocab, chain_vocab=chain_vocab,
+        icode_vocab=icode_vocab, res_name_vocab=res_name_vocab,
+    )
+
+
+def _atom_site_arrays(columns: dict[str, np.ndarray]) -> StructureArrays:
+    """
+    Builds StructureArrays from mmCIF / BinaryCIF _atom_site columns, preferring
+    author numbering and names (as in the legacy PDB format) over label_* fields.
+    """
+    def column(*names):
+        for name in names:
+            if name in columns:
+                return columns[name]
+        return None
+
+    def text(*names):
+        values = column(*names)
+        if values is None:
+            return None
+        if values.dtype.kind != "S":
+            values = values.astype("S")
+        return np.where(np.isin(values, CIF_MISSING), b"", values)
+
+    def number(default, *names, dtype=np.float64):
+        values = column(*names)
+        if values is None:
+            return np.full(n, default, dtype=dtype)
+        if values.dtype.kind == "S":
+            values = np.where(np.isin(values, CIF_MISSING), str(default).encode(), values)
+        values = values.astype(np.float64)
+        return np.where(np.isnan(values), default, values).astype(dtype)
+
+    x = column("Cartn_x")
+    if x is None or len(x) == 0:
+        return _empty_arrays()
+    n = len(x)
+    # Model numbers -> 0-based index in order of first appearance
+    model_num = number(1, "pdbx_PDB_model_num", dtype=np.int64)
+    _, first, inverse = np.unique(model_num, return_index=True, return_inverse=True)
+    model = np.argsort(np.argsort(first))[inverse].astype(np.int32)
+    empty = np.full(n, b"", dtype="S1")
+    group = text("group_PDB")
+    return _assemble(
+        is_het=group == b"HETATM" if group is not None else np.zeros(n, dtype=bool),
+        name=text("auth_atom_id", "label_atom_id"),
+        res_name=text("auth_comp_id", "label_comp_id"),
+        chain=text("auth_asym_id", "label_asym_id"),
+        resseq=number(0, "auth_seq_id", "label_seq_id", dtype=np.int32),
+        icode=text("pdbx_PDB_ins_code") if column("pdbx_PDB_ins_code") is not None else empty,
+        coords=np.stack([number(0.0, "Cartn_x"), number(0.0, "Cartn_y"), number(0.0, "Cartn_z")], axis=1),
+        occupancy=number(1.0, "occupancy", dtype=np.float32),
+        bfactor=number(0.0, "B_iso_or_equiv", dtype=np.float32),
+        element=text("type_symbol") if column("type_symbol") is not None else empty,
+        model=model,
+    )
+
+
+def parse_mmcif(source: str | bytes, chunk_rows: int = 65536) -> StructureArrays:
+    """
+    Parses the _atom_site loop of an mmCIF file (a path or the raw bytes). Rows are
+    tokenized in chunks, so only the needed columns of the whole table are kept.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as fh:
+            source = fh.read()
+
+    header = ATOM_SITE_LOOP.search(source)
+    if header is None:
+        return _empty_arrays()
+    names = [name[len(b"_atom_site."):].decode() for name in header.group(1).split()]
+    chunks: list[bytes] = []
+    columns: dict[str, list[np.ndarray]] = {}
+
+    def flush():
+        block = b"\n".join(chunks)
+        chunks.clear()
+        if b"'" in block or b'"' in block:
+            tokens = [t[1:-1] if t[:1] in (b"'", b'"') else t for t in CIF_TOKEN.findall(block)]
+        else:
+            tokens = block.split()
+        if len(tokens) % len(names):
+            raise ValueError("Malformed _atom_site loop: row length does not match the header")
+        table = np.asarray(tokens, dtype="S").reshape(-1, len(names))
+        for i, name in enumerate(names):
+            columns.setdefault(name, []).append(table[:, i].copy())
+
+    body = io.BytesIO(source)
+    body.seek(header.end())
+    for line in body:
+        line = line.strip()
+        if line.startswith((b"#", b"_", b"loop_", b"data_")):
+            break
+        if line:
+            chunks.append(line)
+            if len(chunks) >= chunk_rows:
+                flush()
+    if chunks:
+        flush()
+    return _atom_site_arrays({name: np.concatenate(parts) for name, parts in columns.items()})
+
+
+def _bcif_decode(data, encodings: list[dict]):
+    """
+    Applies BinaryCIF encodings in reverse order. Returns a NumPy array
+    (byte strings for StringArray columns).
+    """
+    for encoding in reversed(encodings):
+        kind = encoding["kind"]
+        if kind == "ByteArray":
+            data = np.frombuffer(data, dtype=BCIF_TYPES[encoding["type"]])
+        elif kind == "FixedPoint":
+            data = data / encoding["factor"]
+        elif kind == "IntervalQuantization":
+            step = (encoding["max"] - encoding["min"]) / max(encoding["numSteps"] - 1, 1)
+            data = encoding["min"] + step * data
+        elif kind == "RunLength":
+            data = np.repeat(data[0::2], data[1::2])
+        elif kind == "Delta":
+            data = np.cumsum(data, dtype=np.int64) + encoding["origin"]
+        elif kind == "IntegerPacking":
+            bits = 8 * encoding["byteCount"]
+            upper = 2 ** bits - 1 if encoding["isUnsigned"] else 2 ** (bits - 1) - 1
+            lower = 0 if encoding["isUnsigned"] else -upper - 1
+            # Values at the limits continue into the next element; sum each run
+            done = (data != upper) & ((data != lower) | encoding["isUnsigned"])
+            ends = np.flatnonzero(done)
+            starts = np.concatenate([[0], ends[:-1] + 1])
+            data = np.add.reduceat(data.astype(np.int64), starts) if len(ends) else np.zeros(0, dtype=np.int64)
+        elif kind == "StringArray":
+            offsets = _bcif_decode(encoding["offsets"], encoding["offsetEncoding"])
+            indices = _bcif_decode(data, encoding["dataEncoding"])
+            raw = encoding["stringData"].encode()
+            strings = np.array([raw[a:b] for a, b in zip(offsets[:-1], offsets[1:])] + [b""], dtype="S")
+            data = strings[np.where(indices < 0, len(strings) - 1, indices)]
+        else:
+            raise ValueError(f"Unsupported BinaryCIF encoding {kind}")
+    return data
+
+
+def parse_bcif(source: str | bytes) -> StructureArrays:
+    """
+    Parses the _atom_site category of a BinaryCIF file (a path or the raw bytes).
+    Columns are decoded straight into arrays, with no text tokenizing.
+    """
+    import msgpack
+
+    if isinstance(source, str):
+        with open(source, "rb") as fh:
+            source = fh.read()
+    document = msgpack.unpackb(source, raw=False)
+    for block in document["dataBlocks"]:
+        for category in block["categories"]:
+            if category["name"].lstrip("_") != "atom_site":
+                continue
+            columns = {}
+            for col in category["columns"]:
+                values = _bcif_decode(col["data"]["data"], col["data"]["encoding"])
+                mask = col.get("mask")
+                if mask:
+                    missing = _bcif_decode(mask["data"], mask["encoding"]) != 0
+                    if values.dtype.kind == "S":
+                        values = np.where(missing, b"?", values)
+                    else:
+                        values = np.where(missing, np.nan, values.astype(np.float64))
+                columns[col["name"]] = values
+            return _atom_site_arrays(columns)
+    return _empty_arrays()
+
+
+def detect_format(data: bytes) -> str:
+    """
+    'bcif', 'cif' or 'pdb', from the leading bytes of (decompressed) file contents.
+    """
+    if data[:1] and (0x80 <= data[0] <= 0x8F or data[0] in (0xDE, 0xDF)):
+        return "bcif"
+    head = data[:4096].lstrip()
+    if head.startswith((b"data_", b"#")):
+        return "cif"
+    return "pdb"
+
+
+@timed()
+def parse_structure(source: str | bytes) -> StructureArrays:
+    """
+    Parses PDB, mmCIF or BinaryCIF contents (a path or the raw bytes, optionally gzipped).
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as fh:
+            source = fh.read()
+    source = gunzip_limited(source, MAX_STRUCTURE_BYTES)
+    return {"bcif": parse_bcif, "cif": parse_mmcif, "pdb": parse_pdb}[detect_format(source)](source)
+
+
+def write_pdb(structure: StructureArrays) -> bytes:
+    """
+    Legacy PDB-format text for a structure, e.g. for services that only accept PDB files.
+    Serial numbers wrap and multi-character chain ids are cut to one character, as the
+    fixed-width format cannot hold them.
+    """
+    res_idx = structure.atom_residue_index()
+    names = structure.atom_name_vocab[structure.atom_name].astype(str)
+    elements = structure.element_vocab[structure.element].astype(str)
+    res_names = structure.res_name_vocab[structure.res_name].astype(str)[res_idx]
+    chains = structure.chain_vocab[structure.res_chain].astype(str)[res_idx]
+    icodes = structure.icode_vocab[structure.res_icode].astype(str)[res_idx]
+    res_seq = np.asarray(structure.res_seq)[res_idx]
+    het = np.asarray(structure.res_het)[res_idx]
+    models = np.asarray(structure.res_model)[res_idx]
+    coords = np.asarray(structure.coords, dtype=np.float64)
+    multi_model = len(structure.models) > 1
+
+    out = []
+    model = None
+    for i in range(structure.n_atoms):
+        if multi_model and models[i] != model:
+            if model is not None:
+                out.append("ENDMDL")
+            model = models[i]
+            out.append(f"MODEL     {model + 1:4d}")
+        name = names[i]
+        if len(name) < 4 and len(elements[i]) < 2:
+            name = " " + name
+        x, y, z = coords[i]
+        out.append(
+            f"{'HETATM' if het[i] else 'ATOM  '}{(i + 1) % 100000:5d} {name:<4} {res_names[i]:>3} {chains[i][:1]}"
+            f"{res_seq[i] % 10000:4d}{icodes[i][:1] or ' '}   {x:8.3f}{y:8.3f}{z:8.3f}"
+            f"{structure.occupancy[i]:6.2f}{structure.bfactor[i]:6.2f}          {elements[i]:>2}"
+        )
+    if multi_model and model is not None:
+        out.append("ENDMDL")
+    out.append("END")
+    return ("\n".join(out) + "\n").encode()
+
+
+def _pdb_lines(source: str | bytes) -> Iterator[bytes]:
+    if isinstance(source, bytes):
+        yield from source.splitlines()
+        return
+    with open(source, "rb") as fh:
+        for line in fh:
+            yield line.rstrip(b"\r\n")
+
+
+def iter_models(source) -> Iterator[StructureArrays]:
+    """
+    Yields one StructureArrays per model. PDB-format paths and bytes are read one
+    MODEL block at a time, so only a single model of an ensemble is held in memory;
+    parsed structures are sliced without copying.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        source = StructureArrays.load(source)
+    elif isinstance(source, (str, bytes)) and _source_format(source) != "pdb":
+        # Only uncompressed PDB text can be split on MODEL records before parsing
+        source = parse_structure(source)
+    if isinstance(source, StructureArrays):
+        for model in source.models:
+            yield source.model_slice(int(model))
+        return
+
+    index = 0
+    block: list[bytes] = []
+    for line in _pdb_lines(source):
+        record = line[:6]
+        if record == b"ATOM  " or record == b"HETATM":
+            block.append(line)
+        elif record == b"ENDMDL" and block:
+            yield _as_model(parse_pdb(b"\n".join(block)), index)
+            index += 1
+            block = []
+    if block or index == 0:
+        yield _as_model(parse_pdb(b"\n".join(block)), index)
+
+
+def _source_format(source: str | bytes) -> str:
+    if isinstance(source, bytes):
+        head = source[:4096]
+    else:
+        with open(source, "rb") as fh:
+            head = fh.read(4096)
+    return "gzip" if head[:2] == b"\x1f\x8b" else detect_format(head)
+
+
+def _as_model(structure: StructureArrays, index: int) -> StructureArrays:
+    structure.arrays["res_model"] = structure.res_model = np.full(structure.n_residues, index, dtype=np.int32)
+    return structure
+
+
+def _empty_arrays() -> StructureArrays:
+    empty_str = np.zeros(0, dtype="<U4")
+    empty_int = np.zeros(0, dtype=np.int32)
+    return StructureArrays(
+        coords=np.zeros((0, 3), dtype=np.float32), atom_name=empty_int, element=empty_int,
+        occupancy=np.zeros(0, dtype=np.float32), bfactor=np.zeros(0, dtype=np.float32),
+        res_offsets=np.zeros(1, dtype=np.int64), res_model=empty_int, res_chain=empty_int,
+        res_seq=empty_int, res_icode=empty_int, res_name=empty_int, res_het=np.zeros(0, dtype=bool),
+        atom_name_vocab=empty_str, element_vocab=empty_str, chain_vocab=empty_str,
+        icode_vocab=empty_str, res_name_vocab=empty_str,
+    )
+
+
+class StructureStore:
+    """
+    On-disk store of parsed structures keyed by PDB ID. Entries are directories of
+    .npy columns that are memory-mapped on load, so re-opening is near-instant.
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, pdb_id: str) -> str:
+        return os.path.join(self.root, pdb_id.upper())
+
+    def get(self, pdb_id: str) -> StructureArrays | None:
+        path = self.path(pdb_id)
+        if stored_version(path) != STORE_VERSION:
+            return None
+        try:
+            return StructureArrays.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, pdb_id: str, structure: StructureArrays) -> StructureArrays:
+        with self._lock:
+            # Another process may have stored the same entry since get() missed it
+            structure.save(self.path(pdb_id), overwrite=False)
+        stored = self.get(pdb_id)
+        return stored if stored is not None else structure
+
+    def load_or_parse(self, pdb_id: str, source) -> StructureArrays:
+        """
+        Returns the stored structure for pdb_id, parsing source (a path, bytes, or a
+        zero-argument callable returning bytes) only when it is not stored yet.
+        """
+        cached = self.get(pdb_id)
+        if cached is not None:
+            return cached
+        data = source() if callable(source) else source
+        return self.put(pdb_id, parse_structure(data))
+
+
+_default_store = None
+
+
+def get_store() -> StructureStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = StructureStore()
+    return _default_store
+
+
+def open_structure(source) -> StructureArrays:
+    """
+    Accepts StructureArrays, a stored entry directory, or a PDB / mmCIF / BinaryCIF
+    path or bytes.
+    """
+    if isinstance(source, StructureArrays):
+        return source
+    if isinstance(source, str) and os.path.isdir(source):
+        return StructureArrays.load(source)
+    return parse_structure(source)
@@ -1,45 +1,248 @@
-from Bio.PDB import PDBParser
+import itertools
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator
+
 import numpy as np
 
+from metrics import timed
+from structure_store import StructureArrays, iter_models, open_structure
+
+# HotspotAnalysis distance grid; the explorer's cutoff slider moves in these steps up to MAX_CUTOFF
+CUTOFF_STEP = 0.5
+MAX_CUTOFF = 8.0
+# Neighbor cells are cutoff / 2 wide (fewer candidate pairs, more lookups) for cutoffs above
+# SUBDIVIDE_CUTOFF Å on structures above SUBDIVIDE_ATOMS atoms, where that pays off
+SUBDIVIDE_CUTOFF = 6.0
+SUBDIVIDE_ATOMS = 20_000
+
+
+def _neighbor_pairs(points: np.ndarray, centers: np.ndarray, cutoff: float, chunk_size: int = 8192,
+                    subdivisions: int | None = None) -> Iterator[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yields (chunk start, center offset within chunk, point index, distance) arrays for
+    candidate pairs from the cells around each center: 27 cells of width cutoff, or
+    with subdivisions=2, 125 cells of width cutoff / 2 (about half the candidates).
+    Distances are not yet filtered against cutoff.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    if len(points) == 0 or len(centers) == 0:
+        return
+
+    origin = np.minimum(points.min(axis=0), centers.min(axis=0))
+    if subdivisions is None:
+        subdivisions = 2 if cutoff > SUBDIVIDE_CUTOFF and len(points) > SUBDIVIDE_ATOMS else 1
+    # Shift by `subdivisions` cells so that neighbor offsets never go negative
+    width = cutoff / subdivisions
+    point_cells = np.floor((points - origin) / width).astype(np.int64) + subdivisions
+    center_cells = np.floor((centers - origin) / width).astype(np.int64) + subdivisions
+    dims = np.maximum(point_cells.max(axis=0), center_cells.max(axis=0)) + subdivisions + 1
+
+    def cell_key(cells):
+        return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(cell_key(point_cells), kind="stable")
+    sorted_keys = cell_key(point_cells)[order]
+    sorted_points = points[order]
+    steps = range(-subdivisions, subdivisions + 1)
+    # cell_key is linear, so a neighbor cell's key is the center's key plus a fixed shift
+    shifts = cell_key(np.array([(dx, dy, dz) for dx in steps for dy in steps for dz in steps]))
+
+    for lo in range(0, len(centers), chunk_size):
+        chunk = centers[lo:lo + chunk_size]
+        # Centers in cell order keep every lookup below sorted, which searchsorted walks fast
+        chunk_keys = cell_key(center_cells[lo:lo + chunk_size])
+        by_cell = np.argsort(chunk_keys, kind="stable")
+        chunk_keys = chunk_keys[by_cell]
+        for shift in shifts:
+            keys = chunk_keys + shift
+            start = np.searchsorted(sorted_keys, keys, side="left")
+            lengths = np.searchsorted(sorted_keys, keys, side="right") - start
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            owner = np.repeat(by_cell, lengths)
+            first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            idx = np.repeat(start, lengths) + (np.arange(total) - first)
+            diff = sorted_points[idx] - chunk[owner]
+            dist = np.sqrt(diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1] + diff[:, 2] * diff[:, 2])
+            yield lo, owner, order[idx], dist
 
-def build_3dmol_html(pdb_id: str) -> str:
+
+def count_neighbors(points: np.ndarray, centers: np.ndarray, cutoff: float, chunk_size: int = 8192) -> np.ndarray:
+    """
+    Counts, for every center, the points lying strictly closer than cutoff Å.
+    Points are binned into a cell list, so each center only has to be compared
+    against the points of its surrounding cells.
+    """
+    counts = np.zeros(len(np.asarray(centers).reshape(-1, 3)), dtype=np.int64)
+    for lo, owner, _, dist in _neighbor_pairs(points, centers, cutoff, chunk_size):
+        chunk = counts[lo:lo + chunk_size]
+        chunk += np.bincount(owner[dist < cutoff], minlength=len(chunk))
+    return counts
+
+
+def first_model(source: str | StructureArrays) -> StructureArrays:
     """
-    Returns HTML string for embedding a 3Dmol.js viewer of the PDB entry.
+    The first model of a structure; only that model is parsed for PDB-format input.
     """
-    return f"""
-<script src="https://3Dmol.org/build/3Dmol-min.js"></script>
-<div id="viewer3d" style="width:100%; height:500px;"></div>
-<script>
-  const elt = document.getElementById('viewer3d');
-  const viewer = $3Dmol.createViewer(elt, {{ backgroundColor: 'white' }});
-  $3Dmol.download('pdb:{pdb_id.upper()}', viewer, {{}}, function() {{
-    viewer.setStyle({{}}, {{ cartoon: {{ color: 'spectrum' }} }});
-    viewer.zoomTo();
-    viewer.render();
-  }});
-</script>
-"""  # noqa: E501
+    structure = open_structure(source) if not isinstance(source, (str, bytes)) else None
+    if structure is not None and len(structure.models) <= 1:
+        return structure
+    return next(iter_models(structure if structure is not None else source))
 
 
-def find_hotspots(pdb_path: str, contact_threshold: int = 30, distance_cutoff: float = 6.0) -> list[str]:
+class HotspotAnalysis:
+    """
+    Contact counts around every CA of the first model at each CUTOFF_STEP up to
+    max_cutoff Å. Hotspots for any of those cutoffs, any threshold, a chain subset or
+    a residue range are then answered without scanning the structure again; other
+    cutoffs cost one scan each.
+
+    Construction scans only up to scan_cutoff (the default hotspot cutoff), so it
+    costs what find_hotspots does; the first query beyond it widens the scan to
+    max_cutoff once.
+    """
+
+    @timed("structure_tools.HotspotAnalysis")
+    def __init__(self, structure: str | StructureArrays, max_cutoff: float = MAX_CUTOFF, scan_cutoff: float = 6.0):
+        self.structure = first_model(structure)
+        self.max_cutoff = max_cutoff
+        res_idx, self.ca_idx = self.structure.find_atoms('CA')
+        self.labels = self.structure.residue_labels()[res_idx].astype(str)
+        self.chains = self.structure.chain_vocab[self.structure.res_chain[res_idx]].astype(str)
+        self.res_seq = np.asarray(self.structure.res_seq[res_idx])
+        # (scanned cutoff, cumulative counts per CUTOFF_STEP and CA), replaced as a whole when widened
+        self._binned = self._scan(min(scan_cutoff, max_cutoff))
+        self._counts: dict[float, np.ndarray] = {}
+
+    def _scan(self, cutoff: float, chunk_size: int = 8192) -> tuple[float, np.ndarray]:
+        """
+        Bins atoms by floor(distance / CUTOFF_STEP) per CA: distance < k * CUTOFF_STEP
+        exactly when the bin is below k, so the cumulative bins are exact counts.
+        """
+        n_bins = int(np.ceil(cutoff / CUTOFF_STEP))
+        binned = np.zeros((len(self.labels), n_bins), dtype=np.int32)
+        for lo, owner, _, dist in _neighbor_pairs(self.structure.coords, self.structure.coords[self.ca_idx],
+                                                  cutoff, chunk_size):
+            keep = dist < cutoff
+            chunk = binned[lo:lo + chunk_size]
+            flat = owner[keep] * n_bins + (dist[keep] / CUTOFF_STEP).astype(np.int64)
+            chunk += np.bincount(flat, minlength=chunk.size).reshape(chunk.shape).astype(np.int32)
+        # One contiguous row of counts per cutoff step
+        return cutoff, np.ascontiguousarray(np.cumsum(binned, axis=1, dtype=np.int32).T)
+
+    @property
+    def chain_ids(self) -> list[str]:
+        return list(dict.fromkeys(self.chains.tolist()))
+
+    def counts(self, distance_cutoff: float = 6.0) -> np.ndarray:
+        """
+        Number of atoms strictly closer than distance_cutoff Å to each CA.
+        """
+        if distance_cutoff > self.max_cutoff:
+            raise ValueError(f"distance_cutoff {distance_cutoff} exceeds the precomputed {self.max_cutoff} Å")
+        steps = distance_cutoff / CUTOFF_STEP
+        if steps == int(steps):
+            scanned, binned = self._binned
+            if distance_cutoff > scanned:
+                self._binned = scanned, binned = self._scan(self.max_cutoff)
+            return binned[int(steps) - 1] if steps else np.zeros(len(self.labels), dtype=np.int32)
+        counts = self._counts.get(distance_cutoff)
+        if counts is None:
+            counts = model_contact_counts(self.structure.coords, self.ca_idx, distance_cutoff)
+            self._counts[distance_cutoff] = counts
+        return counts
+
+    def select(self, chains: list[str] | None = None, residue_range: tuple[int, int] | None = None) -> np.ndarray:
+        """
+        Boolean mask over CA residues in the given chains and inclusive residue number range.
+        """
+        mask = np.ones(len(self.labels), dtype=bool)
+        if chains is not None:
+            mask &= np.isin(self.chains, list(chains))
+        if residue_range is not None:
+            mask &= (self.res_seq >= residue_range[0]) & (self.res_seq <= residue_range[1])
+        return mask
+
+    def hotspots(self, contact_threshold: int = 30, distance_cutoff: float = 6.0, chains: list[str] | None = None,
+                 residue_range: tuple[int, int] | None = None) -> list[str]:
+        """
+        Same result as find_hotspots, restricted to the selected residues. Contacts are
+        still counted against every atom of the structure.
+        """
+        mask = self.select(chains, residue_range) & (self.counts(distance_cutoff) > contact_threshold)
+        return sorted(self.labels[mask].tolist())
+
+
+def model_contact_counts(coords: np.ndarray, ca_idx: np.ndarray, distance_cutoff: float) -> np.ndarray:
+    """
+    Atoms of one model within distance_cutoff Å of each of its CA atoms.
+    """
+    return count_neighbors(coords, coords[ca_idx], distance_cutoff)
+
+
+def model_hotspots(model: StructureArrays, contact_threshold: int = 30, distance_cutoff: float = 6.0) -> list[str]:
+    res_idx, ca_idx = model.find_atoms('CA')
+    counts = model_contact_counts(model.coords, ca_idx, distance_cutoff)
+    labels = model.residue_labels()[res_idx]
+    return sorted(str(label) for label, count in zip(labels, counts) if count > contact_threshold)
+
+
+@timed()
+def find_hotspots(pdb_path: str | StructureArrays, contact_threshold: int = 30, distance_cutoff: float = 6.0) -> list[str]:
     """
     Identifies residues with more than contact_threshold atoms within distance_cutoff Å.
+    Accepts a PDB file path or already-parsed StructureArrays. Contacts are counted
+    within the first model only; see ensemble_hotspots for NMR and multi-model entries.
     Returns list of residue identifiers (e.g. 'A123').
     """
-    parser = PDBParser(QUIET=True)
-    structure = parser.get_structure('X', pdb_path)
-    atoms = list(structure.get_atoms())
-    hotspots = []
-    for model in structure:
-        for chain in model:
-            for res in chain:
-                if 'CA' not in res:
-                    continue
-                ca = res['CA'].get_vector()
-                count = sum(
-                    1 for atom in atoms
-                    if (atom.get_vector() - ca).norm() < distance_cutoff
+    return model_hotspots(first_model(pdb_path), contact_threshold, distance_cutoff)
+
+
+@timed()
+def ensemble_hotspots(source: str | bytes | StructureArrays, contact_threshold: int = 30,
+                      distance_cutoff: float = 6.0, max_workers: int | None = None) -> tuple[dict[str, float], int]:
+    """
+    Fraction of models in which each residue is a hotspot, counting contacts only
+    within the same model. Models are streamed from source and counted on a process
+    pool with at most two models per worker in flight, so memory stays bounded for
+    large ensembles. Returns ({label: frequency}, number of models).
+    """
+    models = iter_models(source)
+    head = [model for model in (next(models, None), next(models, None)) if model is not None]
+    present: Counter = Counter()
+    hits: Counter = Counter()
+    n_models = 0
+
+    def submit(model: StructureArrays, run):
+        res_idx, ca_idx = model.find_atoms('CA')
+        return model.residue_labels()[res_idx].astype(str), run(np.ascontiguousarray(model.coords), ca_idx)
+
+    def collect(labels: np.ndarray, counts: np.ndarray):
+        nonlocal n_models
+        n_models += 1
+        present.update(labels.tolist())
+        hits.update(labels[counts > contact_threshold].tolist())
+
+    if len(head) < 2 or max_workers == 1:
+        for model in itertools.chain(head, models):
+            collect(*submit(model, lambda coords, ca_idx: model_contact_counts(coords, ca_idx, distance_cutoff)))
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        pending = {}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for model in itertools.chain(head, models):
+                if len(pending) >= 2 * max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(pending.pop(future), future.result())
+                labels, future = submit(
+                    model, lambda coords, ca_idx: pool.submit(model_contact_counts, coords, ca_idx, distance_cutoff)
                 )
-                if count > contact_threshold:
-                    hotspots.append(f"{chain.id}{res.id[1]}")
-    return sorted(hotspots)
\ No newline at end of file
+                pending[future] = labels
+            for future, labels in pending.items():
+                collect(labels, future.result())
+    return {label: hits[label] / present[label] for label in sorted(present)}, n_models
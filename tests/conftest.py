@@ -0,0 +1,9 @@
+"""
+Tests run against local stand-ins for the upstream services (benchmarks/fixtures.py),
+never the real APIs.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
@@ -0,0 +1,77 @@
+"""
+Batched Smith-Waterman against Biopython's local aligner, and the traceback's memory
+bound on long queries.
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+from Bio.Align import PairwiseAligner
+
+from homology import SUBSTITUTION, _BLOSUM, align_batch, encode, smith_waterman
+
+AMINO_ACIDS = np.array(list("ACDEFGHIKLMNPQRSTVWY"))
+
+
+def random_sequence(rng, length: int) -> str:
+    return "".join(rng.choice(AMINO_ACIDS, length))
+
+
+def mutated(rng, sequence: str) -> str:
+    """
+    A homolog: every sixth position on average substituted, deleted or followed by a
+    short insertion.
+    """
+    out = []
+    for aa in sequence:
+        roll = rng.random()
+        if roll < 0.06:
+            continue
+        out.append(rng.choice(AMINO_ACIDS) if roll < 0.12 else aa)
+        if roll > 0.97:
+            out.extend(rng.choice(AMINO_ACIDS, rng.integers(1, 5)))
+    return "".join(out)
+
+
+def rescored(query: np.ndarray, target: np.ndarray, pairs, gap_open: int, gap_extend: int) -> int:
+    """
+    Score of an alignment given as aligned (query index, target index) pairs.
+    """
+    score = sum(int(SUBSTITUTION[query[qi], target[tj]]) for qi, tj in pairs)
+    for (q0, t0), (q1, t1) in zip(pairs, pairs[1:]):
+        for gap in (q1 - q0 - 1, t1 - t0 - 1):
+            if gap:
+                score -= gap_open + gap * gap_extend
+    return score
+
+
+@pytest.mark.parametrize("gap_open, gap_extend", [(11, 1), (3, 2)])
+def test_batch_matches_biopython_and_tracebacks_rescore(gap_open, gap_extend):
+    rng = np.random.default_rng(7)
+    aligner = PairwiseAligner(mode="local", substitution_matrix=_BLOSUM,
+                              open_gap_score=-(gap_open + gap_extend), extend_gap_score=-gap_extend)
+    query = random_sequence(rng, 120)
+    targets = [mutated(rng, query) for _ in range(4)] + [random_sequence(rng, 60), query[30:90]]
+    encoded = [encode(t) for t in targets]
+
+    scores = smith_waterman(encode(query), encoded, gap_open, gap_extend)
+    assert scores.tolist() == [int(aligner.score(query, t)) for t in targets]
+    for target, score, (aligned_score, pairs) in zip(encoded, scores, align_batch(encode(query), encoded,
+                                                                                  gap_open, gap_extend)):
+        assert aligned_score == score
+        assert rescored(encode(query), target, pairs, gap_open, gap_extend) == score
+
+
+def test_traceback_keeps_one_byte_per_cell():
+    rng = np.random.default_rng(3)
+    query = random_sequence(rng, 1500)
+    target = mutated(rng, query)
+    tracemalloc.start()
+    try:
+        (score, pairs), = align_batch(encode(query), [encode(target)])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(pairs) > 1200 and score > 0
+    # The H/E/F history this replaced took 12 bytes per diagonal and query position
+    assert peak < 2 * len(query) * len(target)
@@ -0,0 +1,155 @@
+"""
+LLMGateway against a fake OpenAI chat-completions endpoint on the stand-in server,
+through the real openai client and its SSE stream parsing.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+from fixtures import StandInServer
+
+from analysis import is_json
+from llm import LLMGateway
+
+
+class FakeOpenAI:
+    """
+    Streams `reply` back in `chunks` pieces, then a usage chunk, after `delay` seconds;
+    answers with an API error instead while `status` is not 200.
+    """
+
+    def __init__(self, reply: str = '{"Structure": ["beta barrel"]}', chunks: int = 3, delay: float = 0.0):
+        self.reply = reply
+        self.chunks = chunks
+        self.delay = delay
+        self.status = 200
+        self.prompts = []
+
+    def __call__(self, path, query, body):
+        request = json.loads(body)
+        self.prompts.append(request["messages"][0]["content"])
+        time.sleep(self.delay)
+        if self.status != 200:
+            return self.status, "application/json", b'{"error": {"message": "upstream failure"}}', {}
+        size = -(-len(self.reply) // self.chunks)
+        pieces = [self.reply[i:i + size] for i in range(0, len(self.reply), size)]
+        events = [
+            {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            for piece in pieces
+        ]
+        events.append({"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                       "choices": [], "usage": {"prompt_tokens": 11, "completion_tokens": len(pieces),
+                                                "total_tokens": 11 + len(pieces)}})
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        return 200, "text/event-stream", stream.encode(), {}
+
+
+@pytest.fixture
+def fake_openai():
+    endpoint = FakeOpenAI()
+    with StandInServer(routes=[("POST", "/v1/chat/completions", endpoint)]) as server:
+        endpoint.client = openai.OpenAI(base_url=f"{server.base_url}/v1", api_key="test", max_retries=0)
+        yield endpoint
+
+
+@pytest.fixture
+def gateway(fake_openai, tmp_path):
+    return LLMGateway(client=fake_openai.client, cache_path=str(tmp_path / "llm.sqlite3"))
+
+
+def test_cache_miss_then_hit(fake_openai, gateway):
+    assert gateway.complete("What does Mpro do?") == fake_openai.reply
+    assert gateway.complete("What does Mpro do?") == fake_openai.reply
+    assert fake_openai.prompts == ["What does Mpro do?"]
+    stats = gateway.stats()
+    assert (stats["api_calls"], stats["cache_hits"]) == (1, 1)
+    assert (stats["prompt_tokens"], stats["completion_tokens"]) == (11, 3)
+
+
+def test_cache_key_covers_model_and_temperature(fake_openai, gateway):
+    gateway.complete("Same prompt")
+    gateway.complete("Same prompt", temperature=0.0)
+    gateway.complete("Same prompt", model="gpt-4o")
+    assert len(fake_openai.prompts) == 3
+
+
+def test_cache_survives_a_new_gateway(fake_openai, gateway, tmp_path):
+    gateway.complete("Persisted?")
+    reopened = LLMGateway(client=fake_openai.client, cache_path=str(tmp_path / "llm.sqlite3"))
+    assert reopened.complete("Persisted?") == fake_openai.reply
+    assert len(fake_openai.prompts) == 1
+
+
+def test_stream_yields_chunks_then_cached_reply_whole(fake_openai, gateway):
+    streamed = list(gateway.stream("Stream it"))
+    assert len(streamed) == 3 and "".join(streamed) == fake_openai.reply
+    assert list(gateway.stream("Stream it")) == [fake_openai.reply]
+    assert gateway.records[0].first_token is not None
+
+
+def test_identical_concurrent_requests_share_one_call(fake_openai, gateway):
+    fake_openai.delay = 0.3
+    start = threading.Barrier(4)
+
+    def ask():
+        start.wait()
+        return gateway.complete("Asked by four sessions at once")
+
+    with ThreadPoolExecutor(4) as pool:
+        replies = list(pool.map(lambda _: ask(), range(4)))
+    assert replies == [fake_openai.reply] * 4
+    assert len(fake_openai.prompts) == 1
+    stats = gateway.stats()
+    assert stats["api_calls"] == 1 and stats["coalesced"] + stats["cache_hits"] == 3
+
+
+def test_rejected_reply_is_returned_but_not_cached(fake_openai, gateway):
+    fake_openai.reply = "Sorry, here is a summary in prose."
+    assert gateway.complete("Summarize as JSON", validate=is_json) == fake_openai.reply
+    gateway.complete("Summarize as JSON", validate=is_json)
+    assert len(fake_openai.prompts) == 2
+
+    fake_openai.reply = '{"Function": ["protease"]}'
+    assert json.loads(gateway.complete("Summarize as JSON", validate=is_json)) == {"Function": ["protease"]}
+    gateway.complete("Summarize as JSON", validate=is_json)
+    assert len(fake_openai.prompts) == 3
+
+
+def test_cached_reply_failing_validation_is_evicted(fake_openai, gateway):
+    fake_openai.reply = "not json"
+    gateway.complete("Cached before validation")
+    assert gateway.complete("Cached before validation") == "not json"
+    assert len(fake_openai.prompts) == 1
+
+    fake_openai.reply = "[]"
+    assert gateway.complete("Cached before validation", validate=is_json) == "[]"
+    assert gateway.complete("Cached before validation", validate=is_json) == "[]"
+    assert len(fake_openai.prompts) == 2
+
+
+def test_failed_call_is_not_cached(fake_openai, gateway):
+    fake_openai.status = 500
+    with pytest.raises(openai.APIStatusError):
+        gateway.complete("Fails")
+    fake_openai.status = 200
+    assert gateway.complete("Fails") == fake_openai.reply
+    assert len(fake_openai.prompts) == 2
+
+
+def test_summary_retries_after_a_non_json_reply(fake_openai, gateway, monkeypatch):
+    import llm
+    from analysis import summarize_uniprot
+
+    monkeypatch.setattr(llm, "_default_gateway", gateway)
+    up_features = {"comments": [{"texts": [{"value": "Cleaves the polyprotein."}]}]}
+    fake_openai.reply = "I cannot answer in JSON."
+    with pytest.raises(json.JSONDecodeError):
+        summarize_uniprot(up_features)
+    fake_openai.reply = '{"Function": ["Cleaves the polyprotein"]}'
+    assert summarize_uniprot(up_features) == {"Function": ["Cleaves the polyprotein"]}
+    assert summarize_uniprot(up_features) == {"Function": ["Cleaves the polyprotein"]}
+    assert len(fake_openai.prompts) == 2
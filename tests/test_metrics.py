@@ -0,0 +1,70 @@
+"""
+Profile sessions stay with the thread (Streamlit session) that opened them.
+"""
+import threading
+import time
+
+from metrics import profile
+from pipeline import Pipeline, Stage
+
+
+def profiled_stage_marker():
+    time.sleep(0.05)
+    return 1
+
+
+def other_session_marker():
+    time.sleep(0.05)
+    return 2
+
+
+def run(func):
+    return list(Pipeline([Stage("work", func)]).run())
+
+
+def test_profile_covers_own_pipeline_stages_only():
+    started, other_done = threading.Barrier(2), threading.Event()
+
+    def other_session():
+        started.wait()
+        run(other_session_marker)
+        other_done.set()
+
+    thread = threading.Thread(target=other_session)
+    thread.start()
+    with profile() as report:
+        started.wait()
+        run(profiled_stage_marker)
+        other_done.wait()
+    thread.join()
+
+    assert "profiled_stage_marker" in report["text"]
+    assert "other_session_marker" not in report["text"]
+
+
+def test_sessions_restore_independently():
+    reports = {}
+    inside = threading.Barrier(2)
+    first_left = threading.Event()
+
+    def session(name, func):
+        with profile() as report:
+            inside.wait()
+            if name == "second":
+                first_left.wait()
+            run(func)
+        reports[name] = report["text"]
+        if name == "first":
+            first_left.set()
+
+    threads = [threading.Thread(target=session, args=("first", profiled_stage_marker)),
+               threading.Thread(target=session, args=("second", other_session_marker))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The second session is still recording after the first one has closed
+    assert "other_session_marker" in reports["second"]
+    assert "profiled_stage_marker" not in reports["second"]
+    assert "other_session_marker" not in reports["first"]
@@ -0,0 +1,122 @@
+"""
+Saturation scans against a local stand-in for the batch predictor API: one upload per
+structure, batched predictions, the on-disk memo, and multi-character chain ids.
+"""
+import json
+
+import numpy as np
+import pytest
+from fixtures import TEMP_PDB, OfflineUpstreams
+
+from mutation_scan import MutationScanner, saturation_mutations
+from structure_store import StructureArrays, parse_structure, write_pdb
+
+HOST = "/dynamut-api.example.org"
+
+
+class FakePredictor:
+    """
+    Batch predictor: every uploaded structure gets an id, and every mutation a ddg
+    derived from its name. Batches containing a mutation in `reject` fail with 400.
+    """
+
+    def __init__(self):
+        self.uploads = 0
+        self.batches = []
+        self.reject = set()
+
+    def upload(self, path, query, body):
+        self.uploads += 1
+        return 200, "application/json", json.dumps({"structure_id": f"s{self.uploads}"}).encode(), {}
+
+    def predict(self, path, query, body):
+        request = json.loads(body)
+        mutations = request["mutations"]
+        self.batches.append(mutations)
+        if any(m["mutation"] in self.reject for m in mutations):
+            return 400, "application/json", b'{"error": "unsupported mutation"}', {}
+        results = [{"ddg": self.ddg(m["mutation"])} for m in mutations]
+        return 200, "application/json", json.dumps({"results": results}).encode(), {}
+
+    @staticmethod
+    def ddg(mutation: str) -> float:
+        return round(len(mutation) * 0.1 + ord(mutation[-1]) / 100, 2)
+
+
+@pytest.fixture
+def predictor():
+    fake = FakePredictor()
+    upstreams = OfflineUpstreams(routes=[
+        ("POST", f"{HOST}/structures", fake.upload),
+        ("POST", f"{HOST}/predict/batch", fake.predict),
+    ])
+    yield fake
+    upstreams.close()
+
+
+@pytest.fixture(scope="module")
+def mpro() -> StructureArrays:
+    with open(TEMP_PDB, "rb") as fh:
+        return parse_structure(fh.read())
+
+
+def renamed_chains(structure: StructureArrays, names: dict[str, str]) -> StructureArrays:
+    arrays = dict(structure.arrays)
+    arrays["chain_vocab"] = np.array([names.get(str(c), str(c)) for c in structure.chain_vocab])
+    return StructureArrays(**arrays)
+
+
+def test_saturation_mutations_multi_character_chain(mpro):
+    structure = renamed_chains(mpro, {"A": "AA"})
+    mutations = saturation_mutations(structure, ["AA41", "AA145"])
+    assert len(mutations) == 38
+    assert {(m["chain"], m["resnum"]) for m in mutations} == {("AA", 41), ("AA", 145)}
+    assert {m["mutation"][0] for m in mutations if m["resnum"] == 145} == {"C"}
+    # A label from a chain that is not there is skipped, not misread as chain "A"
+    assert saturation_mutations(structure, ["A41"]) == []
+
+
+def test_scan_uploads_once_and_batches(predictor, mpro, tmp_path):
+    pdb = write_pdb(mpro)
+    mutations = saturation_mutations(pdb, ["A41", "A145"])
+    scanner = MutationScanner(pdb, batch_size=10, max_workers=2, memo_path=str(tmp_path / "memo.sqlite3"))
+    results = [r for batch in scanner.scan(mutations) for r in batch]
+
+    assert predictor.uploads == 1
+    assert sorted(len(batch) for batch in predictor.batches) == [8, 10, 10, 10]
+    assert all(b_m.keys() == {"chain", "resnum", "mutation"} for batch in predictor.batches for b_m in batch)
+    assert sorted(r["mutation"] for r in results) == sorted(m["mutation"] for m in mutations)
+    assert all(r["ddg"] == FakePredictor.ddg(r["mutation"]) for r in results)
+
+
+def test_memo_serves_repeat_scans_without_requests(predictor, mpro, tmp_path):
+    pdb = write_pdb(mpro)
+    memo = str(tmp_path / "memo.sqlite3")
+    mutations = saturation_mutations(pdb, ["A41"])
+    first = [r for batch in MutationScanner(pdb, memo_path=memo).scan(mutations) for r in batch]
+
+    batches = list(MutationScanner(pdb, memo_path=memo).scan(mutations))
+    assert len(batches) == 1 and sorted(batches[0], key=str) == sorted(first, key=str)
+    assert predictor.uploads == 1 and len(predictor.batches) == 1
+
+    # The memo is keyed by the structure's contents
+    other = write_pdb(renamed_chains(mpro, {"C": "D"}))
+    list(MutationScanner(other, memo_path=memo).scan(mutations))
+    assert predictor.uploads == 2 and len(predictor.batches) == 2
+
+
+def test_failed_batch_reports_errors_and_is_not_memoized(predictor, mpro, tmp_path):
+    pdb = write_pdb(mpro)
+    memo = str(tmp_path / "memo.sqlite3")
+    mutations = saturation_mutations(pdb, ["A41"])
+    predictor.reject = {mutations[0]["mutation"]}
+    results = [r for batch in MutationScanner(pdb, batch_size=10, memo_path=memo).scan(mutations) for r in batch]
+
+    failed = [r for r in results if "error" in r]
+    assert len(failed) == 10 and all("ddg" not in r for r in failed)
+    assert len(results) == 19
+
+    predictor.reject = set()
+    retried = list(MutationScanner(pdb, batch_size=10, memo_path=memo).scan(mutations))
+    assert [len(batch) for batch in retried] == [9, 10]
+    assert all("error" not in r for batch in retried for r in batch)
@@ -0,0 +1,65 @@
+"""
+StructureStore entries written by several processes at once, as the batch runner's
+CPU workers do for targets that resolve to the same PDB ID.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from fixtures import TEMP_PDB
+
+from structure_store import STORE_VERSION, StructureArrays, StructureStore, parse_structure
+
+
+ENTRIES = [f"E{i:03d}" for i in range(25)]
+
+
+def put_all(root: str, barrier) -> int:
+    with open(TEMP_PDB, "rb") as fh:
+        structure = parse_structure(fh.read())
+    store = StructureStore(root)
+    for pdb_id in ENTRIES:
+        # All writers miss the store and save the entry at the same moment
+        barrier.wait()
+        if store.get(pdb_id) is None:
+            store.put(pdb_id, structure)
+    return structure.n_atoms
+
+
+def test_concurrent_puts_of_the_same_entries(tmp_path):
+    root = tmp_path / "structures"
+    root.mkdir()
+    # Every third entry starts out from an older store version and has to be replaced
+    for pdb_id in ENTRIES[::3]:
+        (root / pdb_id).mkdir()
+        (root / pdb_id / "meta.json").write_text(json.dumps({"version": STORE_VERSION - 1}))
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=4) as pool:
+        barrier = manager.Barrier(4)
+        n_atoms = set(pool.map(put_all, [str(root)] * 4, [barrier] * 4))
+
+    store = StructureStore(str(root))
+    assert all(store.get(pdb_id).n_atoms in n_atoms for pdb_id in ENTRIES)
+    assert sorted(p.name for p in root.iterdir()) == ENTRIES
+
+
+def test_put_keeps_an_entry_stored_by_another_process(tmp_path):
+    with open(TEMP_PDB, "rb") as fh:
+        structure = parse_structure(fh.read())
+    store = StructureStore(str(tmp_path))
+    first = store.put("6LU7", structure)
+    shifted = StructureArrays(**{**structure.arrays, "coords": np.asarray(structure.coords) + 1})
+    np.testing.assert_array_equal(store.put("6LU7", shifted).coords, first.coords)
+    assert [p.name for p in tmp_path.iterdir()] == ["6LU7"]
+
+
+def test_save_replaces_an_existing_entry(tmp_path):
+    with open(TEMP_PDB, "rb") as fh:
+        structure = parse_structure(fh.read())
+    path = str(tmp_path / "6LU7")
+    structure.save(path)
+    shifted = StructureArrays(**{**structure.arrays, "coords": np.asarray(structure.coords) + 1})
+    shifted.save(path)
+    np.testing.assert_array_equal(StructureArrays.load(path).coords, shifted.coords)
+    assert [p.name for p in tmp_path.iterdir()] == ["6LU7"]
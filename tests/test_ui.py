@@ -0,0 +1,20 @@
+"""
+Domain-map downsampling keeps every feature inside a merged span of its own lane.
+"""
+import numpy as np
+
+from ui import assign_lanes, downsample_features
+
+
+def test_downsampled_spans_stay_in_their_lane_past_the_axis_end():
+    # pp1ab-sized UniProt positions plotted on a 306-residue chain axis
+    rng = np.random.default_rng(0)
+    starts = rng.integers(1, 7096, 3000)
+    ends = starts + rng.integers(0, 50, 3000)
+    lanes = assign_lanes(starts, ends)
+    merged_starts, merged_ends, merged_lanes, hover = downsample_features(
+        starts, ends, lanes, [f"feature {i}" for i in range(3000)], seq_length=306)
+
+    assert len(merged_starts) < len(starts) and len(hover) == len(merged_starts)
+    for start, end, lane in zip(starts, ends, lanes):
+        assert np.any((merged_lanes == lane) & (merged_starts <= start) & (merged_ends >= end))
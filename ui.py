@@ -1,14 +1,32 @@
+import numpy as np
 import streamlit as st
 from plotly import graph_objects as go
 from predictors import predict_ddg_dynamut
+from mutation_scan import AMINO_ACIDS, MutationScanner, saturation_mutations
+from structure_tools import CUTOFF_STEP, HotspotAnalysis
+from annotation_index import AnnotationIndex, feature_category, parse_residue
+from metrics import MetricsRegistry
 from collections import defaultdict
 
-def group_features_by_ontology(features):
+def group_features_by_ontology(features, chain: str | None = None):
     """
     Groups UniProt features into categories: domain, site, bond, other.
+    features may also be an AnnotationIndex; given a chain, positions are then that
+    chain's author residue numbers and only features over its mapped residues are kept.
     """
     categories = defaultdict(list)
 
+    if isinstance(features, AnnotationIndex):
+        span = features.residue_map.span(chain) if chain is not None else None
+        if span:
+            hits = features.overlapping_residues(chain, *span)
+        else:
+            hits = [(a, a["start"], a["end"]) for a in features.annotations if a["start"] is not None]
+        for annotation, start, end in hits:
+            if annotation["source"] == "uniprot":
+                categories[annotation["category"]].append({"label": annotation["label"], "start": start, "end": end})
+        return categories
+
     for feat in features:
         ftype = feat["type"].lower()
         start = feat["location"]["start"]["value"]
@@ -20,23 +38,83 @@ def group_features_by_ontology(features):
             "start": start,
             "end": end,
         }
+        categories[feature_category(ftype)].append(entry)
+
+    return categories
+
+
+
+# Lanes per category band; features overlapping more than this share the emptiest lane
+DOMAIN_MAX_LANES = 4
+# Above this many features in a category, neighbouring features in a lane are merged
+DOMAIN_MAX_ITEMS = 400
+BAND_HEIGHT = 0.18
 
-        # Group based on feature type logic
-        if "domain" in ftype or "region" in ftype or "repeat" in ftype or "motif" in ftype:
-            categories["domain"].append(entry)
-        elif "site" in ftype or "binding" in ftype or "metal" in ftype:
-            categories["site"].append(entry)
-        elif "bond" in ftype or "disulfide" in ftype or "cross-link" in ftype:
-            categories["bond"].append(entry)
+
+def assign_lanes(starts: np.ndarray, ends: np.ndarray, max_lanes: int = DOMAIN_MAX_LANES) -> np.ndarray:
+    """
+    Greedy interval packing: each feature goes to the first lane whose last feature
+    ends before it starts (positions are inclusive), or to a new lane.
+    """
+    lanes = np.zeros(len(starts), dtype=np.int32)
+    lane_ends: list[int] = []
+    for i in np.lexsort((ends, starts)):
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end < starts[i]:
+                break
         else:
-            categories["other"].append(entry)
+            if len(lane_ends) < max_lanes:
+                lane_ends.append(0)
+                lane = len(lane_ends) - 1
+            else:
+                lane = int(np.argmin(lane_ends))
+        lanes[i] = lane
+        lane_ends[lane] = max(lane_ends[lane], ends[i])
+    return lanes
 
-    return categories
 
+def downsample_features(starts: np.ndarray, ends: np.ndarray, lanes: np.ndarray, labels: list[str],
+                        seq_length: int, max_items: int = DOMAIN_MAX_ITEMS):
+    """
+    Merges features that start in the same window of a lane into one span, with
+    windows sized so at most about max_items spans remain. Returns
+    (starts, ends, lanes, hover texts).
+    """
+    hover = [f"{label}<br>{x0} - {x1}" for label, x0, x1 in zip(labels, starts, ends)]
+    if len(starts) <= max_items:
+        return starts, ends, lanes, hover
+
+    n_lanes = int(lanes.max()) + 1
+    window = max(1, -(-seq_length * n_lanes // max_items))
+    # Positions can run past seq_length (UniProt numbering on a chain-length axis);
+    # the lane stride must cover them so windows of different lanes never share a key
+    stride = max(seq_length, int(ends.max())) // window + 1
+    keys = lanes.astype(np.int64) * stride + starts // window
+    order = np.argsort(keys, kind="stable")
+    _, first = np.unique(keys[order], return_index=True)
+    bounds = np.append(first, len(order))
 
+    merged_starts = np.minimum.reduceat(starts[order], first)
+    merged_ends = np.maximum.reduceat(ends[order], first)
+    merged_hover = []
+    for lo, hi, x0, x1 in zip(bounds[:-1], bounds[1:], merged_starts, merged_ends):
+        if hi - lo == 1:
+            merged_hover.append(hover[order[lo]])
+            continue
+        names = "<br>".join(labels[j] for j in order[lo:lo + 3])
+        more = f"<br>… and {hi - lo - 3} more" if hi - lo > 3 else ""
+        merged_hover.append(f"{hi - lo} features, {x0} - {x1}<br>{names}{more}")
+    return merged_starts, merged_ends, lanes[order[first]], merged_hover
 
-def plot_domains(features: list[dict], seq_length: int) -> go.Figure:
-    grouped = group_features_by_ontology(features)
+
+def plot_domains(features: list[dict] | AnnotationIndex, seq_length: int, chain: str | None = None) -> go.Figure:
+    """
+    Domain map with one trace per category: bars for spans, one NaN-separated line
+    trace for bonds. Overlapping features are stacked in lanes, and dense categories
+    are merged into windows, so trace count and payload stay bounded. features and
+    chain are as for group_features_by_ontology.
+    """
+    grouped = group_features_by_ontology(features, chain)
     fig = go.Figure()
 
     # Better colors and y-labels
@@ -48,38 +126,46 @@ def plot_domains(features: list[dict], seq_length: int) -> go.Figure:
     }
 
     for category, feats in grouped.items():
-        for feat in feats:
-            x0 = feat["start"]
-            x1 = feat["end"]
-            y = category_settings[category]["y"]
-            label = feat["label"]
-            color = category_settings[category]["color"]
-
-            if category == "bond":
-                # Show as a single horizontal line
-                fig.add_trace(go.Scatter(
-                    x=[x0, x1],
-                    y=[y, y],
-                    mode="lines+markers",
-                    line=dict(color=color, width=2),
-                    marker=dict(color=color, size=8),
-                    hovertemplate=f"{label}<br>{x0} - {x1}",
-                    name=category_settings[category]["label"],
-                    showlegend=False
-                ))
-            else:
-                # Show as a rectangle (domain, site, other)
-                fig.add_trace(go.Bar(
-                    x=[max(1, x1 - x0)],
-                    y=[y],
-                    base=x0,
-                    width=0.1,
-                    orientation="h",
-                    name=category_settings[category]["label"],
-                    marker=dict(color=color),
-                    hovertemplate=f"{label}<br>{x0} - {x1}",
-                    showlegend=False
-                ))
+        settings = category_settings[category]
+        starts = np.fromiter((f["start"] for f in feats), dtype=np.int64, count=len(feats))
+        ends = np.fromiter((f["end"] for f in feats), dtype=np.int64, count=len(feats))
+        lanes = assign_lanes(starts, ends)
+        n_lanes = int(lanes.max()) + 1
+        starts, ends, lanes, hover = downsample_features(
+            starts, ends, lanes, [f["label"] for f in feats], seq_length
+        )
+        # Lanes run top to bottom inside the category's band
+        lane_height = BAND_HEIGHT / n_lanes
+        y = settings["y"] + BAND_HEIGHT / 2 - (lanes + 0.5) * lane_height
+
+        if category == "bond":
+            # Each bond is a segment start-end; NaN rows break the line between bonds
+            xs = np.column_stack([starts, ends, np.full(len(starts), np.nan)]).ravel()
+            ys = np.column_stack([y, y, np.full(len(y), np.nan)]).ravel()
+            fig.add_trace(go.Scatter(
+                x=xs,
+                y=ys,
+                mode="lines+markers",
+                line=dict(color=settings["color"], width=2),
+                marker=dict(color=settings["color"], size=8),
+                hovertext=[text for h in hover for text in (h, h, None)],
+                hovertemplate="%{hovertext}<extra></extra>",
+                name=settings["label"],
+                showlegend=False
+            ))
+        else:
+            fig.add_trace(go.Bar(
+                x=np.maximum(1, ends - starts),
+                y=y,
+                base=starts,
+                width=min(0.1, lane_height * 0.8),
+                orientation="h",
+                name=settings["label"],
+                marker=dict(color=settings["color"]),
+                hovertext=hover,
+                hovertemplate="%{hovertext}<extra></extra>",
+                showlegend=False
+            ))
 
     fig.update_layout(
         title="🧬 Protein Domain and Feature Map (UniProt)",
@@ -94,7 +180,8 @@ def plot_domains(features: list[dict], seq_length: int) -> go.Figure:
         plot_bgcolor="#FAFAFA",
         height=350,
         margin=dict(t=40, l=40, r=20, b=40),
-        showlegend=False
+        showlegend=False,
+        barmode="overlay"
     )
     return fig
 
@@ -118,19 +205,175 @@ def plot_conservation(scores: list[float]) -> go.Figure:
     return fig
 
 
-def show_mutation_form():
+def residue_rows(residues: list[str], annotations: AnnotationIndex) -> list[dict]:
+    """
+    One table row per residue label with its UniProt position and covering annotations.
+    """
+    rows = []
+    for label in residues:
+        parsed = parse_residue(label)
+        info = annotations.describe_residue(*parsed) if parsed else {"uniprot": None, "annotations": ""}
+        rows.append({"Residue": label, "UniProt": info["uniprot"], "Annotations": info["annotations"]})
+    return rows
+
+
+def show_mutation_form(pdb_file: str | bytes, annotations: AnnotationIndex | None = None):
     """
     Renders a form for users to input a mutation and see DynaMut predictions.
+    pdb_file is a PDB path or in-memory PDB-format bytes. With annotations, the
+    UniProt position and annotations of the residue are shown alongside.
     """
     with st.form('mutate_form'):
         site = st.text_input('Residue (e.g. A123)')
         mutation = st.text_input('Mutation (e.g. A123C)')
         submitted = st.form_submit_button('Predict ΔΔG')
         if submitted:
+            parsed = parse_residue(site)
+            if parsed is None:
+                st.error("Error: enter the residue as chain and number, e.g. A123")
+                return
+            if annotations is not None:
+                info = annotations.describe_residue(*parsed)
+                position = f"UniProt {info['uniprot']}" if info["uniprot"] is not None else "not mapped to UniProt"
+                hotspot = " · contact hotspot" if info["hotspot"] else ""
+                st.caption(f"{site.strip()}: {position}{hotspot}. {info['annotations'] or 'No annotations.'}")
             try:
-                chain = site[0]
-                resnum = int(site[1:])
-                result = predict_ddg_dynamut('temp.pdb', chain, resnum, mutation)
+                result = predict_ddg_dynamut(pdb_file, *parsed, mutation)
                 st.success(f"Predicted ΔΔG: {result.get('ddg')} kCal/mol")
             except Exception as e:
-                st.error(f"Error: {e}")
\ No newline at end of file
+                st.error(f"Error: {e}")
+
+
+def plot_mutation_heatmap(results: list[dict]) -> go.Figure:
+    """
+    Plots predicted ΔΔG as a residue × substitution heatmap.
+    """
+    sites = sorted({(r["chain"], r["resnum"]) for r in results})
+    row = {site: i for i, site in enumerate(sites)}
+    z = [[None] * len(AMINO_ACIDS) for _ in sites]
+    for r in results:
+        if r.get("ddg") is not None:
+            z[row[(r["chain"], r["resnum"])]][AMINO_ACIDS.index(r["mutation"][-1])] = r["ddg"]
+
+    fig = go.Figure(go.Heatmap(
+        z=z,
+        x=list(AMINO_ACIDS),
+        y=[f"{chain}{resnum}" for chain, resnum in sites],
+        colorscale="RdBu_r",
+        zmid=0,
+        colorbar=dict(title="ΔΔG"),
+        hovertemplate="%{y} → %{x}<br>ΔΔG %{z:.2f} kCal/mol<extra></extra>"
+    ))
+    fig.update_layout(
+        xaxis_title="Substitution",
+        yaxis_title="Residue",
+        height=max(300, 18 * len(sites) + 120),
+        margin=dict(t=30, l=40, r=20, b=40)
+    )
+    return fig
+
+
+def show_scan_form(pdb_file: str | bytes, residues: list[str]):
+    """
+    Renders a form that runs a saturation ΔΔG scan over residues and streams the heatmap.
+    """
+    with st.form('scan_form'):
+        selected = st.multiselect('Residues to scan', residues, default=residues[:10])
+        submitted = st.form_submit_button('Run saturation scan')
+    if not submitted or not selected:
+        return
+    try:
+        scanner = MutationScanner(pdb_file)
+        mutations = saturation_mutations(pdb_file, selected)
+        progress = st.progress(0.0)
+        chart = st.empty()
+        results = []
+        for batch in scanner.scan(mutations):
+            results.extend(batch)
+            progress.progress(len(results) / len(mutations))
+            # Each update is a new element; identical figures would otherwise share an ID
+            chart.plotly_chart(plot_mutation_heatmap(results), use_container_width=True, key=f"scan_{len(results)}")
+        failed = [r for r in results if "error" in r]
+        if failed:
+            st.warning(f"{len(failed)} of {len(results)} predictions failed: {failed[0]['error']}")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
+
+@st.fragment
+def show_hotspot_explorer(analysis: HotspotAnalysis, pdb_file: str | bytes | None = None,
+                          annotations: AnnotationIndex | None = None):
+    """
+    Threshold, cutoff, chain and residue range controls over a precomputed HotspotAnalysis.
+    Runs as a fragment, so moving a slider only reruns this section. With annotations,
+    hotspots are listed with their UniProt positions and covering annotations.
+    """
+    col1, col2 = st.columns(2)
+    threshold = col1.slider('Contact threshold (atoms)', 1, 100, 30)
+    cutoff = col2.slider('Distance cutoff (Å)', 3.0, float(analysis.max_cutoff), 6.0, step=CUTOFF_STEP)
+    chains = st.multiselect('Chains', analysis.chain_ids, default=analysis.chain_ids)
+    residue_range = None
+    if len(analysis.res_seq):
+        lo, hi = int(analysis.res_seq.min()), int(analysis.res_seq.max())
+        if lo < hi:
+            residue_range = st.slider('Residue range', lo, hi, (lo, hi))
+
+    hotspots = analysis.hotspots(threshold, cutoff, chains, residue_range)
+    st.caption(f"{len(hotspots)} hotspot residues")
+    if hotspots and annotations is not None:
+        st.dataframe(residue_rows(hotspots, annotations), use_container_width=True, hide_index=True)
+    else:
+        st.write(hotspots or "No hotspots detected.")
+    if hotspots and pdb_file:
+        st.markdown("### Saturation Scan")
+        show_scan_form(pdb_file, hotspots)
+
+
+def show_metrics_panel(registry: MetricsRegistry, profile_report: str = ""):
+    """
+    Debug panel: per-stage and per-call latency, cache hit rates, bytes received and
+    LLM tokens (process-wide since startup), with Prometheus / JSON downloads.
+    """
+    snapshot = registry.snapshot()
+    histograms, counters = snapshot["histograms"], snapshot["counters"]
+
+    def latency_rows(metric, label):
+        return [
+            {label: h["labels"].get(label, ""), "calls": h["count"], "mean (s)": round(h["mean"], 4),
+             "p95 ≤ (s)": h["p95"], "total (s)": round(h["sum"], 3)}
+            for h in sorted(histograms.get(metric, []), key=lambda h: -h["sum"])
+        ]
+
+    with st.expander("🐞 Debug metrics"):
+        st.markdown("**Pipeline stages**")
+        st.dataframe(latency_rows("protai_pipeline_stage_seconds", "stage"), use_container_width=True)
+        st.markdown("**Instrumented calls**")
+        st.dataframe(latency_rows("protai_call_seconds", "name"), use_container_width=True)
+
+        lookups = defaultdict(lambda: defaultdict(float))
+        for c in counters.get("protai_cache_lookups_total", []):
+            lookups[c["labels"]["source"]][c["labels"]["result"]] += c["value"]
+        received = {c["labels"]["source"]: c["value"] for c in counters.get("protai_http_received_bytes_total", [])}
+        cache_rows = []
+        for source, results in sorted(lookups.items()):
+            total = sum(results.values())
+            cache_rows.append({
+                "source": source, "lookups": int(total),
+                "hit rate": round((results["hits"] + results["revalidated"]) / total, 3) if total else 0.0,
+                "MB received": round(received.get(source, 0) / 1e6, 3),
+            })
+        st.markdown("**Response cache**")
+        st.dataframe(cache_rows, use_container_width=True)
+
+        tokens = {f"{c['labels']['model']} {c['labels']['kind']}": int(c["value"])
+                  for c in counters.get("protai_llm_tokens_total", [])}
+        if tokens:
+            st.markdown("**LLM tokens**")
+            st.json(tokens)
+
+        col1, col2 = st.columns(2)
+        col1.download_button("Prometheus metrics", registry.to_prometheus(), "metrics.prom", "text/plain")
+        col2.download_button("JSON metrics", registry.to_json(), "metrics.json", "application/json")
+        if profile_report:
+            st.markdown("**Profile of this run**")
+            st.code(profile_report)
@@ -0,0 +1,230 @@
+"""
+3Dmol.js viewer fed from the structure already parsed on the server, instead of every
+browser downloading the entry from RCSB.
+
+The first model is cut to a level of detail that fits the atom budget, written as
+trimmed PDB lines (identifiers and coordinates only), gzipped and inlined as base64;
+the page inflates it with DecompressionStream. Chain colors and the residues to
+highlight (catalytic residues, UniProt sites, contact hotspots) are resolved here and
+sent as 3Dmol selections, so the browser does no analysis.
+"""
+import base64
+import gzip
+import json
+import os
+
+import numpy as np
+
+from annotation_index import AnnotationIndex
+from metrics import timed
+from structure_store import StructureArrays
+
+VIEWER_JS = os.getenv("PROTAI_3DMOL_JS", "https://3Dmol.org/build/3Dmol-min.js")
+# All heavy atoms up to FULL_ATOM_BUDGET, backbone-only cartoon up to
+# CARTOON_ATOM_BUDGET backbone atoms, a C-alpha trace beyond that
+FULL_ATOM_BUDGET = int(os.getenv("PROTAI_VIEWER_FULL_ATOMS", "60000"))
+CARTOON_ATOM_BUDGET = int(os.getenv("PROTAI_VIEWER_CARTOON_ATOMS", "120000"))
+# gzip level 3: most of level 6's saving at under half the time on large assemblies
+GZIP_LEVEL = 3
+BACKBONE = ("N", "CA", "C", "O")
+SOLVENT = ("HOH", "WAT", "DOD")
+CHAIN_COLORS = ["#4F81BD", "#9BBB59", "#8064A2", "#4BACC6", "#F79646", "#2C4D75", "#77933C", "#7F7F7F"]
+# (key, 3Dmol color, Streamlit markdown color, legend label), lowest to highest
+# priority; a residue takes the color of the highest that covers it
+HIGHLIGHTS = [
+    ("site", "#F3A712", "orange", "UniProt sites"),
+    ("hotspot", "#E4572E", "red", "contact hotspots"),
+    ("m_csa", "#A11692", "violet", "catalytic residues (M-CSA)"),
+]
+LOD_LABELS = {"full": "all heavy atoms", "cartoon": "backbone cartoon", "trace": "C-alpha trace"}
+
+
+def select_lod(structure: StructureArrays, full_budget: int = FULL_ATOM_BUDGET,
+               cartoon_budget: int = CARTOON_ATOM_BUDGET) -> tuple[str, np.ndarray]:
+    """
+    (level of detail, atom indices) for a single-model structure. Solvent and
+    hydrogens are never sent; above the budgets only polymer backbone (with ligands)
+    and then polymer C-alpha atoms are.
+    """
+    atom_res = structure.atom_residue_index()
+    res_names = structure.res_name_vocab[structure.res_name]
+    elements = structure.element_vocab[structure.element]
+    solvent = np.isin(res_names, SOLVENT)[atom_res]
+    heavy = ~np.isin(elements, ("H", "D")) & ~solvent
+    if heavy.sum() <= full_budget:
+        return "full", np.flatnonzero(heavy)
+
+    names = structure.atom_name_vocab[structure.atom_name]
+    polymer = ~np.asarray(structure.res_het)[atom_res]
+    backbone = polymer & np.isin(names, BACKBONE)
+    cartoon = backbone | (heavy & ~polymer)
+    if cartoon.sum() <= cartoon_budget:
+        return "cartoon", np.flatnonzero(cartoon)
+    return "trace", np.flatnonzero(polymer & (names == "CA"))
+
+
+LINE = 79  # ATOM record up to the element column, plus newline
+
+
+def _text_columns(vocab: np.ndarray, width: int, align: str = "left") -> np.ndarray:
+    """
+    Vocabulary entries as a (len(vocab), width) byte matrix, padded and cut to width.
+    """
+    text = vocab.astype(str)
+    text = np.strings.rjust(text, width) if align == "right" else np.strings.ljust(text, width)
+    return text.astype(f"S{width}").view(np.uint8).reshape(len(vocab), width)
+
+
+def _put_number(out: np.ndarray, end: int, values: np.ndarray, width: int, decimals: int = 0):
+    """
+    Writes integers right-justified into columns [end - width, end) of out, with a
+    decimal point before the last `decimals` digits (values are pre-scaled by
+    10**decimals). Digits are computed arithmetically, column by column.
+    """
+    magnitude = np.abs(values)
+    sign_col = np.full(len(values), end - 1)
+    col = end - 1
+    for k in range(width):
+        if col < end - width:
+            break
+        if decimals and k == decimals:
+            out[:, col] = ord(".")
+            col -= 1
+        digit = magnitude // 10 ** k
+        shown = (digit > 0) | (k <= decimals)
+        out[shown, col] = ord("0") + digit[shown] % 10
+        sign_col[shown] = col - 1
+        col -= 1
+    negative = np.flatnonzero(values < 0)
+    out[negative, sign_col[negative]] = ord("-")
+
+
+def pdb_lines(structure: StructureArrays, atoms: np.ndarray) -> bytes:
+    """
+    ATOM/HETATM lines for the given atoms, cut to the columns 3Dmol reads: names,
+    residue ids, coordinates and element. Lines are filled column-wise into one byte
+    matrix, so there is no per-atom Python work.
+    """
+    atoms = np.asarray(atoms)
+    res = structure.atom_residue_index()[atoms]
+    name_codes, element_codes = structure.atom_name[atoms], structure.element[atoms]
+    n_names = len(structure.atom_name_vocab)
+    # PDB convention: names under 4 characters of 1-letter elements start in column 14
+    name_len = np.strings.str_len(structure.atom_name_vocab.astype(str))
+    element_len = np.strings.str_len(structure.element_vocab.astype(str))
+    names = np.concatenate([_text_columns(structure.atom_name_vocab, 4),
+                            _text_columns(np.strings.add(" ", structure.atom_name_vocab.astype(str)), 4)])
+    pad = (name_len[name_codes] < 4) & (element_len[element_codes] < 2)
+
+    out = np.full((len(atoms), LINE), ord(" "), dtype=np.uint8)
+    out[:, 0:6] = _text_columns(np.array(["ATOM", "HETATM"]), 6)[np.asarray(structure.res_het)[res].astype(np.intp)]
+    _put_number(out, 11, (np.arange(len(atoms)) + 1) % 100000, 5)
+    out[:, 12:16] = names[name_codes + pad * n_names]
+    out[:, 17:20] = _text_columns(structure.res_name_vocab, 3, "right")[structure.res_name[res]]
+    out[:, 21:22] = _text_columns(structure.chain_vocab, 1)[structure.res_chain[res]]
+    _put_number(out, 26, np.asarray(structure.res_seq)[res] % 10000, 4)
+    out[:, 26:27] = _text_columns(structure.icode_vocab, 1)[structure.res_icode[res]]
+    # Clipped to what fits '%8.3f'
+    milli = np.clip(np.rint(np.asarray(structure.coords, dtype=np.float64)[atoms] * 1000), -999999, 9999999)
+    milli = milli.astype(np.int64)
+    for axis in range(3):
+        _put_number(out, 38 + 8 * axis, milli[:, axis], 8, decimals=3)
+    out[:, 76:78] = _text_columns(structure.element_vocab, 2, "right")[element_codes]
+    out[:, -1] = ord("\n")
+    return out.tobytes() + b"END\n"
+
+
+def _runs(values: np.ndarray) -> list:
+    """
+    Sorted residue numbers as 3Dmol resi items: single numbers and 'a-b' ranges.
+    """
+    if len(values) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(values) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(values)]]) - 1
+    return [int(values[s]) if s == e else f"{values[s]}-{values[e]}" for s, e in zip(starts, ends)]
+
+
+def highlight_styles(structure: StructureArrays, atoms: np.ndarray, annotations: AnnotationIndex | None = None) -> list[dict]:
+    """
+    3Dmol selections with colors: one per chain, then one per chain and highlight
+    level for the residues annotations mark (see HIGHLIGHTS), applied in order.
+    """
+    residues = np.unique(structure.atom_residue_index()[atoms])
+    chain_codes = structure.res_chain[residues]
+    res_seq = np.asarray(structure.res_seq)[residues]
+    styles = []
+    for n, code in enumerate(np.unique(chain_codes)):
+        chain = str(structure.chain_vocab[code])
+        # Chain ids and numbers as written by pdb_lines
+        sel = {"chain": chain[:1]}
+        styles.append({"sel": sel, "color": CHAIN_COLORS[n % len(CHAIN_COLORS)]})
+        if annotations is None:
+            continue
+        numbers = np.unique(res_seq[chain_codes == code])
+        level = np.zeros(len(numbers), dtype=np.int8)
+        for annotation, lo, hi in annotations.overlapping_residues(chain, int(numbers[0]), int(numbers[-1])):
+            key = annotation["source"] if annotation["source"] != "uniprot" else annotation["category"]
+            rank = next((i + 1 for i, h in enumerate(HIGHLIGHTS) if h[0] == key), 0)
+            if rank:
+                a, b = np.searchsorted(numbers, [lo, hi + 1])
+                np.maximum(level[a:b], rank, out=level[a:b])
+        for rank, (key, color, _, _) in enumerate(HIGHLIGHTS, start=1):
+            picked = numbers[level == rank] % 10000
+            if len(picked):
+                styles.append({"sel": {**sel, "resi": _runs(np.sort(picked))}, "color": color, "highlight": key})
+    return styles
+
+
+@timed()
+def viewer_payload(structure: StructureArrays, annotations: AnnotationIndex | None = None,
+                   full_budget: int = FULL_ATOM_BUDGET, cartoon_budget: int = CARTOON_ATOM_BUDGET) -> dict:
+    """
+    Everything build_3dmol_html needs for the first model: level of detail, atom
+    counts, the gzipped trimmed PDB text (base64) and the color selections.
+    """
+    if len(structure.models) > 1:
+        structure = structure.model_slice(int(structure.models[0]))
+    lod, atoms = select_lod(structure, full_budget, cartoon_budget)
+    data = gzip.compress(pdb_lines(structure, atoms), compresslevel=GZIP_LEVEL)
+    return {
+        "lod": lod,
+        "atoms": len(atoms),
+        "total_atoms": structure.n_atoms,
+        "data": base64.b64encode(data).decode(),
+        "styles": highlight_styles(structure, atoms, annotations),
+    }
+
+
+def build_3dmol_html(payload: dict, height: int = 500) -> str:
+    """
+    Returns HTML string for embedding a 3Dmol.js viewer of a viewer_payload. The time
+    from page script start to first render is logged to the console and kept in the
+    viewer element's data-render-ms attribute.
+    """
+    return f"""
+<script src="{VIEWER_JS}"></script>
+<div id="viewer3d" style="width:100%; height:{height}px;"></div>
+<script>
+  const payload = {json.dumps(payload)};
+  const t0 = performance.now();
+  const bytes = Uint8Array.from(atob(payload.data), c => c.charCodeAt(0));
+  const inflated = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  new Response(inflated).text().then(text => {{
+    const elt = document.getElementById('viewer3d');
+    const viewer = $3Dmol.createViewer(elt, {{ backgroundColor: 'white' }});
+    viewer.addModel(text, 'pdb');
+    const shape = payload.lod === 'trace' ? {{ style: 'trace' }} : {{}};
+    for (const s of payload.styles) {{
+      viewer.setStyle(s.sel, {{ cartoon: Object.assign({{ color: s.color }}, shape) }});
+      if (s.highlight && payload.lod === 'full') viewer.addStyle(s.sel, {{ stick: {{ color: s.color, radius: 0.2 }} }});
+    }}
+    if (payload.lod !== 'trace') viewer.setStyle({{ hetflag: true }}, {{ stick: {{}} }});
+    viewer.zoomTo();
+    viewer.render();
+    elt.dataset.renderMs = (performance.now() - t0).toFixed(1);
+    console.log(`3Dmol: ${{payload.atoms}} atoms (${{payload.lod}}) rendered in ${{elt.dataset.renderMs}} ms`);
+  }});
+</script>
+"""  # noqa: E501